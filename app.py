@@ -1,14 +1,20 @@
 from flask import Flask, redirect, url_for
 from routes.auth import auth
 from routes.profile import profile
-from routes.utilities import utilities
+from routes.utilities import utilities, inference_pool, heatmap_worker
 from routes.patients import patients
 from routes.users import users
 from routes.settings import settings
+from routes.media import media
+from inference.model import USE_INFERENCE_SERVER, model_registry
+from images import image_url
+from uploads import UploadRequest, MAX_CONTENT_LENGTH
 import os
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'ydtuyiwhefu938792jr10917418hkjwlasja83'
+app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+app.request_class = UploadRequest
 
 
 app.register_blueprint(auth)
@@ -17,6 +23,41 @@ app.register_blueprint(utilities)
 app.register_blueprint(patients)
 app.register_blueprint(users)
 app.register_blueprint(settings)
+app.register_blueprint(media)
+
+app.jinja_env.globals['image_url'] = image_url
+
+@app.before_request
+def start_inference():
+    """
+    Start the inference workers on the first request.
+
+    Description:
+        Nothing heavy happens at import time, so the app (and each forked
+        server worker) starts quickly. The first request starts the job
+        workers and, unless predictions go to the inference server, loads
+        the model in the background, starts watching for newly promoted
+        model versions and starts generating Grad-CAM overlays. Skipped in
+        testing, where tests drive the queue themselves.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    if app.testing:
+        return
+
+    if inference_pool.start() and not USE_INFERENCE_SERVER:
+        model_registry.warm_up_in_background()
+        model_registry.watch()
+        heatmap_worker.start()
+
 @app.route('/')
 def home():
     return redirect(url_for('auth.login'))
@@ -13,6 +13,15 @@ if not os.path.exists(db_dir):
 conn = sqlite3.connect(db_path)
 c = conn.cursor()
 
+# WAL lets the inference workers write results while the web app keeps reading
+c.execute('PRAGMA journal_mode=WAL;')
+
+# Add a column to an existing table if an older database is missing it
+def add_column(table, column, definition):
+    columns = [row[1] for row in c.execute(f'PRAGMA table_info({table})')]
+    if column not in columns:
+        c.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
 # Create User table
 c.execute('''
 CREATE TABLE IF NOT EXISTS users (
@@ -62,6 +71,10 @@ CREATE TABLE IF NOT EXISTS patients (
     clinician_to_review BOOLEAN,
     clinician_reviewed BOOLEAN,
     ai_suspected BOOLEAN,   
+    ai_probability REAL,
+    ai_model_version TEXT,
+    heatmap_img TEXT,
+    heatmap_model_version TEXT,
     pneumonia_confirmed BOOLEAN,
     worker_notes TEXT,
     clinician_note TEXT,
@@ -73,6 +86,125 @@ CREATE TABLE IF NOT EXISTS patients (
 ''')
 
 
+# Columns added to patients after it was first created
+add_column('patients', 'ai_probability', 'REAL')
+add_column('patients', 'ai_model_version', 'TEXT')
+add_column('patients', 'heatmap_img', 'TEXT')
+add_column('patients', 'heatmap_model_version', 'TEXT')
+
+# Create predictions table, one row per stored AI prediction
+c.execute('''
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    patient_id INTEGER NOT NULL,
+    xray_img TEXT NOT NULL,
+    probability REAL NOT NULL,
+    model_version TEXT,
+    latency_ms REAL,
+    cached BOOLEAN NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    FOREIGN KEY (patient_id) REFERENCES patients(id)
+);
+''')
+
+c.execute('''
+CREATE INDEX IF NOT EXISTS idx_predictions_patient ON predictions (patient_id, id);
+''')
+
+# Create backfill progress table, one row per model version being rolled out
+c.execute('''
+CREATE TABLE IF NOT EXISTS backfill_runs (
+    model_version TEXT PRIMARY KEY,
+    last_patient_id INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    rescored INTEGER NOT NULL DEFAULT 0,
+    changed INTEGER NOT NULL DEFAULT 0,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    started_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    finished_at TEXT
+);
+''')
+
+# Create decoded x-ray tensor index, mapping each image to its row in the
+# memory-mapped tensor file of each store. The index is only a cache, so
+# one from before it was keyed by store is dropped and refilled as images load
+if 'store' not in [row[1] for row in c.execute('PRAGMA table_info(xray_tensors)')]:
+    c.execute('DROP TABLE IF EXISTS xray_tensors')
+c.execute('''
+CREATE TABLE IF NOT EXISTS xray_tensors (
+    store TEXT NOT NULL,
+    xray_img TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    PRIMARY KEY (store, xray_img),
+    UNIQUE (store, row)
+);
+''')
+
+c.execute('''
+CREATE INDEX IF NOT EXISTS idx_patients_xray_img ON patients (xray_img);
+''')
+
+# Create stored image table, one row per content-named x-ray or avatar file
+# with the number of patients or users pointing at it
+c.execute('''
+CREATE TABLE IF NOT EXISTS blobs (
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    refcount INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (kind, name)
+);
+''')
+
+# Create inference job queue table
+c.execute('''
+CREATE TABLE IF NOT EXISTS inference_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    patient_id INTEGER NOT NULL,
+    xray_img TEXT NOT NULL,
+    xray_digest TEXT,
+    status TEXT NOT NULL CHECK(status IN ('queued', 'running', 'done', 'failed', 'cancelled')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    FOREIGN KEY (patient_id) REFERENCES patients(id)
+);
+''')
+
+c.execute('''
+CREATE INDEX IF NOT EXISTS idx_inference_jobs_status ON inference_jobs (status, id);
+''')
+
+c.execute('''
+CREATE INDEX IF NOT EXISTS idx_inference_jobs_patient ON inference_jobs (patient_id, id);
+''')
+
+
+# Columns added to inference_jobs after it was first created
+add_column('inference_jobs', 'xray_digest', 'TEXT')
+
+# Create prediction cache table, keyed by image digest and model version
+c.execute('''
+CREATE TABLE IF NOT EXISTS prediction_cache (
+    digest TEXT NOT NULL,
+    model_version TEXT NOT NULL,
+    probability REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    last_used_at TEXT NOT NULL,
+    PRIMARY KEY (digest, model_version)
+);
+''')
+
+c.execute('''
+CREATE INDEX IF NOT EXISTS idx_prediction_cache_last_used ON prediction_cache (last_used_at);
+''')
+
+
 
 # First create the table
 c.execute('''
@@ -86,10 +218,20 @@ CREATE TABLE IF NOT EXISTS settings (
     smtp_tls BOOLEAN,
     smtp_username TEXT,
     smtp_password TEXT,
-    smtp_sender TEXT
+    smtp_sender TEXT,
+    ai_low_threshold REAL NOT NULL DEFAULT 0.05,
+    ai_high_threshold REAL NOT NULL DEFAULT 0.99,
+    ai_max_pending_jobs INTEGER NOT NULL DEFAULT 500,
+    ai_queue_wait_seconds REAL NOT NULL DEFAULT 5
 );
 ''')
 
+# Columns added to settings after it was first created
+add_column('settings', 'ai_low_threshold', 'REAL NOT NULL DEFAULT 0.05')
+add_column('settings', 'ai_high_threshold', 'REAL NOT NULL DEFAULT 0.99')
+add_column('settings', 'ai_max_pending_jobs', 'INTEGER NOT NULL DEFAULT 500')
+add_column('settings', 'ai_queue_wait_seconds', 'REAL NOT NULL DEFAULT 5')
+
 # Then insert initial data in a separate operation
 c.execute('''
 INSERT INTO settings (
@@ -322,7 +322,7 @@ def update_smtp_settings(smtp_server=None, smtp_port=None, smtp_tls=None, smtp_u
     
     cursor.execute('''
         INSERT OR REPLACE INTO settings 
-        (id, smtp_server, smtp_port, smtp_tls, smtp_username, smtp_password, smtp_sender)
+        (id, smtp_server, smtp_port, smtp_tls, smtp_username, smtp_password, smtp_sender, ai_low_threshold, ai_high_threshold)
         VALUES (
             1,  -- Hardcode ID since we only have one settings entry
             COALESCE(?, (SELECT smtp_server FROM settings WHERE id=1)),
@@ -330,7 +330,9 @@ def update_smtp_settings(smtp_server=None, smtp_port=None, smtp_tls=None, smtp_u
             COALESCE(?, (SELECT smtp_tls FROM settings WHERE id=1)),
             COALESCE(?, (SELECT smtp_username FROM settings WHERE id=1)),
             COALESCE(?, (SELECT smtp_password FROM settings WHERE id=1)),
-            COALESCE(?, (SELECT smtp_sender FROM settings WHERE id=1))
+            COALESCE(?, (SELECT smtp_sender FROM settings WHERE id=1)),
+            (SELECT ai_low_threshold FROM settings WHERE id=1),
+            (SELECT ai_high_threshold FROM settings WHERE id=1)
         )
     ''', (
         smtp_server,
@@ -351,13 +353,15 @@ def update_user_image(username, profile_img):
     Update profile image for a user.
 
     Description:
-        Saves the profile image filename for a user.
+        Saves the profile image filename for a user. The old filename is read
+        and replaced in one transaction, so two uploads at once cannot both
+        release the same old image.
 
     Arguments:
         username (str), profile_img (str)
 
     Returns:
-        bool: True if updated.
+        str or None: The filename that was replaced.
 
     Author:
         Reece Alqotaibi (ReturnTypeVoid)
@@ -366,42 +370,60 @@ def update_user_image(username, profile_img):
     connection = get_connection()
     cursor = connection.cursor()
 
-    cursor.execute("UPDATE users SET profile_img = ? WHERE username = ?", (profile_img, username))
-
-    connection.commit()
-    cursor.close()
-    connection.close()
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute("SELECT profile_img FROM users WHERE username = ?", (username,))
+        row = cursor.fetchone()
+        cursor.execute("UPDATE users SET profile_img = ? WHERE username = ?", (profile_img, username))
+        connection.commit()
+    finally:
+        cursor.close()
+        connection.close()
 
-    return True
+    return row['profile_img'] if row else None
 
 def update_xray_image(id, xray_img):
     """
     Save an x-ray image for a patient.
 
     Description:
-        Updates the patient's record with the new x-ray filename.
+        Updates the patient's record with the new x-ray filename and clears
+        the old image's Grad-CAM overlay. The old filenames are read and
+        replaced in one transaction, so two uploads for the same patient
+        cannot both release the same old image.
 
     Arguments:
         id (int): Patient ID.
         xray_img (str): Filename.
 
     Returns:
-        bool: True if updated.
+        Tuple or None: (x-ray, Grad-CAM overlay) filenames that were replaced,
+        either of which may be None, or None if there is no such patient.
 
     Author:
         Reece Alqotaibi (ReturnTypeVoid)
     """
 
+    return _swap_xray_image(id, xray_img)
+
+def _swap_xray_image(id, xray_img):
     connection = get_connection()
     cursor = connection.cursor()
 
-    cursor.execute("UPDATE patients SET xray_img = ? WHERE id = ?", (xray_img, id))
-
-    connection.commit()
-    cursor.close()
-    connection.close()
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute("SELECT xray_img, heatmap_img FROM patients WHERE id = ?", (id,))
+        row = cursor.fetchone()
+        cursor.execute(
+            "UPDATE patients SET xray_img = ?, heatmap_img = NULL, heatmap_model_version = NULL WHERE id = ?",
+            (xray_img, id)
+        )
+        connection.commit()
+    finally:
+        cursor.close()
+        connection.close()
 
-    return True
+    return (row['xray_img'], row['heatmap_img']) if row else None
 
 def get_user_image(username):
     """
@@ -492,26 +514,21 @@ def delete_xray_image(id):
     Clear x-ray image from a patient record.
 
     Description:
-        Sets the x-ray image field to NULL.
+        Sets the x-ray image and Grad-CAM overlay fields to NULL, reading
+        the old filenames in the same transaction.
 
     Arguments:
         id (int): Patient ID.
 
     Returns:
-        None
+        Tuple or None: (x-ray, Grad-CAM overlay) filenames that were cleared,
+        or None if there is no such patient.
 
     Author:
         Reece Alqotaibi (ReturnTypeVoid)
     """
 
-    connection = get_connection()
-    cursor = connection.cursor()
-
-    cursor.execute("UPDATE patients SET xray_img = NULL WHERE id = ?", (id,))
-    connection.commit()
-
-    cursor.close()
-    connection.close()
+    return _swap_xray_image(id, None)
 
 def list_patients(search_query=None):
     """
@@ -1277,3 +1294,1455 @@ def update_clinician_reviewed(patient_id, value):
 
     conn.commit()
     conn.close()
+
+def enqueue_inference_job(patient_id, xray_img, xray_digest=None):
+    """
+    Queue an x-ray for AI prediction.
+
+    Description:
+        Cancels any job still waiting for an older x-ray of the same patient
+        and adds a new queued job for the given image.
+
+    Arguments:
+        patient_id (int), xray_img (str): Filename of the uploaded x-ray.
+        xray_digest (str, optional): SHA-256 of the image, used for caching.
+
+    Returns:
+        int: ID of the new job.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        UPDATE inference_jobs
+        SET status = 'cancelled', finished_at = datetime('now')
+        WHERE patient_id = ? AND status = 'queued'
+    ''', (patient_id,))
+
+    cursor.execute('''
+        INSERT INTO inference_jobs (patient_id, xray_img, xray_digest, status, created_at)
+        VALUES (?, ?, ?, 'queued', datetime('now'))
+    ''', (patient_id, xray_img, xray_digest))
+    job_id = cursor.lastrowid
+
+    conn.commit()
+    conn.close()
+
+    return job_id
+
+def claim_inference_job(lease_seconds):
+    """
+    Take the oldest waiting inference job.
+
+    Description:
+        Marks the oldest queued job as running inside a write transaction so
+        two workers can never claim the same job. Jobs left running for longer
+        than the lease (e.g. the worker process died) are claimed again.
+
+    Arguments:
+        lease_seconds (int): How long a running job may go without finishing.
+
+    Returns:
+        sqlite3.Row or None: The claimed job, or None if the queue is empty.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('''
+            SELECT * FROM inference_jobs
+            WHERE status = 'queued'
+            OR (status = 'running' AND started_at < datetime('now', ?))
+            ORDER BY id
+            LIMIT 1
+        ''', (f"-{int(lease_seconds)} seconds",))
+        job = cursor.fetchone()
+
+        if job:
+            cursor.execute('''
+                UPDATE inference_jobs
+                SET status = 'running', started_at = datetime('now'), attempts = attempts + 1
+                WHERE id = ?
+            ''', (job['id'],))
+
+        conn.commit()
+        return job
+    finally:
+        conn.close()
+
+def _save_prediction(cursor, patient_id, xray_img, probability, prediction, model_version, latency_ms, cached):
+    """
+    Write a prediction to the patient record and the predictions table.
+
+    Description:
+        Only applies if the patient still has the x-ray the prediction was
+        made for. Runs on the caller's cursor so it joins their transaction.
+
+    Returns:
+        bool: True if the patient record was updated.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    ai_suspected = 1 if prediction == "Pneumonia" else 0
+
+    cursor.execute('''
+        UPDATE patients
+        SET ai_suspected = ?, ai_probability = ?, ai_model_version = ?, clinician_to_review = 1
+        WHERE id = ? AND xray_img = ?
+    ''', (ai_suspected, probability, model_version, patient_id, xray_img))
+
+    if not cursor.rowcount:
+        return False
+
+    cursor.execute('''
+        INSERT INTO predictions (patient_id, xray_img, probability, model_version, latency_ms, cached, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, datetime('now'))
+    ''', (patient_id, xray_img, probability, model_version, latency_ms, 1 if cached else 0))
+    return True
+
+def record_prediction(patient_id, xray_img, probability, prediction, model_version, latency_ms=None, cached=False):
+    """
+    Store an AI prediction for a patient's x-ray.
+
+    Description:
+        Saves the label, raw probability and model version on the patient,
+        flags the case for clinician review, logs the prediction and cancels
+        any queued inference jobs for the patient, all in one transaction.
+
+    Arguments:
+        patient_id (int), xray_img (str), probability (float),
+        prediction (str): "Pneumonia" or "Normal",
+        model_version (str), latency_ms (float, optional),
+        cached (bool): True if the probability came from the prediction cache.
+
+    Returns:
+        bool: True if the patient still had this x-ray and was updated.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        UPDATE inference_jobs
+        SET status = 'cancelled', finished_at = datetime('now')
+        WHERE patient_id = ? AND status = 'queued'
+    ''', (patient_id,))
+
+    updated = _save_prediction(cursor, patient_id, xray_img, probability, prediction, model_version, latency_ms, cached)
+
+    conn.commit()
+    conn.close()
+
+    return updated
+
+def complete_inference_job(job_id, patient_id, xray_img, probability, prediction, model_version, latency_ms=None, cached=False):
+    """
+    Store the result of an inference job.
+
+    Description:
+        Saves the prediction as record_prediction() does, but only if the
+        patient still has the x-ray the job was run on, then marks the job
+        as done. Both happen in one transaction.
+
+    Arguments:
+        job_id (int), patient_id (int), xray_img (str), probability (float),
+        prediction (str): "Pneumonia" or "Normal",
+        model_version (str), latency_ms (float, optional), cached (bool)
+
+    Returns:
+        None
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    _save_prediction(cursor, patient_id, xray_img, probability, prediction, model_version, latency_ms, cached)
+
+    cursor.execute('''
+        UPDATE inference_jobs
+        SET status = 'done', error = NULL, finished_at = datetime('now')
+        WHERE id = ?
+    ''', (job_id,))
+
+    conn.commit()
+    conn.close()
+
+def fail_inference_job(job_id, error, max_attempts):
+    """
+    Record a failed inference attempt.
+
+    Description:
+        Puts the job back in the queue if it has attempts left, otherwise
+        marks it as failed.
+
+    Arguments:
+        job_id (int), error (str), max_attempts (int)
+
+    Returns:
+        None
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        UPDATE inference_jobs
+        SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+            error = ?,
+            finished_at = CASE WHEN attempts >= ? THEN datetime('now') ELSE NULL END
+        WHERE id = ?
+    ''', (max_attempts, error, max_attempts, job_id))
+
+    conn.commit()
+    conn.close()
+
+def cancel_inference_jobs(patient_id):
+    """
+    Cancel waiting inference jobs for a patient.
+
+    Description:
+        Used when the patient's x-ray is removed so the workers do not
+        score an image that no longer exists.
+
+    Arguments:
+        patient_id (int)
+
+    Returns:
+        None
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        UPDATE inference_jobs
+        SET status = 'cancelled', finished_at = datetime('now')
+        WHERE patient_id = ? AND status = 'queued'
+    ''', (patient_id,))
+
+    conn.commit()
+    conn.close()
+
+def get_inference_job_status(patient_id):
+    """
+    Get the state of the latest inference job for a patient.
+
+    Description:
+        Only looks at jobs for the patient's current x-ray, so an old job
+        does not show up against a newly uploaded image.
+
+    Arguments:
+        patient_id (int)
+
+    Returns:
+        str or None: 'queued', 'running', 'done', 'failed', 'cancelled' or None.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        SELECT j.status FROM inference_jobs j
+        JOIN patients p ON p.id = j.patient_id AND p.xray_img = j.xray_img
+        WHERE j.patient_id = ?
+        ORDER BY j.id DESC
+        LIMIT 1
+    ''', (patient_id,))
+    result = cursor.fetchone()
+
+    conn.close()
+
+    return result[0] if result else None
+
+def requeue_inference_job(job_id):
+    """
+    Put a claimed inference job back in the queue without using up an attempt.
+
+    Description:
+        Used when the job could not run because the inference server was
+        overloaded, which says nothing about the job itself.
+
+    Arguments:
+        job_id (int)
+
+    Returns:
+        None
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        UPDATE inference_jobs
+        SET status = 'queued', attempts = MAX(attempts - 1, 0), started_at = NULL
+        WHERE id = ? AND status = 'running'
+    ''', (job_id,))
+
+    conn.commit()
+    conn.close()
+
+def count_pending_inference_jobs():
+    """
+    Count inference jobs that are waiting or running.
+
+    Arguments:
+        None
+
+    Returns:
+        int: Number of unfinished jobs.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT COUNT(*) FROM inference_jobs WHERE status IN ('queued', 'running')")
+    count = cursor.fetchone()[0]
+
+    conn.close()
+
+    return count
+
+def count_inference_jobs():
+    """
+    Count inference jobs by status.
+
+    Arguments:
+        None
+
+    Returns:
+        dict: Status name mapped to job count.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('SELECT status, COUNT(*) FROM inference_jobs GROUP BY status')
+    counts = {row[0]: row[1] for row in cursor.fetchall()}
+
+    conn.close()
+
+    return counts
+
+def get_existing_patient_ids(patient_ids):
+    """
+    Filter a list of patient IDs down to the ones that exist.
+
+    Arguments:
+        patient_ids (list): Patient IDs to check.
+
+    Returns:
+        set: IDs that have a patient record.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    if not patient_ids:
+        return set()
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    placeholders = ", ".join("?" for _ in patient_ids)
+    cursor.execute(f"SELECT id FROM patients WHERE id IN ({placeholders})", list(patient_ids))
+    existing = {row[0] for row in cursor.fetchall()}
+
+    conn.close()
+
+    return existing
+
+def bulk_update_xray_predictions(results):
+    """
+    Store x-rays and AI predictions for many patients at once.
+
+    Description:
+        Writes the new image filename, prediction, probability and model
+        version for every patient in one transaction, flags them for
+        clinician review, clears their Grad-CAM overlays, logs each
+        prediction and cancels any queued inference jobs for them, since the
+        prediction is already known.
+
+    Arguments:
+        results (list): (patient_id, xray_img, probability, prediction,
+            model_version, latency_ms) tuples, where prediction is
+            "Pneumonia" or "Normal".
+
+    Returns:
+        list: (x-ray, Grad-CAM overlay or None) filenames that were replaced.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    if not results:
+        return []
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+
+        placeholders = ", ".join("?" for _ in results)
+        patient_ids = [result[0] for result in results]
+        cursor.execute(f'''
+            SELECT xray_img, heatmap_img FROM patients
+            WHERE id IN ({placeholders}) AND xray_img IS NOT NULL
+        ''', patient_ids)
+        replaced = [tuple(row) for row in cursor.fetchall()]
+
+        cursor.executemany('''
+            UPDATE patients
+            SET xray_img = ?, ai_suspected = ?, ai_probability = ?, ai_model_version = ?, clinician_to_review = 1,
+                heatmap_img = NULL, heatmap_model_version = NULL
+            WHERE id = ?
+        ''', [
+            (xray_img, 1 if prediction == "Pneumonia" else 0, probability, model_version, patient_id)
+            for patient_id, xray_img, probability, prediction, model_version, _ in results
+        ])
+
+        cursor.executemany('''
+            INSERT INTO predictions (patient_id, xray_img, probability, model_version, latency_ms, created_at)
+            VALUES (?, ?, ?, ?, ?, datetime('now'))
+        ''', [
+            (patient_id, xray_img, probability, model_version, latency_ms)
+            for patient_id, xray_img, probability, _, model_version, latency_ms in results
+        ])
+
+        cursor.execute(f'''
+            UPDATE inference_jobs
+            SET status = 'cancelled', finished_at = datetime('now')
+            WHERE status = 'queued' AND patient_id IN ({placeholders})
+        ''', patient_ids)
+
+        conn.commit()
+    finally:
+        conn.close()
+
+    return replaced
+
+def get_cached_prediction(digest, model_version):
+    """
+    Look up a stored prediction for an image.
+
+    Description:
+        Returns the probability a model version gave for an image with this
+        digest and marks the entry as recently used.
+
+    Arguments:
+        digest (str): SHA-256 of the image file.
+        model_version (str)
+
+    Returns:
+        float or None: Cached probability, None on a miss.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        UPDATE prediction_cache
+        SET hits = hits + 1, last_used_at = datetime('now')
+        WHERE digest = ? AND model_version = ?
+    ''', (digest, model_version))
+
+    probability = None
+    if cursor.rowcount:
+        cursor.execute(
+            "SELECT probability FROM prediction_cache WHERE digest = ? AND model_version = ?",
+            (digest, model_version)
+        )
+        probability = cursor.fetchone()[0]
+
+    conn.commit()
+    conn.close()
+
+    return probability
+
+def store_cached_prediction(digest, model_version, probability):
+    """
+    Save a prediction in the cache, or refresh the entry already there.
+
+    Arguments:
+        digest (str), model_version (str), probability (float)
+
+    Returns:
+        None
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        INSERT INTO prediction_cache (digest, model_version, probability, created_at, last_used_at)
+        VALUES (?, ?, ?, datetime('now'), datetime('now'))
+        ON CONFLICT(digest, model_version) DO UPDATE
+        SET probability = excluded.probability, last_used_at = excluded.last_used_at
+    ''', (digest, model_version, probability))
+
+    conn.commit()
+    conn.close()
+
+def evict_cached_predictions(max_entries):
+    """
+    Evict the least recently used cache entries beyond max_entries.
+
+    Arguments:
+        max_entries (int): Upper bound on cache size.
+
+    Returns:
+        int: Number of entries evicted.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT COUNT(*) FROM prediction_cache")
+    excess = cursor.fetchone()[0] - max_entries
+
+    evicted = 0
+    if excess > 0:
+        cursor.execute('''
+            DELETE FROM prediction_cache WHERE rowid IN (
+                SELECT rowid FROM prediction_cache
+                ORDER BY last_used_at ASC, rowid ASC
+                LIMIT ?
+            )
+        ''', (excess,))
+        evicted = cursor.rowcount
+
+    conn.commit()
+    conn.close()
+
+    return evicted
+
+def count_cached_predictions():
+    """
+    Count entries in the prediction cache.
+
+    Arguments:
+        None
+
+    Returns:
+        int: Number of cached predictions.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT COUNT(*) FROM prediction_cache")
+    count = cursor.fetchone()[0]
+
+    conn.close()
+
+    return count
+
+def get_ai_thresholds():
+    """
+    Get the probability band used to triage x-rays.
+
+    Arguments:
+        None
+
+    Returns:
+        Tuple: (low_threshold, high_threshold), or (None, None) if there is
+        no settings record.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT ai_low_threshold, ai_high_threshold FROM settings WHERE id = 1")
+    result = cursor.fetchone()
+
+    conn.close()
+
+    return (result[0], result[1]) if result else (None, None)
+
+def update_ai_thresholds(low_threshold, high_threshold):
+    """
+    Update the probability band used to triage x-rays.
+
+    Arguments:
+        low_threshold (float), high_threshold (float)
+
+    Returns:
+        bool: True if saved.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute(
+        "UPDATE settings SET ai_low_threshold = ?, ai_high_threshold = ? WHERE id = 1",
+        (low_threshold, high_threshold)
+    )
+    updated = cursor.rowcount > 0
+
+    conn.commit()
+    conn.close()
+
+    return updated
+
+def get_queue_limits():
+    """
+    Get how many inference jobs may be unfinished and how long uploads wait for room.
+
+    Arguments:
+        None
+
+    Returns:
+        Tuple: (max_pending_jobs, wait_seconds), or (None, None) if there is
+        no settings record.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT ai_max_pending_jobs, ai_queue_wait_seconds FROM settings WHERE id = 1")
+    result = cursor.fetchone()
+
+    conn.close()
+
+    return (result[0], result[1]) if result else (None, None)
+
+def update_queue_limits(max_pending_jobs, wait_seconds):
+    """
+    Update how many inference jobs may be unfinished and how long uploads wait for room.
+
+    Arguments:
+        max_pending_jobs (int), wait_seconds (float)
+
+    Returns:
+        bool: True if saved.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute(
+        "UPDATE settings SET ai_max_pending_jobs = ?, ai_queue_wait_seconds = ? WHERE id = 1",
+        (max_pending_jobs, wait_seconds)
+    )
+    updated = cursor.rowcount > 0
+
+    conn.commit()
+    conn.close()
+
+    return updated
+
+def retriage_patients(low_threshold, high_threshold):
+    """
+    Reapply the triage thresholds to every stored prediction.
+
+    Description:
+        Recomputes ai_suspected from the stored probability for the whole
+        patient table in a single UPDATE, so changing the thresholds never
+        needs the model. Probabilities outside the band are normal, anything
+        inside it is suspected pneumonia, as in inference.model.classify().
+        Patients without a stored probability are left alone.
+
+    Arguments:
+        low_threshold (float), high_threshold (float)
+
+    Returns:
+        int: Number of patients whose ai_suspected changed.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        UPDATE patients
+        SET ai_suspected = CASE WHEN ai_probability < :low OR ai_probability > :high THEN 0 ELSE 1 END
+        WHERE ai_probability IS NOT NULL
+        AND ai_suspected IS NOT (CASE WHEN ai_probability < :low OR ai_probability > :high THEN 0 ELSE 1 END)
+    ''', {"low": low_threshold, "high": high_threshold})
+    changed = cursor.rowcount
+
+    conn.commit()
+    conn.close()
+
+    return changed
+
+def count_patients_to_rescore(model_version):
+    """
+    Count patients whose x-ray has not been scored by a model version.
+
+    Arguments:
+        model_version (str)
+
+    Returns:
+        int: Patients with an x-ray and a prediction from another version (or none).
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        SELECT COUNT(*) FROM patients
+        WHERE xray_img IS NOT NULL AND ai_model_version IS NOT ?
+    ''', (model_version,))
+    count = cursor.fetchone()[0]
+
+    conn.close()
+
+    return count
+
+def list_patients_to_rescore(after_id, model_version, limit):
+    """
+    Get the next patients to re-score, in ID order.
+
+    Description:
+        Uses keyset pagination (id > after_id) so each page is an index
+        range scan, however far into the table the backfill has got.
+
+    Arguments:
+        after_id (int): Last patient ID already handled.
+        model_version (str): Version being rolled out; patients already
+            scored by it are skipped.
+        limit (int): Page size.
+
+    Returns:
+        list: Rows with id, xray_img and ai_suspected.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        SELECT id, xray_img, ai_suspected FROM patients
+        WHERE id > ? AND xray_img IS NOT NULL AND ai_model_version IS NOT ?
+        ORDER BY id
+        LIMIT ?
+    ''', (after_id, model_version, limit))
+    patients = cursor.fetchall()
+
+    conn.close()
+
+    return patients
+
+def start_backfill_run(model_version, total):
+    """
+    Get the progress record for a model version's backfill, creating it if needed.
+
+    Arguments:
+        model_version (str), total (int): Patients left to re-score.
+
+    Returns:
+        sqlite3.Row: The backfill_runs row.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        INSERT INTO backfill_runs (model_version, total, started_at, updated_at)
+        VALUES (?, ?, datetime('now'), datetime('now'))
+        ON CONFLICT(model_version) DO UPDATE
+        SET finished_at = NULL, updated_at = datetime('now')
+    ''', (model_version, total))
+    conn.commit()
+
+    cursor.execute("SELECT * FROM backfill_runs WHERE model_version = ?", (model_version,))
+    run = cursor.fetchone()
+
+    conn.close()
+
+    return run
+
+def reset_backfill_run(model_version):
+    """
+    Start a model version's backfill again from the first patient.
+
+    Arguments:
+        model_version (str)
+
+    Returns:
+        None
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    conn.execute("DELETE FROM backfill_runs WHERE model_version = ?", (model_version,))
+    conn.commit()
+    conn.close()
+
+def store_rescored_predictions(model_version, results, last_patient_id, changed, skipped):
+    """
+    Save one chunk of backfill results and advance the run's progress.
+
+    Description:
+        Everything for the chunk is written in one short transaction, so
+        the web app only ever waits for a single chunk. Patients whose x-ray
+        was replaced since the chunk was read are left alone. A patient is
+        flagged for clinician review only if the new model changes its label.
+
+    Arguments:
+        model_version (str),
+        results (list): (patient_id, xray_img, probability, prediction, latency_ms) tuples.
+        last_patient_id (int): Highest patient ID covered by the chunk.
+        changed (int), skipped (int): Labels changed and images skipped in the chunk.
+
+    Returns:
+        int: Number of patients updated.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+
+        updated = 0
+        for patient_id, xray_img, probability, prediction, latency_ms in results:
+            ai_suspected = 1 if prediction == "Pneumonia" else 0
+            cursor.execute('''
+                UPDATE patients
+                SET clinician_to_review = CASE WHEN ai_suspected IS NOT ? THEN 1 ELSE clinician_to_review END,
+                    ai_suspected = ?, ai_probability = ?, ai_model_version = ?
+                WHERE id = ? AND xray_img = ?
+            ''', (ai_suspected, ai_suspected, probability, model_version, patient_id, xray_img))
+
+            if cursor.rowcount:
+                updated += 1
+                cursor.execute('''
+                    INSERT INTO predictions (patient_id, xray_img, probability, model_version, latency_ms, created_at)
+                    VALUES (?, ?, ?, ?, ?, datetime('now'))
+                ''', (patient_id, xray_img, probability, model_version, latency_ms))
+
+        cursor.execute('''
+            UPDATE backfill_runs
+            SET last_patient_id = ?, rescored = rescored + ?, changed = changed + ?,
+                skipped = skipped + ?, updated_at = datetime('now')
+            WHERE model_version = ?
+        ''', (last_patient_id, updated, changed, skipped, model_version))
+
+        conn.commit()
+    finally:
+        conn.close()
+
+    return updated
+
+def finish_backfill_run(model_version):
+    """
+    Mark a model version's backfill as complete.
+
+    Arguments:
+        model_version (str)
+
+    Returns:
+        None
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    conn.execute(
+        "UPDATE backfill_runs SET finished_at = datetime('now'), updated_at = datetime('now') WHERE model_version = ?",
+        (model_version,)
+    )
+    conn.commit()
+    conn.close()
+
+def get_latest_backfill_run():
+    """
+    Get the most recently active backfill.
+
+    Arguments:
+        None
+
+    Returns:
+        dict or None: The backfill_runs row with images per second added.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        SELECT *, (julianday(updated_at) - julianday(started_at)) * 86400 AS seconds
+        FROM backfill_runs
+        ORDER BY updated_at DESC
+        LIMIT 1
+    ''')
+    run = cursor.fetchone()
+
+    conn.close()
+
+    if run is None:
+        return None
+
+    run = dict(run)
+    run["images_per_second"] = run["rescored"] / run["seconds"] if run["seconds"] else None
+    return run
+
+def get_tensor_rows(store, xray_imgs):
+    """
+    Look up where decoded x-rays are stored in a tensor file.
+
+    Arguments:
+        store (str): The tensor store's folder.
+        xray_imgs (list): X-ray filenames.
+
+    Returns:
+        dict: Filename mapped to row, for the filenames that are stored.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    if not xray_imgs:
+        return {}
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    rows = {}
+    # Stay under SQLite's limit on query parameters
+    for start in range(0, len(xray_imgs), 500):
+        chunk = xray_imgs[start:start + 500]
+        cursor.execute(
+            f"SELECT xray_img, row FROM xray_tensors WHERE store = ? AND xray_img IN ({','.join('?' * len(chunk))})",
+            [store] + chunk
+        )
+        rows.update({row['xray_img']: row['row'] for row in cursor.fetchall()})
+
+    conn.close()
+
+    return rows
+
+def store_tensor_rows(store, rows_in_file, entries):
+    """
+    Record rows just appended to the tensor file.
+
+    Description:
+        Entries pointing at or past rows_in_file, which is where the new rows
+        start, refer to a file that has since been lost or truncated and are
+        removed first. An image stored again points at its new row.
+
+    Arguments:
+        store (str): The tensor store's folder.
+        rows_in_file (int): Rows the file had before the append.
+        entries (list): (xray_img, row) pairs.
+
+    Returns:
+        None
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('DELETE FROM xray_tensors WHERE store = ? AND row >= ?', (store, rows_in_file))
+    cursor.executemany(
+        'INSERT OR REPLACE INTO xray_tensors (store, xray_img, row) VALUES (?, ?, ?)',
+        [(store, xray_img, row) for xray_img, row in entries]
+    )
+
+    conn.commit()
+    conn.close()
+
+def delete_tensor_row(store, xray_img):
+    """
+    Forget the stored tensor for an x-ray.
+
+    Arguments:
+        store (str): The tensor store's folder.
+        xray_img (str)
+
+    Returns:
+        None
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('DELETE FROM xray_tensors WHERE store = ? AND xray_img = ?', (store, xray_img))
+
+    conn.commit()
+    conn.close()
+
+def count_tensor_rows(store):
+    """
+    Count x-rays with a stored tensor.
+
+    Arguments:
+        store (str): The tensor store's folder.
+
+    Returns:
+        int
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('SELECT COUNT(*) FROM xray_tensors WHERE store = ?', (store,))
+    count = cursor.fetchone()[0]
+
+    conn.close()
+
+    return count
+
+def list_live_tensor_rows(store):
+    """
+    List stored tensors that still belong to a patient's current x-ray.
+
+    Arguments:
+        store (str): The tensor store's folder.
+
+    Returns:
+        list: (xray_img, row) pairs in patient ID order. An image shared by
+        several patients comes once, at its first patient.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        SELECT t.xray_img, t.row
+        FROM xray_tensors t
+        JOIN patients p ON p.xray_img = t.xray_img
+        WHERE t.store = ?
+        GROUP BY t.xray_img
+        ORDER BY MIN(p.id)
+    ''', (store,))
+    rows = [(row['xray_img'], row['row']) for row in cursor.fetchall()]
+
+    conn.close()
+
+    return rows
+
+def replace_tensor_rows(store, entries, before_commit=None):
+    """
+    Replace the whole tensor index when the file is compacted.
+
+    Description:
+        The new index is written in one transaction. before_commit, e.g.
+        swapping in the compacted file, runs inside it, so if either fails
+        the old index is kept.
+
+    Arguments:
+        store (str): The tensor store's folder.
+        entries (list): (xray_img, row) pairs.
+        before_commit (callable, optional): Called after the rows are
+            written and before they are committed.
+
+    Returns:
+        None
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('DELETE FROM xray_tensors WHERE store = ?', (store,))
+        cursor.executemany(
+            'INSERT INTO xray_tensors (store, xray_img, row) VALUES (?, ?, ?)',
+            [(store, xray_img, row) for xray_img, row in entries]
+        )
+        if before_commit is not None:
+            before_commit()
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def list_confirmed_xrays():
+    """
+    Get x-rays a clinician has confirmed or ruled out pneumonia for.
+
+    Description:
+        Used as labelled data for evaluating the model on real cases.
+
+    Arguments:
+        None
+
+    Returns:
+        list: Rows with id, xray_img and pneumonia_confirmed, in ID order.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        SELECT id, xray_img, pneumonia_confirmed FROM patients
+        WHERE pneumonia_confirmed IS NOT NULL AND xray_img IS NOT NULL
+        ORDER BY id
+    ''')
+    cases = cursor.fetchall()
+
+    conn.close()
+
+    return cases
+
+def list_confirmed_outcomes():
+    """
+    Get every patient's confirmed outcome.
+
+    Arguments:
+        None
+
+    Returns:
+        list: (patient ID, pneumonia_confirmed) pairs.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('SELECT id, pneumonia_confirmed FROM patients WHERE pneumonia_confirmed IS NOT NULL')
+    outcomes = [(row[0], row[1]) for row in cursor.fetchall()]
+
+    conn.close()
+
+    return outcomes
+
+def list_xray_patients(after_id, limit):
+    """
+    Get the next patients with an x-ray, in ID order.
+
+    Arguments:
+        after_id (int): Last patient ID already handled.
+        limit (int): Page size.
+
+    Returns:
+        list: Rows with id and xray_img.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        SELECT id, xray_img FROM patients
+        WHERE id > ? AND xray_img IS NOT NULL
+        ORDER BY id
+        LIMIT ?
+    ''', (after_id, limit))
+    patients = cursor.fetchall()
+
+    conn.close()
+
+    return patients
+
+def list_heatmap_candidates(model_version, limit):
+    """
+    Get scored x-rays whose Grad-CAM overlay is missing or from another model version.
+
+    Arguments:
+        model_version (str): Version the overlays should come from.
+        limit (int): Batch size.
+
+    Returns:
+        list: Rows with id, xray_img and heatmap_img, newest patients first.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        SELECT id, xray_img, heatmap_img FROM patients
+        WHERE xray_img IS NOT NULL AND ai_model_version IS NOT NULL
+            AND heatmap_model_version IS NOT ?
+        ORDER BY id DESC
+        LIMIT ?
+    ''', (model_version, limit))
+    patients = cursor.fetchall()
+
+    conn.close()
+
+    return patients
+
+def store_heatmap(patient_id, xray_img, heatmap_img, model_version):
+    """
+    Record a patient's Grad-CAM overlay.
+
+    Description:
+        Only updates the patient if they still have the x-ray the overlay
+        was made from, so an upload made while it was being computed wins.
+
+    Arguments:
+        patient_id (int): Patient ID.
+        xray_img (str): X-ray the overlay was made from.
+        heatmap_img (str or None): Overlay filename, None if it could not be made.
+        model_version (str): Model version it came from.
+
+    Returns:
+        bool: True if the patient was updated.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        UPDATE patients SET heatmap_img = ?, heatmap_model_version = ?
+        WHERE id = ? AND xray_img = ?
+    ''', (heatmap_img, model_version, patient_id, xray_img))
+    updated = cursor.rowcount > 0
+
+    conn.commit()
+    conn.close()
+
+    return updated
+
+def add_blob_reference(kind, name, size):
+    """
+    Count one more reference to a stored image, recording it if it is new.
+
+    Arguments:
+        kind (str): 'xrays' or 'avatars'.
+        name (str): Content-named filename.
+        size (int): File size in bytes.
+
+    Returns:
+        int: References after adding this one.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('''
+            INSERT INTO blobs (kind, name, size, refcount, created_at)
+            VALUES (?, ?, ?, 1, datetime('now'))
+            ON CONFLICT (kind, name) DO UPDATE SET refcount = refcount + 1
+        ''', (kind, name, size))
+        cursor.execute("SELECT refcount FROM blobs WHERE kind = ? AND name = ?", (kind, name))
+        refcount = cursor.fetchone()[0]
+        conn.commit()
+    finally:
+        conn.close()
+
+    return refcount
+
+def release_blob_reference(kind, name):
+    """
+    Drop one reference to a stored image, forgetting it when none are left.
+
+    Arguments:
+        kind (str): 'xrays' or 'avatars'.
+        name (str): Content-named filename.
+
+    Returns:
+        int or None: References left, None if the image was never recorded.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute("SELECT refcount FROM blobs WHERE kind = ? AND name = ?", (kind, name))
+        row = cursor.fetchone()
+        if row is None:
+            remaining = None
+        else:
+            remaining = max(row[0] - 1, 0)
+            if remaining:
+                cursor.execute("UPDATE blobs SET refcount = ? WHERE kind = ? AND name = ?", (remaining, kind, name))
+            else:
+                cursor.execute("DELETE FROM blobs WHERE kind = ? AND name = ?", (kind, name))
+        conn.commit()
+    finally:
+        conn.close()
+
+    return remaining
+
+def count_image_references(kind):
+    """
+    Count how many patients or users point at each image file.
+
+    Arguments:
+        kind (str): 'xrays' counts patients' x-rays, 'avatars' users' profile images.
+
+    Returns:
+        dict: Filename to number of references.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    table, column = {'xrays': ('patients', 'xray_img'), 'avatars': ('users', 'profile_img')}[kind]
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute(f'''
+        SELECT {column}, COUNT(*) FROM {table}
+        WHERE {column} IS NOT NULL
+        GROUP BY {column}
+    ''')
+    counts = dict(cursor.fetchall())
+
+    conn.close()
+
+    return counts
+
+def list_blobs(kind):
+    """
+    Get every recorded image of a kind.
+
+    Returns:
+        dict: Filename to (size, refcount).
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT name, size, refcount FROM blobs WHERE kind = ?", (kind,))
+    blobs = {name: (size, refcount) for name, size, refcount in cursor.fetchall()}
+
+    conn.close()
+
+    return blobs
+
+def set_blob_references(kind, blobs, removed):
+    """
+    Overwrite the recorded reference counts of some images in one transaction.
+
+    Arguments:
+        kind (str): 'xrays' or 'avatars'.
+        blobs (list): (name, size, refcount) tuples to record.
+        removed (list): Filenames to forget.
+
+    Returns:
+        None
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.executemany('''
+            INSERT INTO blobs (kind, name, size, refcount, created_at)
+            VALUES (?, ?, ?, ?, datetime('now'))
+            ON CONFLICT (kind, name) DO UPDATE SET size = excluded.size, refcount = excluded.refcount
+        ''', [(kind, name, size, refcount) for name, size, refcount in blobs])
+        cursor.executemany("DELETE FROM blobs WHERE kind = ? AND name = ?", [(kind, name) for name in removed])
+        conn.commit()
+    finally:
+        conn.close()
@@ -0,0 +1,274 @@
+import argparse
+import hashlib
+import hmac
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, url_for
+
+IMAGES_FOLDER = 'static/images'
+
+# Longest side in pixels of each derivative. List thumbnails and avatars are
+# twice their displayed size so they stay sharp on high-density screens
+DERIVATIVE_SIZES = {'thumb': 100, 'preview': 800, 'avatar': 160}
+DERIVATIVE_QUALITY = 85
+
+XRAY_DERIVATIVES = ('thumb', 'preview')
+AVATAR_DERIVATIVES = ('avatar',)
+
+BACKFILL_WORKERS = 4
+
+# Folders whose URLs are signed, since only staff should see them
+SIGNED_FOLDERS = ('xrays',)
+
+# Signed URLs stay valid for at least this long, in seconds. Expiry times are
+# rounded up so a page shows the same URLs for a while and browsers can
+# reuse their cached copies
+SIGNED_URL_LIFETIME = 60 * 60
+SIGNED_URL_ROUNDING = 10 * 60
+
+def derivative_name(filename, size):
+    """
+    Name a resized copy of an image, e.g. 3f2a.jpg -> 3f2a.thumb.jpg.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    return f"{os.path.splitext(filename)[0]}.{size}.jpg"
+
+def is_original(filename):
+    """
+    Check whether a file in an image folder is an upload rather than a copy made from one.
+
+    Description:
+        Uploads are saved as <hex>.jpg, while derivatives and Grad-CAM
+        overlays add a second suffix before the extension.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    return filename.count('.') == 1 and filename.lower().endswith(('.jpg', '.jpeg'))
+
+def make_derivatives(folder, filename, sizes, source=None):
+    """
+    Write the resized copies of an uploaded image.
+
+    Description:
+        The image is decoded once, with Pillow's draft mode scaling JPEGs
+        down in the decoder to about the largest size needed, and each copy
+        is shrunk from that. Copies are written under a temporary name and
+        renamed into place, so a page never serves half a file.
+
+    Arguments:
+        folder (str): Folder holding the image; the copies go next to it.
+        filename (str): Image filename.
+        sizes (tuple): Keys of DERIVATIVE_SIZES.
+        source (str, optional): Read the image from here instead, e.g. while
+            it is still under a temporary name.
+
+    Returns:
+        list: Filenames written.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    from PIL import Image
+
+    largest = max(DERIVATIVE_SIZES[size] for size in sizes)
+    written = []
+
+    with Image.open(source or os.path.join(folder, filename)) as image:
+        image.draft(image.mode, (largest, largest))
+        image = image.convert('L' if image.mode == 'L' else 'RGB')
+
+    for size in sorted(sizes, key=DERIVATIVE_SIZES.get, reverse=True):
+        copy = image.copy()
+        copy.thumbnail((DERIVATIVE_SIZES[size], DERIVATIVE_SIZES[size]))
+
+        name = derivative_name(filename, size)
+        path = os.path.join(folder, name)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        copy.save(tmp_path, 'JPEG', quality=DERIVATIVE_QUALITY, optimize=True)
+        os.replace(tmp_path, path)
+        written.append(name)
+
+    return written
+
+def delete_derivatives(folder, filename, sizes):
+    """
+    Remove an image's resized copies, if they exist.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    for size in sizes:
+        try:
+            os.remove(os.path.join(folder, derivative_name(filename, size)))
+        except FileNotFoundError:
+            pass
+
+def image_signature(folder, patient_id, filename, expires):
+    """
+    Sign an image URL with the app's secret key.
+
+    Arguments:
+        folder (str): 'xrays' or 'avatars'.
+        patient_id (int or str): Patient the image belongs to.
+        filename (str): Filename being served, e.g. a resized copy.
+        expires (int): Unix time the URL stops working.
+
+    Returns:
+        str: HMAC-SHA256 hex digest.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    message = f"{folder}/{patient_id}/{filename}/{expires}".encode()
+    return hmac.new(current_app.secret_key.encode(), message, hashlib.sha256).hexdigest()
+
+def check_image_signature(folder, filename, args, now=None):
+    """
+    Check the signature on an image request, without touching the database.
+
+    Arguments:
+        folder (str): Folder from the URL.
+        filename (str): Filename from the URL.
+        args (dict): Query string, with patient, expires and signature.
+        now (float, optional): Current Unix time.
+
+    Returns:
+        int or None: Seconds until the URL expires, None if it is invalid
+        or has expired.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    try:
+        expires = int(args.get('expires', ''))
+    except ValueError:
+        return None
+
+    remaining = expires - int(now if now is not None else time.time())
+    if remaining <= 0:
+        return None
+
+    expected = image_signature(folder, args.get('patient', ''), filename, expires)
+    if not hmac.compare_digest(expected, args.get('signature', '')):
+        return None
+    return remaining
+
+def image_url(folder, filename, size=None, patient_id=None):
+    """
+    Get the URL of an uploaded image, or of one of its resized copies.
+
+    Description:
+        Used by templates. Falls back to the original while a copy has not
+        been made yet, e.g. for images uploaded before copies existed that
+        the backfill has not reached. X-ray URLs carry the patient, an
+        expiry time and a signature over both and the filename, which
+        routes/media.py checks before serving the file.
+
+    Arguments:
+        folder (str): Sub-folder of static/images, 'xrays' or 'avatars'.
+        filename (str): Uploaded image filename.
+        size (str, optional): Key of DERIVATIVE_SIZES.
+        patient_id (int, optional): Patient the x-ray belongs to; required
+            for folders in SIGNED_FOLDERS.
+
+    Returns:
+        str: URL served by routes/media.py.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    if size is not None:
+        name = derivative_name(filename, size)
+        if os.path.exists(os.path.join(IMAGES_FOLDER, folder, name)):
+            filename = name
+
+    if folder not in SIGNED_FOLDERS:
+        return url_for('media.serve_image', folder=folder, filename=filename)
+
+    if patient_id is None:
+        raise ValueError(f"Images in {folder} need the patient they belong to")
+
+    expires = (int(time.time()) // SIGNED_URL_ROUNDING + 1) * SIGNED_URL_ROUNDING + SIGNED_URL_LIFETIME
+    return url_for(
+        'media.serve_image', folder=folder, filename=filename, patient=patient_id, expires=expires,
+        signature=image_signature(folder, patient_id, filename, expires)
+    )
+
+def backfill(folder, sizes, force=False, workers=BACKFILL_WORKERS):
+    """
+    Make resized copies for every uploaded image in a folder that is missing them.
+
+    Arguments:
+        folder (str): Image folder.
+        sizes (tuple): Keys of DERIVATIVE_SIZES.
+        force (bool): Remake copies that already exist.
+        workers (int): Images resized in parallel.
+
+    Returns:
+        dict: Images resized, already up to date, and unreadable.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    def needs_copies(filename):
+        if force:
+            return True
+        original = os.path.getmtime(os.path.join(folder, filename))
+        for size in sizes:
+            path = os.path.join(folder, derivative_name(filename, size))
+            if not os.path.exists(path) or os.path.getmtime(path) < original:
+                return True
+        return False
+
+    originals = [name for name in sorted(os.listdir(folder)) if is_original(name)]
+    pending = [name for name in originals if needs_copies(name)]
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {name: pool.submit(make_derivatives, folder, name, sizes) for name in pending}
+        for name, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Skipped {name}: {e}")
+                failed += 1
+
+    return {"resized": len(pending) - failed, "up_to_date": len(originals) - len(pending), "failed": failed}
+
+def main(argv=None):
+    """
+    Command-line entry point.
+
+    Description:
+        python -m images backfill [--force]
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    parser = argparse.ArgumentParser(description="Make resized copies of uploaded x-rays and avatars.")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--force", action="store_true", help="Remake copies that already exist")
+    parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS)
+    args = parser.parse_args(argv)
+
+    for folder, sizes in (('xrays', XRAY_DERIVATIVES), ('avatars', AVATAR_DERIVATIVES)):
+        path = os.path.join(IMAGES_FOLDER, folder)
+        if os.path.isdir(path):
+            print(folder, backfill(path, sizes, args.force, args.workers))
+
+if __name__ == "__main__":
+    main()
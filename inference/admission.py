@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+STATS_WINDOW = 1000
+
+class Overloaded(Exception):
+    """
+    Raised when work is turned away because the limit and wait queue are full.
+
+    Arguments:
+        retry_after (float): Suggested seconds before trying again.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """
+    Bounds how much work runs at once and how much may wait for a slot.
+
+    Description:
+        Up to max_in_flight callers run at the same time. Up to max_waiting
+        more wait, each for at most timeout seconds; anyone beyond that, or
+        anyone whose wait runs out, gets Overloaded straight away instead of
+        slowing everyone else down. Keeps counts so the limits can be sized
+        from real traffic.
+
+    Arguments:
+        name (str): Used in error messages.
+        max_in_flight (int), max_waiting (int), timeout (float)
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    def __init__(self, name, max_in_flight, max_waiting, timeout):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._waits = deque(maxlen=STATS_WINDOW)
+        self._outcomes = deque(maxlen=STATS_WINDOW)
+        self._condition = threading.Condition()
+
+    def _reject(self, reason, counter):
+        setattr(self, counter, getattr(self, counter) + 1)
+        self._outcomes.append(False)
+        raise Overloaded(f"{self.name} is busy ({reason}), please try again", self.timeout)
+
+    @contextmanager
+    def admit(self):
+        """
+        Run the with-block once a slot is free.
+
+        Raises:
+            Overloaded: The wait queue is full or no slot freed up in time.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        started = time.perf_counter()
+
+        with self._condition:
+            if self.in_flight >= self.max_in_flight:
+                if self.waiting >= self.max_waiting:
+                    self._reject("queue full", "rejected")
+
+                self.waiting += 1
+                try:
+                    ready = self._condition.wait_for(lambda: self.in_flight < self.max_in_flight, self.timeout)
+                finally:
+                    self.waiting -= 1
+                if not ready:
+                    self._reject("timed out waiting", "timed_out")
+
+            self.in_flight += 1
+            self.admitted += 1
+            self._outcomes.append(True)
+            self._waits.append(time.perf_counter() - started)
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.in_flight -= 1
+                self._condition.notify()
+
+    def stats(self):
+        """
+        Describe current load and recent rejections.
+
+        Returns:
+            dict: Limits, in-flight and waiting counts, totals, the share of
+            the last STATS_WINDOW requests turned away and their mean wait.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        with self._condition:
+            outcomes = list(self._outcomes)
+            waits = list(self._waits)
+
+            return {
+                "max_in_flight": self.max_in_flight,
+                "max_waiting": self.max_waiting,
+                "timeout": self.timeout,
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "rejection_rate": outcomes.count(False) / len(outcomes) if outcomes else None,
+                "mean_wait_ms": sum(waits) / len(waits) * 1000 if waits else None
+            }
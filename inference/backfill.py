@@ -0,0 +1,239 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import numpy as np
+from db import (count_patients_to_rescore, list_patients_to_rescore, start_backfill_run, reset_backfill_run,
+                store_rescored_predictions, finish_backfill_run)
+from inference.model import classify, current_thresholds, model_registry
+from inference.batching import predict_with_model, predict_with_model_features
+from inference.cascade import CASCADE_ENABLED, cascade
+from inference.tensor_store import COMPACT_DEAD_SHARE, tensor_store
+from inference.embeddings import embedding_index
+from storage import XRAY_FOLDER
+
+BATCH_SIZE = 64
+DECODE_WORKERS = 4
+
+# Clinic opening hours (local time, start inclusive, end exclusive) and how
+# long to sleep between chunks inside and outside them
+CLINIC_HOURS = (8, 18)
+CLINIC_HOURS_PAUSE = 2.0
+OFF_HOURS_PAUSE = 0.0
+
+def chunk_pause(now=None, clinic_hours=CLINIC_HOURS, clinic_pause=CLINIC_HOURS_PAUSE, off_hours_pause=OFF_HOURS_PAUSE):
+    """
+    How long to rest after a chunk, so the backfill yields CPU during clinic hours.
+
+    Arguments:
+        now (datetime, optional): Defaults to the current local time.
+        clinic_hours (tuple): (start hour, end hour).
+        clinic_pause (float), off_hours_pause (float): Seconds.
+
+    Returns:
+        float: Seconds to sleep.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    now = now or datetime.now()
+    start, end = clinic_hours
+    return clinic_pause if start <= now.hour < end else off_hours_pause
+
+def target_version():
+    """
+    Version the backfill scores with, matching what new uploads get.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    return cascade.get_version() if CASCADE_ENABLED else model_registry.get_version()
+
+def score(images):
+    """
+    Predict a batch with the configured model or cascade.
+
+    Arguments:
+        images (numpy.ndarray): float32 array of shape (n, 64, 64, 1).
+
+    Returns:
+        Tuple: (one probability per image, penultimate features from the
+        same predict call, or None if the cascade or backend has none)
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    if CASCADE_ENABLED:
+        return cascade.predict_batch(images), None
+
+    result = predict_with_model_features(images)
+    probabilities, features = result if result is not None else (predict_with_model(images), None)
+    return np.asarray(probabilities).reshape(len(images), -1)[:, 0].tolist(), features
+
+def rescore_chunk(pool, patients, image_folder, model_version):
+    """
+    Score one chunk of patients and store the results.
+
+    Description:
+        Model input comes from the tensor store; only images it does not
+        have are decoded, in the pool, and added to it. Embeddings for the
+        similar-case index are added alongside the new scores.
+
+    Arguments:
+        pool (ThreadPoolExecutor): Decode pool.
+        patients (list): Rows from list_patients_to_rescore().
+        image_folder (str), model_version (str)
+
+    Returns:
+        Tuple: (patients updated, labels changed, images skipped)
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    images, failed = tensor_store.load_many(
+        [patient['xray_img'] for patient in patients],
+        [os.path.join(image_folder, patient['xray_img']) for patient in patients],
+        pool
+    )
+
+    for index, error in failed.items():
+        print(f"Patient {patients[index]['id']}: skipped {patients[index]['xray_img']}: {error}", file=sys.stderr)
+    scored = [patient for index, patient in enumerate(patients) if index not in failed]
+    skipped = len(failed)
+
+    results = []
+    changed = 0
+    if scored:
+        started = time.perf_counter()
+        probabilities, features = score(images)
+        latency_ms = (time.perf_counter() - started) * 1000 / len(scored)
+
+        thresholds = current_thresholds()
+        for patient, probability in zip(scored, probabilities):
+            prediction = classify(probability, *thresholds)
+            if patient['ai_suspected'] != (1 if prediction == "Pneumonia" else 0):
+                changed += 1
+            results.append((patient['id'], patient['xray_img'], float(probability), prediction, latency_ms))
+
+        # Keep similar-case lookup in step with the version being rolled out
+        try:
+            scored_ids = [patient['id'] for patient in scored]
+            if features is not None:
+                embedding_index.add_features(scored_ids, features)
+            else:
+                embedding_index.add_many(scored_ids, images)
+        except Exception as e:
+            print(f"Embedding error: {e}", file=sys.stderr)
+
+    updated = store_rescored_predictions(model_version, results, patients[-1]['id'], changed, skipped)
+    return updated, changed, skipped
+
+def run_backfill(image_folder=XRAY_FOLDER, batch_size=BATCH_SIZE, workers=DECODE_WORKERS, pause=chunk_pause, restart=False):
+    """
+    Re-score every patient x-ray with the current model version.
+
+    Description:
+        Walks patients with an x-ray in ID order, resuming after the last
+        patient a previous run for this version stored. Each chunk is read
+        from the tensor store (decoding only missing images), scored in one batch and written in its own
+        short transaction, then the job sleeps for pause() seconds so it
+        does not compete with the web app during clinic hours. Progress is
+        kept in the backfill_runs table and shown on /inference/status.
+
+    Arguments:
+        image_folder (str): Folder the x-ray filenames are relative to.
+        batch_size (int): Patients per chunk.
+        workers (int): Decode pool size.
+        pause (callable): Returns seconds to sleep after each chunk.
+        restart (bool): Start from the first patient again.
+
+    Returns:
+        dict: Model version, patients re-scored, labels changed, images skipped and seconds.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    model_version = target_version()
+    if model_version is None:
+        raise RuntimeError("No model is available to back-fill with")
+
+    if restart:
+        reset_backfill_run(model_version)
+
+    # Compacting first puts the rows back in patient ID order, so each chunk
+    # is read as one contiguous slice
+    if tensor_store.stats()["dead_share"] > COMPACT_DEAD_SHARE:
+        print(f"Compacted tensor store: {tensor_store.compact()}")
+
+    total = count_patients_to_rescore(model_version)
+    run = start_backfill_run(model_version, total)
+    after_id = run['last_patient_id']
+    if after_id:
+        print(f"Resuming {model_version} after patient {after_id}")
+
+    rescored = changed = skipped = 0
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            patients = list_patients_to_rescore(after_id, model_version, batch_size)
+            if not patients:
+                break
+
+            chunk_rescored, chunk_changed, chunk_skipped = rescore_chunk(pool, patients, image_folder, model_version)
+            rescored += chunk_rescored
+            changed += chunk_changed
+            skipped += chunk_skipped
+            after_id = patients[-1]['id']
+
+            elapsed = time.perf_counter() - started
+            rate = rescored / elapsed if elapsed else 0
+            print(f"{rescored}/{total} re-scored, {changed} changed, {skipped} skipped ({rate:.1f} images/s)")
+
+            time.sleep(pause())
+
+    finish_backfill_run(model_version)
+
+    return {
+        "model_version": model_version,
+        "rescored": rescored,
+        "changed": changed,
+        "skipped": skipped,
+        "seconds": time.perf_counter() - started
+    }
+
+def main(argv=None):
+    """
+    Command-line entry point.
+
+    Description:
+        python -m inference.backfill [--batch-size 64] [--restart]
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    parser = argparse.ArgumentParser(description="Re-score every patient x-ray with the current model version.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=DECODE_WORKERS, help="Parallel JPEG decoders")
+    parser.add_argument("--clinic-pause", type=float, default=CLINIC_HOURS_PAUSE, help="Seconds between chunks during clinic hours")
+    parser.add_argument("--off-hours-pause", type=float, default=OFF_HOURS_PAUSE, help="Seconds between chunks outside clinic hours")
+    parser.add_argument("--restart", action="store_true", help="Start again from the first patient")
+    args = parser.parse_args(argv)
+
+    summary = run_backfill(
+        batch_size=args.batch_size, workers=args.workers, restart=args.restart,
+        pause=lambda: chunk_pause(clinic_pause=args.clinic_pause, off_hours_pause=args.off_hours_pause)
+    )
+    print(f"Done: {summary['rescored']} re-scored with {summary['model_version']}, "
+          f"{summary['changed']} changed, {summary['skipped']} skipped in {summary['seconds']:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from inference.model import get_model
+from inference.embeddings import penultimate_scorer
+
+BATCH_MAX_SIZE = 16
+BATCH_WINDOW = 0.010
+STATS_WINDOW = 1000
+
+_scorer = (None, None)
+_scorer_lock = threading.Lock()
+
+def predict_with_model(batch):
+    """
+    Run the shared model on a batch of images.
+
+    Arguments:
+        batch (numpy.ndarray): float32 array of shape (n, 64, 64, 1).
+
+    Returns:
+        numpy.ndarray: Probabilities of shape (n, 1).
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    return get_model().predict(batch, batch_size=len(batch), verbose=0)
+
+def predict_with_model_features(batch):
+    """
+    Run the shared model on a batch, keeping its penultimate-layer features.
+
+    Arguments:
+        batch (numpy.ndarray): float32 array of shape (n, 64, 64, 1).
+
+    Returns:
+        Tuple or None: (probabilities (n, 1), features (n, d)), None if the
+        backend cannot expose features.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    global _scorer
+
+    model = get_model()
+    with _scorer_lock:
+        if _scorer[0] is not model:
+            _scorer = (model, penultimate_scorer(model))
+        scorer = _scorer[1]
+
+    return scorer(batch) if scorer is not None else None
+
+class MicroBatcher:
+    """
+    Groups concurrent prediction requests into batched model calls.
+
+    Description:
+        Callers hand in single images and block on the result. A background
+        thread takes the first waiting image, keeps collecting more until the
+        batch is full or the window has passed, runs one predict call for all
+        of them and hands each caller its own probability back. If a caller
+        in the batch asked for features and features_fn is set, the batch
+        runs through features_fn instead, so the embedding comes from the
+        same forward pass as the score.
+
+    Arguments:
+        predict_fn (callable): Takes an (n, 64, 64, 1) array, returns (n, 1).
+        max_batch_size (int): Most images run in one predict call.
+        window (float): Seconds to wait for more images after the first one.
+        features_fn (callable, optional): Like predict_fn but returns
+            (probabilities, features), or None if the model has no features.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    def __init__(self, predict_fn=predict_with_model, max_batch_size=BATCH_MAX_SIZE, window=BATCH_WINDOW,
+                 features_fn=None):
+        self.predict_fn = predict_fn
+        self.features_fn = features_fn
+        self.max_batch_size = max_batch_size
+        self.window = window
+        self._pending = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        self.batches = 0
+        self.images = 0
+        self._batch_sizes = deque(maxlen=STATS_WINDOW)
+        self._queue_waits = deque(maxlen=STATS_WINDOW)
+        self._predict_times = deque(maxlen=STATS_WINDOW)
+
+    def submit(self, image, features=False):
+        """
+        Queue one image for the next batch.
+
+        Arguments:
+            image (numpy.ndarray): float32 array of shape (64, 64, 1).
+            features (bool): Also return the image's penultimate features.
+
+        Returns:
+            Future: Resolves to the image's probability as a float, or to
+            (probability, features or None) if features was set.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        self._ensure_started()
+        future = Future()
+        self._pending.put((image, future, time.perf_counter(), features))
+        return future
+
+    def predict(self, image, timeout=None):
+        """
+        Predict one image, batched together with any concurrent callers.
+
+        Arguments:
+            image (numpy.ndarray): float32 array of shape (64, 64, 1).
+            timeout (float, optional): Seconds to wait for the result.
+
+        Returns:
+            float: Probability for the image.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        return self.submit(image).result(timeout)
+
+    def predict_with_features(self, image, timeout=None):
+        """
+        Predict one image and keep its penultimate features from the same pass.
+
+        Arguments:
+            image (numpy.ndarray): float32 array of shape (64, 64, 1).
+            timeout (float, optional): Seconds to wait for the result.
+
+        Returns:
+            Tuple: (probability, (d,) features or None if the model has none)
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        return self.submit(image, True).result(timeout)
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self._pending.get()]
+        deadline = time.perf_counter() + self.window
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    batch.append(self._pending.get(timeout=remaining))
+                else:
+                    batch.append(self._pending.get_nowait())
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        import numpy as np
+
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+
+            try:
+                images = np.stack([item[0] for item in batch]).astype(np.float32, copy=False)
+                result = None
+                if self.features_fn is not None and any(item[3] for item in batch):
+                    result = self.features_fn(images)
+                probabilities, features = result if result is not None else (self.predict_fn(images), None)
+                probabilities = np.asarray(probabilities).reshape(len(batch), -1)[:, 0]
+            except Exception as e:
+                for item in batch:
+                    item[1].set_exception(e)
+                continue
+
+            finished = time.perf_counter()
+            with self._lock:
+                self.batches += 1
+                self.images += len(batch)
+                self._batch_sizes.append(len(batch))
+                self._predict_times.append(finished - started)
+                self._queue_waits.extend(started - item[2] for item in batch)
+
+            for index, (_, future, _, wants_features) in enumerate(batch):
+                probability = float(probabilities[index])
+                if wants_features:
+                    future.set_result((probability, features[index] if features is not None else None))
+                else:
+                    future.set_result(probability)
+
+    def stats(self):
+        """
+        Describe recent batching behaviour.
+
+        Description:
+            Averages cover the last STATS_WINDOW batches/images so the numbers
+            follow the current load rather than the whole process lifetime.
+
+        Arguments:
+            None
+
+        Returns:
+            dict: Batch counts, batch size, queue wait and predict time figures.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        with self._lock:
+            sizes = list(self._batch_sizes)
+            waits = sorted(self._queue_waits)
+            times = list(self._predict_times)
+            batches, images = self.batches, self.images
+
+        return {
+            "max_batch_size": self.max_batch_size,
+            "window_ms": self.window * 1000,
+            "batches": batches,
+            "images": images,
+            "waiting": self._pending.qsize(),
+            "mean_batch_size": sum(sizes) / len(sizes) if sizes else None,
+            "max_seen_batch_size": max(sizes) if sizes else None,
+            "mean_queue_wait_ms": sum(waits) / len(waits) * 1000 if waits else None,
+            "p95_queue_wait_ms": waits[int(0.95 * (len(waits) - 1))] * 1000 if waits else None,
+            "mean_predict_ms": sum(times) / len(times) * 1000 if times else None
+        }
+
+batcher = MicroBatcher(features_fn=predict_with_model_features)
@@ -0,0 +1,434 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from inference.model import INFERENCE_BACKEND
+
+SYNTHETIC_SIZE = (2048, 2048)
+SYNTHETIC_IMAGES = 20
+LATENCY_ITERATIONS = 200
+BATCH_SIZES = (1, 8, 16, 32, 64)
+THREAD_COUNTS = (1, 2, 4)
+THROUGHPUT_SECONDS = 2.0
+
+def sample_paths(sample_dir, limit):
+    """
+    List up to limit .jpg/.jpeg files in a folder.
+
+    Arguments:
+        sample_dir (str): Folder searched recursively.
+        limit (int): Most paths to return.
+
+    Returns:
+        list: Sorted file paths.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    return sorted(
+        path for path in glob.glob(os.path.join(sample_dir, '**', '*'), recursive=True)
+        if path.lower().endswith(('.jpg', '.jpeg'))
+    )[:limit]
+
+def synthetic_xrays(folder, count=SYNTHETIC_IMAGES, size=SYNTHETIC_SIZE):
+    """
+    Write radiograph-sized grayscale JPEGs for benchmarking without real data.
+
+    Arguments:
+        folder (str), count (int), size (tuple): (width, height)
+
+    Returns:
+        list: Paths of the written images.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:size[1], 0:size[0]].astype(np.float32)
+    paths = []
+    for index in range(count):
+        # Smooth anatomy-like shading with a little sensor noise
+        cx, cy = rng.uniform(0.3, 0.7, 2) * size
+        shading = 200 * np.exp(-((x - cx) ** 2 + (y - cy) ** 2) / (2 * (size[0] / 4) ** 2))
+        noise = rng.normal(0, 4, shading.shape)
+        pixels = np.clip(30 + shading + noise, 0, 255).astype(np.uint8)
+
+        path = os.path.join(folder, f"synthetic_{index}.jpg")
+        Image.fromarray(pixels, 'L').save(path, format='JPEG', quality=90)
+        paths.append(path)
+    return paths
+
+def time_calls(fn, inputs, repeats):
+    """
+    Time fn on every input, repeats times over.
+
+    Returns:
+        Tuple: (list of per-call seconds, last result for each input)
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    timings = []
+    results = []
+    for _ in range(repeats):
+        results = []
+        for value in inputs:
+            start = time.perf_counter()
+            results.append(fn(value))
+            timings.append(time.perf_counter() - start)
+    return timings, results
+
+def summarise(timings):
+    """
+    Reduce per-call timings to milliseconds.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    return {
+        "calls": len(timings),
+        "mean_ms": statistics.fmean(timings) * 1000,
+        "p50_ms": statistics.median(timings) * 1000
+    }
+
+def percentiles(timings, points=(50, 95, 99)):
+    """
+    Nearest-rank percentiles of per-call timings in milliseconds.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    ordered = sorted(timings)
+    return {
+        f"p{point}_ms": ordered[min(len(ordered) - 1, int(point / 100 * len(ordered)))] * 1000
+        for point in points
+    }
+
+def peak_rss_mb():
+    """
+    Peak resident memory of this process so far.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def cold_start(model_path, backend):
+    """
+    Time loading the model in a fresh interpreter.
+
+    Description:
+        Measures importing the inference stack, loading the model and the
+        first (warm-up) predict, which is what a newly started server pays.
+        Run in a subprocess by cold_start_report() so nothing is cached.
+
+    Arguments:
+        model_path (str), backend (str)
+
+    Returns:
+        dict: Import, load and warm-up seconds and peak RSS.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    start = time.perf_counter()
+    from inference.model import ModelRegistry
+    if backend == 'tflite':
+        import inference.tflite_backend
+    elif backend == 'numpy':
+        import inference.numpy_backend
+    else:
+        import tensorflow
+    import_seconds = time.perf_counter() - start
+
+    registry = ModelRegistry(model_path, backend)
+    registry.load()
+
+    return {
+        "import_seconds": import_seconds,
+        "load_seconds": registry.load_time,
+        "first_predict_seconds": registry.warm_time,
+        "total_seconds": time.perf_counter() - start,
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+def cold_start_report(model_path, backend):
+    """
+    Run cold_start() in a new Python process and return its figures.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    result = subprocess.run(
+        [sys.executable, "-m", "inference.benchmark", "cold-start", "--model", model_path, "--backend", backend],
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def latency_report(model, buffers, iterations=LATENCY_ITERATIONS):
+    """
+    Time single-image predictions on a warm model.
+
+    Description:
+        Each call decodes one image from memory and predicts it on its own,
+        which is what a single upload costs once the model is loaded.
+
+    Arguments:
+        model: Loaded model with a Keras-style predict().
+        buffers (list): JPEG bytes, cycled through.
+        iterations (int)
+
+    Returns:
+        dict: Mean and p50/p95/p99 latency in milliseconds.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    from inference.preprocess import decode_xray
+
+    timings = []
+    for index in range(iterations):
+        start = time.perf_counter()
+        image = decode_xray(buffers[index % len(buffers)])
+        model.predict(image[None, ...], batch_size=1, verbose=0)
+        timings.append(time.perf_counter() - start)
+
+    return {"iterations": iterations, "mean_ms": statistics.fmean(timings) * 1000, **percentiles(timings)}
+
+def throughput_report(model, images, batch_sizes=BATCH_SIZES, thread_counts=THREAD_COUNTS, seconds=THROUGHPUT_SECONDS):
+    """
+    Measure images per second for every batch size and thread count.
+
+    Description:
+        Each thread predicts the same batch in a loop for the given time,
+        so the figures show how well the backend uses extra cores and how
+        much batching is worth.
+
+    Arguments:
+        model: Loaded model with a Keras-style predict().
+        images (numpy.ndarray): (n, 64, 64, 1) images, tiled up to the batch size.
+        batch_sizes (tuple), thread_counts (tuple), seconds (float)
+
+    Returns:
+        list: One dict per (batch size, threads) with images per second.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    import numpy as np
+
+    results = []
+    for batch_size in batch_sizes:
+        batch = np.resize(images, (batch_size,) + images.shape[1:])
+        model.predict(batch, batch_size=batch_size, verbose=0)
+
+        for threads in thread_counts:
+            counts = [0] * threads
+            deadline = time.perf_counter() + seconds
+
+            def run(slot):
+                while time.perf_counter() < deadline:
+                    model.predict(batch, batch_size=batch_size, verbose=0)
+                    counts[slot] += batch_size
+
+            workers = [threading.Thread(target=run, args=(slot,)) for slot in range(threads)]
+            start = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - start
+
+            results.append({
+                "batch_size": batch_size,
+                "threads": threads,
+                "images": sum(counts),
+                "images_per_second": sum(counts) / elapsed
+            })
+
+    return results
+
+def environment(model_path, backend):
+    """
+    Describe what a benchmark run measured, so runs can be compared.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    from inference.model import file_version
+
+    return {
+        "model_path": model_path,
+        "model_version": file_version(model_path),
+        "backend": backend,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    }
+
+def suite_report(model_path, backend, paths, iterations=LATENCY_ITERATIONS, batch_sizes=BATCH_SIZES, thread_counts=THREAD_COUNTS, seconds=THROUGHPUT_SECONDS):
+    """
+    Run the whole prediction-path benchmark.
+
+    Arguments:
+        model_path (str), backend (str): Model to benchmark.
+        paths (list): Sample JPEGs.
+        iterations (int): Single-image predictions for the latency figures.
+        batch_sizes (tuple), thread_counts (tuple), seconds (float):
+            Throughput grid and time per cell.
+
+    Returns:
+        dict: Environment, cold start, preprocessing, latency, throughput
+        and peak RSS figures.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    import numpy as np
+    from inference.model import ModelRegistry
+    from inference.preprocess import decode_xray
+
+    report = {"environment": environment(model_path, backend)}
+    report["cold_start"] = cold_start_report(model_path, backend)
+
+    buffers = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            buffers.append(f.read())
+
+    model = ModelRegistry(model_path, backend).load()
+    images = np.stack([decode_xray(data) for data in buffers])
+
+    report["preprocess"] = summarise(time_calls(decode_xray, buffers, 1)[0])
+    report["warm_latency"] = latency_report(model, buffers, iterations)
+    report["throughput"] = throughput_report(model, images, batch_sizes, thread_counts, seconds)
+    report["peak_rss_mb"] = peak_rss_mb()
+    return report
+
+def preprocess_report(paths, repeats=3):
+    """
+    Compare the Keras load_img path against decode_xray().
+
+    Description:
+        The Keras path reads each file from disk and fully decodes it, as
+        the upload route used to. The fast path decodes from bytes already
+        in memory, as the upload and import paths now do. The largest pixel
+        difference between the two tensors is reported alongside the timings.
+
+    Arguments:
+        paths (list): JPEG files to decode.
+        repeats (int): Passes over the files.
+
+    Returns:
+        dict: Timings for both paths, the speedup and tensor differences.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    import numpy as np
+    from inference.preprocess import load_xray, decode_xray
+
+    buffers = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            buffers.append(f.read())
+
+    load_xray(paths[0])
+    keras_timings, keras_tensors = time_calls(load_xray, paths, repeats)
+    draft_timings, draft_tensors = time_calls(decode_xray, buffers, repeats)
+
+    deltas = np.abs(np.stack(keras_tensors) - np.stack(draft_tensors))
+    keras, draft = summarise(keras_timings), summarise(draft_timings)
+
+    return {
+        "images": len(paths),
+        "keras_load_img": keras,
+        "draft_decode": draft,
+        "speedup": keras["mean_ms"] / draft["mean_ms"],
+        "max_abs_delta": float(deltas.max()),
+        "mean_abs_delta": float(deltas.mean())
+    }
+
+def main(argv=None):
+    """
+    Command-line entry point.
+
+    Description:
+        python -m inference.benchmark preprocess [--samples /path/to/xrays]
+        python -m inference.benchmark suite [--samples /path/to/xrays] [--output results.json]
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark the pneumonia prediction path.")
+    parser.add_argument("command", choices=["preprocess", "suite", "cold-start"])
+    parser.add_argument("--samples", help="Folder of sample x-rays (default: synthetic 2048x2048 images)")
+    parser.add_argument("--limit", type=int, default=100, help="Most sample images to use")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--model", help="Model file (default: the app's model for the backend)")
+    parser.add_argument("--backend", choices=["keras", "tflite", "numpy"], default=INFERENCE_BACKEND)
+    parser.add_argument("--iterations", type=int, default=LATENCY_ITERATIONS, help="Single-image predictions for latency")
+    parser.add_argument("--batch-sizes", default=",".join(map(str, BATCH_SIZES)))
+    parser.add_argument("--threads", default=",".join(map(str, THREAD_COUNTS)))
+    parser.add_argument("--seconds", type=float, default=THROUGHPUT_SECONDS, help="Time per throughput measurement")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    if args.model is None:
+        from inference.model import ModelRegistry
+        args.model = ModelRegistry(backend=args.backend).model_path
+
+    if args.command == "cold-start":
+        print(json.dumps(cold_start(args.model, args.backend)))
+        return
+
+    with tempfile.TemporaryDirectory() as folder:
+        paths = sample_paths(args.samples, args.limit) if args.samples else synthetic_xrays(folder)
+        if not paths:
+            parser.error(f"No .jpg/.jpeg images found in {args.samples}")
+
+        if args.command == "preprocess":
+            report = preprocess_report(paths, args.repeats)
+        else:
+            report = suite_report(
+                args.model, args.backend, paths, args.iterations,
+                [int(size) for size in args.batch_sizes.split(",")],
+                [int(count) for count in args.threads.split(",")],
+                args.seconds
+            )
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
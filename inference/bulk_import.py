@@ -0,0 +1,383 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import numpy as np
+from db import get_existing_patient_ids, bulk_update_xray_predictions
+from inference.model import get_model, classify, current_thresholds, model_registry
+from inference.cascade import CASCADE_ENABLED, cascade
+from inference.preprocess import decode_xray
+from inference.tensor_store import tensor_store
+from images import XRAY_DERIVATIVES
+from storage import BlobStore, release_xray, XRAY_FOLDER
+
+BATCH_SIZE = 64
+DECODE_WORKERS = 4
+
+def read_checkpoint(path):
+    """
+    Read how many manifest rows a previous run finished.
+
+    Arguments:
+        path (str): Checkpoint file path.
+
+    Returns:
+        int: Number of rows already imported, 0 if there is no checkpoint.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    if not os.path.exists(path):
+        return 0
+
+    with open(path) as f:
+        return json.load(f).get("rows_done", 0)
+
+def write_checkpoint(path, rows_done):
+    """
+    Record how many manifest rows have been imported.
+
+    Description:
+        Writes to a temporary file and renames it over the checkpoint so a
+        crash mid-write never leaves a corrupt checkpoint behind.
+
+    Arguments:
+        path (str): Checkpoint file path.
+        rows_done (int): Rows imported so far.
+
+    Returns:
+        None
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"rows_done": rows_done, "updated_at": time.time()}, f)
+    os.replace(tmp_path, path)
+
+def read_manifest(path, skip=0):
+    """
+    Stream (patient_id, filename) pairs from a manifest CSV.
+
+    Arguments:
+        path (str): Manifest CSV with patient_id and filename columns.
+        skip (int): Rows to skip, used when resuming.
+
+    Returns:
+        generator: (row_number, patient_id or None, filename) tuples.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        for row_number, row in enumerate(islice(reader, skip, None), start=skip + 1):
+            try:
+                patient_id = int(row["patient_id"])
+            except (TypeError, ValueError):
+                patient_id = None
+            yield row_number, patient_id, (row.get("filename") or "").strip()
+
+def chunks(iterable, size):
+    """
+    Split an iterable into lists of at most size items without reading ahead.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def prepare_image(source_dir, destination_dir, filename):
+    """
+    Decode an x-ray for the model and copy it into the x-ray folder.
+
+    Description:
+        Runs in the decode pool. The file is read once and both decoded and
+        stored from memory. It is only stored once it has decoded, so
+        unreadable files never end up in the x-ray folder. An image that is
+        already stored gets another reference instead of a second copy. The
+        list thumbnail and preview of new images are made here too, in
+        parallel with the rest of the chunk. The reference is held for the
+        chunk until it commits; release_chunk() drops it if it never does.
+
+    Arguments:
+        source_dir (str), destination_dir (str), filename (str)
+
+    Returns:
+        Tuple: (stored filename, float32 image array)
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    with open(os.path.join(source_dir, filename), 'rb') as f:
+        data = f.read()
+    image = decode_xray(data)
+
+    stored_name, _, _ = BlobStore(destination_dir, 'xrays', XRAY_DERIVATIVES).save_bytes(data)
+    return stored_name, image
+
+def decode_chunk(pool, chunk, source_dir, destination_dir):
+    """
+    Start decoding every valid row of a manifest chunk.
+
+    Arguments:
+        pool (ThreadPoolExecutor), chunk (list): Manifest rows,
+        source_dir (str), destination_dir (str)
+
+    Returns:
+        list: (row_number, patient_id, filename, Future or None) tuples.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    existing = get_existing_patient_ids([patient_id for _, patient_id, _ in chunk if patient_id is not None])
+
+    pending = []
+    for row_number, patient_id, filename in chunk:
+        if patient_id not in existing or not filename:
+            pending.append((row_number, patient_id, filename, None))
+            continue
+        future = pool.submit(prepare_image, source_dir, destination_dir, filename)
+        pending.append((row_number, patient_id, filename, future))
+    return pending
+
+def release_chunk(pending, store):
+    """
+    Drop the references prepare_image() added for a chunk that never committed.
+
+    Description:
+        Waits for any decodes still running, so none add a reference after
+        this has returned. Images no patient points at are removed.
+
+    Arguments:
+        pending (list): Output of decode_chunk().
+        store (BlobStore): Store the images were copied to.
+
+    Returns:
+        None
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    for _, _, _, future in pending:
+        if future is None:
+            continue
+        try:
+            stored_name, _ = future.result()
+        except Exception:
+            continue
+        store.release(stored_name)
+
+def import_chunk(pending, destination_dir):
+    """
+    Score a decoded chunk and store the results.
+
+    Description:
+        Runs one predict call for the whole chunk (one per stage with the
+        cascade) and writes every result in a single transaction. The
+        recorded latency is the chunk's predict time divided across its
+        images. The decoded images are added to the tensor store so later
+        re-scoring does not decode them again. If a patient appears twice in
+        the chunk only the last image is kept. Replaced x-rays and their
+        overlays are released afterwards, as the web app releases them. If
+        the chunk fails before its transaction commits, the references its
+        images were stored with are released again.
+
+    Arguments:
+        pending (list): Output of decode_chunk().
+        destination_dir (str): Folder the images were copied to.
+
+    Returns:
+        Tuple: (images imported, rows skipped)
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    store = BlobStore(destination_dir, 'xrays', XRAY_DERIVATIVES)
+    decoded = {}
+    superseded = []
+    skipped = 0
+    try:
+        for row_number, patient_id, filename, future in pending:
+            if future is None:
+                print(f"Row {row_number}: skipped, unknown patient or missing filename", file=sys.stderr)
+                skipped += 1
+                continue
+            try:
+                stored_name, image = future.result()
+            except Exception as e:
+                print(f"Row {row_number}: skipped {filename}: {e}", file=sys.stderr)
+                skipped += 1
+                continue
+
+            if patient_id in decoded:
+                superseded.append(decoded[patient_id][0])
+                skipped += 1
+            decoded[patient_id] = (stored_name, image)
+
+        if not decoded:
+            return 0, skipped
+
+        patient_ids = list(decoded)
+        images = np.stack([decoded[patient_id][1] for patient_id in patient_ids])
+
+        started = time.perf_counter()
+        if CASCADE_ENABLED:
+            probabilities = cascade.predict_batch(images)
+            model_version = cascade.get_version()
+        else:
+            probabilities = get_model().predict(images, batch_size=len(images), verbose=0)[:, 0]
+            model_version = model_registry.get_version()
+        latency_ms = (time.perf_counter() - started) * 1000 / len(images)
+
+        thresholds = current_thresholds()
+        results = [
+            (patient_id, decoded[patient_id][0], float(probability), classify(probability, *thresholds), model_version, latency_ms)
+            for patient_id, probability in zip(patient_ids, probabilities)
+        ]
+        replaced = bulk_update_xray_predictions(results)
+    except BaseException:
+        release_chunk(pending, store)
+        raise
+
+    # Earlier images of a patient listed twice were never written
+    for stored_name in superseded:
+        store.release(stored_name)
+    tensor_store.put_many([decoded[patient_id] for patient_id in patient_ids])
+
+    for xray_img, heatmap_img in replaced:
+        release_xray(xray_img, heatmap_img, store)
+
+    return len(results), skipped
+
+def run_import(manifest, source_dir, destination_dir=XRAY_FOLDER, checkpoint=None, batch_size=BATCH_SIZE, workers=DECODE_WORKERS):
+    """
+    Import every x-ray listed in a manifest.
+
+    Description:
+        Decodes the next chunk in the pool while the current one is being
+        scored, so file reads, JPEG decoding and inference overlap. The
+        checkpoint is written after each chunk is committed.
+
+    Arguments:
+        manifest (str): Manifest CSV path.
+        source_dir (str): Folder the manifest filenames are relative to.
+        destination_dir (str): Folder to store imported x-rays in.
+        checkpoint (str, optional): Checkpoint path, defaults to manifest + ".checkpoint".
+        batch_size (int): Rows per inference batch and transaction.
+        workers (int): Decode pool size.
+
+    Returns:
+        dict: Rows done, images imported, rows skipped and elapsed seconds.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    checkpoint = checkpoint or f"{manifest}.checkpoint"
+    rows_done = read_checkpoint(checkpoint)
+    if rows_done:
+        print(f"Resuming after row {rows_done}")
+
+    os.makedirs(destination_dir, exist_ok=True)
+    imported = skipped = 0
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        decoding = None
+        for chunk in chunks(read_manifest(manifest, skip=rows_done), batch_size):
+            upcoming = decode_chunk(pool, chunk, source_dir, destination_dir)
+            if decoding is not None:
+                try:
+                    rows_done, imported, skipped = commit_chunk(decoding, destination_dir, checkpoint, rows_done, started, imported, skipped)
+                except BaseException:
+                    # The next chunk was decoded and stored but never imported
+                    release_chunk(upcoming, BlobStore(destination_dir, 'xrays', XRAY_DERIVATIVES))
+                    raise
+            decoding = upcoming
+
+        if decoding is not None:
+            rows_done, imported, skipped = commit_chunk(decoding, destination_dir, checkpoint, rows_done, started, imported, skipped)
+
+    return {
+        "rows_done": rows_done,
+        "imported": imported,
+        "skipped": skipped,
+        "seconds": time.perf_counter() - started
+    }
+
+def commit_chunk(pending, destination_dir, checkpoint, rows_done, started, imported, skipped):
+    """
+    Import a decoded chunk, advance the checkpoint and print progress.
+
+    Arguments:
+        pending (list): Output of decode_chunk().
+        destination_dir (str), checkpoint (str)
+        rows_done, imported, skipped (int): Running totals before this chunk.
+        started (float): perf_counter() value at the start of the run.
+
+    Returns:
+        Tuple: Updated (rows_done, imported, skipped).
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    chunk_imported, chunk_skipped = import_chunk(pending, destination_dir)
+    rows_done += len(pending)
+    imported += chunk_imported
+    skipped += chunk_skipped
+    write_checkpoint(checkpoint, rows_done)
+
+    elapsed = time.perf_counter() - started
+    rate = imported / elapsed if elapsed else 0
+    print(f"{rows_done} rows done, {imported} imported, {skipped} skipped ({rate:.1f} images/s)")
+    return rows_done, imported, skipped
+
+def main(argv=None):
+    """
+    Command-line entry point.
+
+    Description:
+        python -m inference.bulk_import manifest.csv --source /path/to/xrays
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    parser = argparse.ArgumentParser(description="Import and triage a directory of chest x-rays listed in a CSV manifest.")
+    parser.add_argument("manifest", help="CSV file with patient_id and filename columns")
+    parser.add_argument("--source", required=True, help="Folder the manifest filenames are relative to")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <manifest>.checkpoint)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=DECODE_WORKERS, help="Parallel JPEG decoders")
+    parser.add_argument("--restart", action="store_true", help="Ignore any existing checkpoint")
+    args = parser.parse_args(argv)
+
+    checkpoint = args.checkpoint or f"{args.manifest}.checkpoint"
+    if args.restart and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+    summary = run_import(args.manifest, args.source, checkpoint=checkpoint, batch_size=args.batch_size, workers=args.workers)
+    print(f"Done: {summary['imported']} imported, {summary['skipped']} skipped in {summary['seconds']:.1f}s")
+
+if __name__ == "__main__":
+    main()
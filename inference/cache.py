@@ -0,0 +1,122 @@
+import threading
+from db import get_cached_prediction, store_cached_prediction, evict_cached_predictions, count_cached_predictions
+
+PREDICTION_CACHE_MAX_ENTRIES = 10000
+
+# Stores between eviction sweeps; each process can take the table this many
+# entries past the limit before its next sweep trims it back
+PREDICTION_CACHE_EVICT_EVERY = 100
+
+class PredictionCache:
+    """
+    Persistent cache of model probabilities keyed by image digest.
+
+    Description:
+        Entries live in the prediction_cache table, keyed by the SHA-256 of the
+        uploaded file and the model version, so a retrained model never reuses
+        an old model's answer. The table is kept near max_entries by evicting
+        the least recently used rows. Counting the table on every insert
+        would cost more than the insert, so eviction runs once every
+        evict_every stores. Hit, miss and eviction counts are kept for this
+        process.
+
+    Arguments:
+        max_entries (int): Most entries to keep after each sweep.
+        evict_every (int): Stores between eviction sweeps.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    def __init__(self, max_entries=PREDICTION_CACHE_MAX_ENTRIES, evict_every=PREDICTION_CACHE_EVICT_EVERY):
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self._stores = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, digest, model_version):
+        """
+        Get the cached probability for an image.
+
+        Arguments:
+            digest (str): SHA-256 of the image file.
+            model_version (str or None): Version of the model in use.
+
+        Returns:
+            float or None: Probability on a hit, None on a miss.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        probability = None
+        if digest and model_version:
+            probability = get_cached_prediction(digest, model_version)
+
+        with self._lock:
+            if probability is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        return probability
+
+    def store(self, digest, model_version, probability):
+        """
+        Remember the probability a model gave for an image.
+
+        Arguments:
+            digest (str), model_version (str), probability (float)
+
+        Returns:
+            None
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        if not digest or not model_version:
+            return
+
+        store_cached_prediction(digest, model_version, float(probability))
+        with self._lock:
+            self._stores += 1
+            sweep = self._stores % self.evict_every == 0
+        if not sweep:
+            return
+
+        evicted = evict_cached_predictions(self.max_entries)
+        with self._lock:
+            self.evictions += evicted
+
+    def stats(self):
+        """
+        Describe cache effectiveness.
+
+        Arguments:
+            None
+
+        Returns:
+            dict: Entry count, limit, hits, misses, hit rate and evictions.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        with self._lock:
+            hits, misses, evictions = self.hits, self.misses, self.evictions
+
+        lookups = hits + misses
+        return {
+            "entries": count_cached_predictions(),
+            "max_entries": self.max_entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else None,
+            "evictions": evictions
+        }
+
+prediction_cache = PredictionCache()
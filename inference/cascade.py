@@ -0,0 +1,210 @@
+import threading
+from inference.model import ModelRegistry, current_thresholds, model_registry
+from inference.batching import MicroBatcher, batcher
+
+# When True, a cheap first-stage model scores every image and only images
+# near the triage band are sent on to the full model
+CASCADE_ENABLED = False
+FIRST_STAGE_MODEL_PATH = 'machine-learning/first_stage_model.tflite'
+FIRST_STAGE_BACKEND = 'tflite'
+
+# How far outside the triage band a first-stage probability still counts as
+# uncertain, to allow for the first-stage model's error
+CASCADE_MARGIN = 0.005
+
+first_stage_registry = ModelRegistry(FIRST_STAGE_MODEL_PATH, FIRST_STAGE_BACKEND)
+
+def predict_with_first_stage(batch):
+    """
+    Run the first-stage model on a batch of images.
+
+    Arguments:
+        batch (numpy.ndarray): float32 array of shape (n, 64, 64, 1).
+
+    Returns:
+        numpy.ndarray: Probabilities of shape (n, 1).
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    return first_stage_registry.load().predict(batch, batch_size=len(batch), verbose=0)
+
+first_stage_batcher = MicroBatcher(predict_with_first_stage)
+
+class CascadePredictor:
+    """
+    Two-stage predictor that only runs the full model on uncertain images.
+
+    Description:
+        The first stage scores every image. Probabilities clearly outside
+        the triage band (widened by margin) are final; anything inside it is
+        escalated to the full model, whose probability is used instead.
+        Exposes the same predict() and stats() calls as the micro-batcher,
+        and reports how many images were escalated.
+
+    Arguments:
+        first_stage (MicroBatcher): Batches images for the cheap model.
+        full (MicroBatcher): Batches images for the full model.
+        margin (float): Widening applied to the triage band for routing.
+        first_stage_registry, full_registry (ModelRegistry): Used for versions.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    def __init__(self, first_stage=first_stage_batcher, full=batcher, margin=CASCADE_MARGIN,
+                 first_stage_registry=first_stage_registry, full_registry=model_registry):
+        self.first_stage = first_stage
+        self.full = full
+        self.margin = margin
+        self.first_stage_registry = first_stage_registry
+        self.full_registry = full_registry
+        self.images = 0
+        self.escalated = 0
+        self._lock = threading.Lock()
+
+    def escalates(self, probability, thresholds):
+        """
+        Decide whether a first-stage probability needs the full model.
+
+        Description:
+            The thresholds come from the database, so callers read them once
+            per predict call with current_thresholds() and pass them in
+            rather than querying for every image.
+
+        Arguments:
+            probability (float)
+            thresholds (Tuple): (low, high) triage thresholds.
+
+        Returns:
+            bool: True if it falls within the widened triage band.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        low, high = thresholds
+        return low - self.margin <= probability <= high + self.margin
+
+    def _count(self, images, escalated):
+        with self._lock:
+            self.images += images
+            self.escalated += escalated
+
+    def predict(self, image, timeout=None):
+        """
+        Predict one image through the cascade.
+
+        Arguments:
+            image (numpy.ndarray): float32 array of shape (64, 64, 1).
+            timeout (float, optional): Seconds to wait for each stage.
+
+        Returns:
+            float: Probability from the stage that decided the image.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        return self._predict(image, timeout, features=False)[0]
+
+    def predict_with_features(self, image, timeout=None):
+        """
+        Predict one image through the cascade, keeping the full model's features.
+
+        Arguments:
+            image (numpy.ndarray): float32 array of shape (64, 64, 1).
+            timeout (float, optional): Seconds to wait for each stage.
+
+        Returns:
+            Tuple: (probability, the full model's penultimate features, or
+            None if the first stage decided the image)
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        return self._predict(image, timeout, features=True)
+
+    def _predict(self, image, timeout, features):
+        probability = self.first_stage.predict(image, timeout)
+        escalate = self.escalates(probability, current_thresholds())
+        image_features = None
+        if escalate and features:
+            probability, image_features = self.full.predict_with_features(image, timeout)
+        elif escalate:
+            probability = self.full.predict(image, timeout)
+
+        self._count(1, int(escalate))
+        return probability, image_features
+
+    def predict_batch(self, images):
+        """
+        Predict a batch through the cascade with one call per stage.
+
+        Arguments:
+            images (numpy.ndarray): float32 array of shape (n, 64, 64, 1).
+
+        Returns:
+            list: One probability per image.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        import numpy as np
+
+        probabilities = np.asarray(self.first_stage.predict_fn(images)).reshape(len(images), -1)[:, 0].tolist()
+        thresholds = current_thresholds()
+        uncertain = [index for index, probability in enumerate(probabilities) if self.escalates(probability, thresholds)]
+
+        if uncertain:
+            full = np.asarray(self.full.predict_fn(images[uncertain])).reshape(len(uncertain), -1)[:, 0]
+            for index, probability in zip(uncertain, full):
+                probabilities[index] = float(probability)
+
+        self._count(len(images), len(uncertain))
+        return probabilities
+
+    def get_version(self):
+        """
+        Version of the cascade as a whole, used to key cached predictions.
+
+        Returns:
+            str or None: Both stage versions, None if either is missing.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        first, full = self.first_stage_registry.get_version(), self.full_registry.get_version()
+        if first is None or full is None:
+            return None
+        return f"cascade-{first}-{full}"
+
+    def stats(self):
+        """
+        Describe routing and both stages' batching.
+
+        Returns:
+            dict: Images seen, images escalated, escalation share and the
+            stage batchers' stats.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        with self._lock:
+            images, escalated = self.images, self.escalated
+
+        return {
+            "margin": self.margin,
+            "images": images,
+            "escalated": escalated,
+            "escalation_share": escalated / images if images else None,
+            "first_stage": self.first_stage.stats(),
+            "full": self.full.stats()
+        }
+
+cascade = CascadePredictor()
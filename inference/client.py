@@ -0,0 +1,259 @@
+import json
+import socket
+import threading
+import time
+from collections import deque
+from multiprocessing.shared_memory import SharedMemory
+from inference.model import INFERENCE_SOCKET, INFERENCE_TIMEOUT
+
+STATS_WINDOW = 1000
+
+class InferenceServerError(RuntimeError):
+    """
+    Raised when the inference server cannot be reached or reports an error.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+class InferenceServerBusy(InferenceServerError):
+    """
+    Raised when the inference server turned a request away because it is full.
+
+    Arguments:
+        retry_after (float): Seconds the server suggests waiting.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class InferenceClient:
+    """
+    Sends images to the inference server instead of running the model here.
+
+    Description:
+        Images are written into a shared memory block and only the block
+        name and shape cross the socket, so tensors are never pickled or
+        serialised. Each thread keeps its own connection, which is dropped on
+        any error and reopened on the next call, so a restarted server is
+        picked up without restarting the web app. Exposes the same predict()
+        and stats() calls as the micro-batcher. Every reply carries the
+        version of the model that scored it, so callers record that version
+        rather than their own registry's, even while the server hot-swaps.
+
+    Arguments:
+        socket_path (str): Unix socket the server listens on.
+        timeout (float): Seconds to wait for a connection or a reply.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    def __init__(self, socket_path=INFERENCE_SOCKET, timeout=INFERENCE_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.errors = 0
+        self.version = None
+        self._round_trips = deque(maxlen=STATS_WINDOW)
+
+    def _connection(self, timeout):
+        stream = getattr(self._local, "stream", None)
+        if stream is None:
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connection.settimeout(timeout)
+            connection.connect(self.socket_path)
+            stream = connection.makefile('rwb')
+            self._local.connection, self._local.stream = connection, stream
+        self._local.connection.settimeout(timeout)
+        return stream
+
+    def _disconnect(self):
+        stream = getattr(self._local, "stream", None)
+        if stream is not None:
+            try:
+                stream.close()
+                self._local.connection.close()
+            except OSError:
+                pass
+        self._local.stream = self._local.connection = None
+
+    def request(self, message, timeout=None):
+        """
+        Send one request line and read the reply.
+
+        Arguments:
+            message (dict): Request for InferenceServer.handle().
+            timeout (float, optional): Overrides the client timeout.
+
+        Returns:
+            dict: The server's reply.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        try:
+            stream = self._connection(timeout or self.timeout)
+            stream.write(json.dumps(message).encode() + b"\n")
+            stream.flush()
+            line = stream.readline()
+        except OSError as e:
+            self._disconnect()
+            raise InferenceServerError(f"Inference server unavailable: {e}") from e
+
+        if not line:
+            self._disconnect()
+            raise InferenceServerError("Inference server closed the connection")
+
+        reply = json.loads(line)
+        if reply.get("overloaded"):
+            raise InferenceServerBusy(reply["error"], reply.get("retry_after", 1.0))
+        if "error" in reply:
+            raise InferenceServerError(reply["error"])
+        return reply
+
+    def predict_batch(self, images, timeout=None):
+        """
+        Predict several images in one round trip.
+
+        Arguments:
+            images (numpy.ndarray): float32 array of shape (n, 64, 64, 1).
+            timeout (float, optional): Overrides the client timeout.
+
+        Returns:
+            list: One probability per image.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        return self.predict_batch_with_version(images, timeout)[0]
+
+    def predict_batch_with_version(self, images, timeout=None):
+        """
+        Predict several images in one round trip and say which model did.
+
+        Arguments:
+            images (numpy.ndarray): float32 array of shape (n, 64, 64, 1).
+            timeout (float, optional): Overrides the client timeout.
+
+        Returns:
+            Tuple: (one probability per image, the server's model version)
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        import numpy as np
+
+        images = np.ascontiguousarray(images, dtype=np.float32)
+        started = time.perf_counter()
+        shm = SharedMemory(create=True, size=images.nbytes)
+
+        try:
+            np.ndarray(images.shape, dtype=np.float32, buffer=shm.buf)[...] = images
+            reply = self.request({"op": "predict", "shm": shm.name, "shape": list(images.shape)}, timeout)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            shm.close()
+            shm.unlink()
+
+        with self._lock:
+            self.requests += 1
+            self._round_trips.append(time.perf_counter() - started)
+            self.version = reply.get("model_version")
+
+        return reply["probabilities"], reply.get("model_version")
+
+    def predict(self, image, timeout=None):
+        """
+        Predict one image on the server.
+
+        Arguments:
+            image (numpy.ndarray): float32 array of shape (64, 64, 1).
+            timeout (float, optional): Overrides the client timeout.
+
+        Returns:
+            float: Probability for the image.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        return self.predict_batch(image[None, ...], timeout)[0]
+
+    def predict_with_version(self, image, timeout=None):
+        """
+        Predict one image on the server and say which model scored it.
+
+        Returns:
+            Tuple: (probability, the server's model version)
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        probabilities, version = self.predict_batch_with_version(image[None, ...], timeout)
+        return probabilities[0], version
+
+    def get_version(self):
+        """
+        Get the version the server last scored with, asking it if there has been no prediction yet.
+
+        Returns:
+            str or None: None if the server cannot be reached.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        if self.version is not None:
+            return self.version
+        try:
+            return self.request({"op": "status"})["model_version"]
+        except InferenceServerError:
+            return None
+
+    def stats(self):
+        """
+        Describe this client's traffic and the server's own status.
+
+        Arguments:
+            None
+
+        Returns:
+            dict: Request counts, round-trip times and the server status,
+            or the reason the server could not be asked.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        with self._lock:
+            round_trips = sorted(self._round_trips)
+            requests, errors = self.requests, self.errors
+
+        try:
+            server = self.request({"op": "status"})
+        except InferenceServerError as e:
+            server = {"error": str(e)}
+
+        return {
+            "socket": self.socket_path,
+            "requests": requests,
+            "errors": errors,
+            "mean_round_trip_ms": sum(round_trips) / len(round_trips) * 1000 if round_trips else None,
+            "p95_round_trip_ms": round_trips[int(0.95 * (len(round_trips) - 1))] * 1000 if round_trips else None,
+            "server": server
+        }
@@ -0,0 +1,788 @@
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from db import list_confirmed_outcomes, list_xray_patients
+from inference.model import model_registry
+from inference.tensor_store import file_lock, tensor_store
+
+EMBEDDING_DIR = 'database/embeddings'
+VECTORS_FILE = 'vectors.f16'
+IDS_FILE = 'patients.i64'
+CENTROIDS_FILE = 'centroids.f32'
+LOCK_FILE = 'embeddings.lock'
+
+SIMILAR_CASES = 5
+
+# How long the set of confirmed patients is reused before asking the
+# database again
+CONFIRMED_REFRESH_SECONDS = 30.0
+
+# Past this many confirmed cases searches go through an inverted-file index
+# instead of scoring every case, probing ANN_PROBE of its lists
+ANN_THRESHOLD = 50000
+ANN_PROBE = 8
+KMEANS_ITERATIONS = 10
+
+# Rows assigned to lists per matrix product, to bound memory
+ASSIGN_CHUNK_SIZE = 8192
+
+def penultimate_embedder(model):
+    """
+    Get a function that returns a model's features before its final Dense layer.
+
+    Arguments:
+        model: Keras model or NumpyModel.
+
+    Returns:
+        callable or None: (n, 64, 64, 1) images to (n, d) features, None for
+        backends that cannot expose intermediate layers (TFLite).
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    if hasattr(model, 'embed'):
+        return model.embed
+    if not hasattr(model, 'layers'):
+        return None
+
+    import keras
+
+    features = keras.Model(model.inputs, penultimate_output(model))
+    return lambda images: features.predict(images, batch_size=len(images), verbose=0).reshape(len(images), -1)
+
+def penultimate_scorer(model):
+    """
+    Get a function that returns a model's probabilities and penultimate features from one forward pass.
+
+    Arguments:
+        model: Keras model or NumpyModel.
+
+    Returns:
+        callable or None: (n, 64, 64, 1) images to a tuple of (n, 1)
+        probabilities and (n, d) features, None for backends that cannot
+        expose intermediate layers (TFLite).
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    if hasattr(model, 'predict_with_features'):
+        return model.predict_with_features
+    if not hasattr(model, 'layers'):
+        return None
+
+    import keras
+
+    both = keras.Model(model.inputs, [model.outputs[0], penultimate_output(model)])
+
+    def score(images):
+        probabilities, features = both.predict(images, batch_size=len(images), verbose=0)
+        return probabilities, features.reshape(len(images), -1)
+
+    return score
+
+def penultimate_output(model):
+    import keras
+
+    last_dense = max(index for index, layer in enumerate(model.layers) if isinstance(layer, keras.layers.Dense))
+    return model.layers[last_dense - 1].output if last_dense else model.inputs[0]
+
+def train_centroids(matrix, lists, iterations=KMEANS_ITERATIONS, seed=0):
+    """
+    Cluster unit vectors with spherical k-means for an inverted-file index.
+
+    Arguments:
+        matrix (numpy.ndarray): (n, d) float32 unit vectors.
+        lists (int): Number of clusters.
+        iterations (int), seed (int)
+
+    Returns:
+        numpy.ndarray: (lists, d) float32 unit centroids.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    centroids = matrix[rng.choice(len(matrix), lists, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignment = np.argmax(matrix @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, matrix)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+
+    return centroids.astype(np.float32)
+
+def assign_lists(vectors, centroids, chunk_size=ASSIGN_CHUNK_SIZE):
+    """
+    Find the nearest centroid for each vector, a chunk at a time.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    import numpy as np
+
+    return np.concatenate([
+        np.argmax(vectors[start:start + chunk_size] @ centroids.T, axis=1)
+        for start in range(0, len(vectors), chunk_size)
+    ] or [np.empty(0, dtype=np.int64)]).astype(np.int32)
+
+class EmbeddingIndex:
+    """
+    On-disk float16 matrix of x-ray embeddings for finding similar confirmed cases.
+
+    Description:
+        Each scored x-ray's penultimate-layer features are L2-normalised and
+        appended to a float16 file for the model version, with the patient
+        ID in a parallel file. The latest row for a patient wins, so a new
+        x-ray replaces the old one without rewriting anything.
+
+        The matrix is kept in memory as float32 and only rows appended since
+        the last search are read, so cosine similarity against every case is
+        one matrix-vector product. Searches only return patients with a
+        confirmed outcome. Which patients those are is refreshed from the
+        database every CONFIRMED_REFRESH_SECONDS.
+
+        Past ann_threshold confirmed cases an inverted-file index narrows
+        each search to the nearest clusters. Its centroids are trained once
+        per model version and saved next to the matrix, and new rows join
+        the nearest existing list as they arrive. Training, assigning rows
+        after new centroids and refreshing the confirmed set all run on a
+        background thread, so a search never waits for them; until the
+        index is ready searches score every case. refresh() does the same
+        work inline, for the command line and tests.
+
+    Arguments:
+        root (str): Folder holding one sub-folder per model version.
+        registry (ModelRegistry): Model used to compute embeddings.
+        ann_threshold (int): Confirmed cases before the approximate index is used.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    def __init__(self, root=EMBEDDING_DIR, registry=model_registry, ann_threshold=ANN_THRESHOLD):
+        self.root = root
+        self.registry = registry
+        self.ann_threshold = ann_threshold
+        self.searches = 0
+        self._embedder = (None, None)
+        self._lock = threading.Lock()
+        self._maintaining = False
+        self._reset(None)
+
+    def _reset(self, version):
+        self._version = version
+        self._dim = None
+        self._rows_read = 0
+        self._count = 0
+        self._ids = None
+        self._vectors = None
+        self._lists = None
+        self._row_of = {}
+        self._centroids = None
+        self._centroids_mtime = None
+        self._confirmed = None
+        self._confirmed_at = 0.0
+
+    def _folder(self, version):
+        return os.path.join(self.root, version)
+
+    def embed(self, images):
+        """
+        Compute normalised embeddings with the registry's current model.
+
+        Arguments:
+            images (numpy.ndarray): float32 array of shape (n, 64, 64, 1).
+
+        Returns:
+            Tuple: (model version, float32 array (n, d)), or (version, None)
+            if the backend cannot produce embeddings.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        import numpy as np
+
+        model = self.registry.load()
+        version = self.registry.get_version()
+
+        with self._lock:
+            if self._embedder[0] is not model:
+                self._embedder = (model, penultimate_embedder(model))
+            embedder = self._embedder[1]
+
+        if embedder is None:
+            return version, None
+
+        vectors = np.asarray(embedder(images), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return version, vectors / np.maximum(norms, 1e-12)
+
+    def add_many(self, patient_ids, images):
+        """
+        Embed x-rays and append them to the current model version's matrix.
+
+        Arguments:
+            patient_ids (list), images (numpy.ndarray): One image per patient.
+
+        Returns:
+            int: Rows added, 0 if the backend cannot produce embeddings.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        import numpy as np
+
+        if not len(patient_ids):
+            return 0
+
+        version, vectors = self.embed(images)
+        if vectors is None or version is None:
+            return 0
+
+        return self._append(patient_ids, vectors, version)
+
+    def add(self, patient_id, image):
+        return self.add_many([patient_id], image[None, ...])
+
+    def add_features(self, patient_ids, features, version=None):
+        """
+        Append features the model already produced while scoring the x-rays.
+
+        Arguments:
+            patient_ids (list)
+            features (numpy.ndarray): (n, d) penultimate-layer features.
+            version (str, optional): Model version that produced them,
+                defaults to the registry's.
+
+        Returns:
+            int: Rows added.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        import numpy as np
+
+        version = version or self.registry.get_version()
+        if not len(patient_ids) or version is None:
+            return 0
+
+        vectors = np.asarray(features, dtype=np.float32).reshape(len(patient_ids), -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return self._append(patient_ids, vectors / np.maximum(norms, 1e-12), version)
+
+    def _append(self, patient_ids, vectors, version):
+        import numpy as np
+
+        dim = vectors.shape[1]
+        folder = self._folder(version)
+        with file_lock(folder, LOCK_FILE):
+            # Cut both files back to the same length in case an earlier
+            # append was interrupted between them
+            rows = self._rows(folder, dim)
+            appends = (
+                (VECTORS_FILE, dim * 2, vectors.astype(np.float16)),
+                (IDS_FILE, 8, np.asarray(patient_ids, dtype=np.int64))
+            )
+            for name, row_bytes, data in appends:
+                with open(os.path.join(folder, name), 'ab') as f:
+                    f.truncate(rows * row_bytes)
+                    f.write(data.tobytes())
+
+            with open(os.path.join(folder, 'dim'), 'w') as f:
+                f.write(str(dim))
+
+        return len(patient_ids)
+
+    def _rows(self, folder, dim):
+        try:
+            vector_rows = os.path.getsize(os.path.join(folder, VECTORS_FILE)) // (dim * 2)
+            id_rows = os.path.getsize(os.path.join(folder, IDS_FILE)) // 8
+        except FileNotFoundError:
+            return 0
+        return min(vector_rows, id_rows)
+
+    def _sync(self, version):
+        """
+        Bring the in-memory matrix up to date with the version's files.
+
+        Description:
+            Called with the lock held. Only rows appended since the last
+            call are read. A patient's new row overwrites their old one in
+            place and joins the nearest list of the current centroids.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        import numpy as np
+
+        if version != self._version:
+            self._reset(version)
+
+        folder = self._folder(version)
+        if self._dim is None:
+            try:
+                with open(os.path.join(folder, 'dim')) as f:
+                    self._dim = int(f.read())
+            except FileNotFoundError:
+                return
+
+        dim = self._dim
+        rows = self._rows(folder, dim)
+        if rows < self._rows_read:
+            # The files were cut back or replaced; start again
+            self._reset(version)
+            return self._sync(version)
+        if rows == self._rows_read:
+            return
+
+        start, count = self._rows_read, rows - self._rows_read
+        ids = np.fromfile(os.path.join(folder, IDS_FILE), dtype=np.int64, count=count, offset=start * 8)
+        vectors = np.fromfile(
+            os.path.join(folder, VECTORS_FILE), dtype=np.float16, count=count * dim, offset=start * dim * 2
+        ).reshape(count, dim)
+        self._rows_read = rows
+
+        # np.unique on the reversed IDs finds each patient's last new row
+        unique_ids, last = np.unique(ids[::-1], return_index=True)
+        vectors = vectors[count - 1 - last].astype(np.float32)
+
+        existing = np.fromiter((self._row_of.get(patient_id, -1) for patient_id in unique_ids.tolist()),
+                               dtype=np.int64, count=len(unique_ids))
+        added = existing < 0
+        new_rows = np.arange(self._count, self._count + int(added.sum()))
+        self._reserve(self._count + len(new_rows), dim)
+        self._row_of.update(zip(unique_ids[added].tolist(), new_rows.tolist()))
+        self._ids[new_rows] = unique_ids[added]
+        self._count += len(new_rows)
+
+        targets = existing.copy()
+        targets[added] = new_rows
+        self._vectors[targets] = vectors
+        if self._centroids is not None:
+            self._lists[targets] = assign_lists(vectors, self._centroids)
+
+    def _reserve(self, rows, dim):
+        import numpy as np
+
+        capacity = 0 if self._ids is None else len(self._ids)
+        if rows <= capacity:
+            return
+
+        capacity = max(rows, capacity * 2, 1024)
+        ids = np.zeros(capacity, dtype=np.int64)
+        vectors = np.zeros((capacity, dim), dtype=np.float32)
+        lists = np.full(capacity, -1, dtype=np.int32)
+        if self._count:
+            ids[:self._count] = self._ids[:self._count]
+            vectors[:self._count] = self._vectors[:self._count]
+            lists[:self._count] = self._lists[:self._count]
+        self._ids, self._vectors, self._lists = ids, vectors, lists
+
+    def _snapshot(self, outcomes):
+        """
+        Mark which loaded rows are confirmed cases, grouped by list.
+
+        Arguments:
+            outcomes (dict): Patient ID to pneumonia_confirmed.
+
+        Returns:
+            dict: rows covered, per-row confirmed mask and outcome, and
+            (confirmed rows ordered by list, start offset of each list) once
+            there are centroids.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        import numpy as np
+
+        with self._lock:
+            count, ids, lists, centroids = self._count, self._ids, self._lists, self._centroids
+
+        if not count:
+            return {"rows": 0, "mask": np.zeros(0, dtype=bool), "outcomes": np.zeros(0, dtype=bool), "ivf": None}
+
+        ids = ids[:count]
+        confirmed_ids = np.fromiter(outcomes, dtype=np.int64, count=len(outcomes))
+        confirmed_outcomes = np.fromiter((bool(value) for value in outcomes.values()), dtype=bool, count=len(outcomes))
+        sorter = np.argsort(confirmed_ids)
+        position = np.minimum(np.searchsorted(confirmed_ids, ids, sorter=sorter), max(len(outcomes) - 1, 0))
+        found = sorter[position] if len(outcomes) else np.zeros(count, dtype=np.int64)
+        mask = confirmed_ids[found] == ids if len(outcomes) else np.zeros(count, dtype=bool)
+
+        ivf = None
+        if centroids is not None and mask.sum() > self.ann_threshold:
+            rows = np.nonzero(mask)[0]
+            row_lists = lists[:count][rows]
+            order = np.argsort(row_lists, kind='stable')
+            ivf = (rows[order], np.searchsorted(row_lists[order], np.arange(len(centroids) + 1)))
+
+        return {
+            "rows": count,
+            "mask": mask,
+            "outcomes": confirmed_outcomes[found] & mask if len(outcomes) else mask,
+            "ivf": ivf
+        }
+
+    def _needs_training(self, confirmed):
+        # Lists are about sqrt(cases) long, so retrain once cases have grown
+        # fourfold since the centroids were trained
+        cases = int(confirmed["mask"].sum())
+        if cases <= self.ann_threshold:
+            return False
+        return self._centroids is None or cases > 4 * len(self._centroids) ** 2
+
+    def _load_centroids(self, version):
+        """
+        Pick up centroids saved by another process or the command line.
+
+        Returns:
+            numpy.ndarray or None: New centroids, None if unchanged.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        import numpy as np
+
+        path = os.path.join(self._folder(version), CENTROIDS_FILE)
+        try:
+            mtime = os.path.getmtime(path)
+        except FileNotFoundError:
+            return None
+        if mtime == self._centroids_mtime or not self._dim:
+            return None
+
+        self._centroids_mtime = mtime
+        return np.fromfile(path, dtype=np.float32).reshape(-1, self._dim)
+
+    def _install(self, version, centroids):
+        """
+        Assign every loaded row to new centroids and start using them.
+
+        Description:
+            The bulk of the rows is assigned without the lock; rows added
+            meanwhile are assigned when the centroids are swapped in.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        with self._lock:
+            count, vectors = self._count, self._vectors
+
+        lists = assign_lists(vectors[:count], centroids)
+
+        with self._lock:
+            if self._version != version:
+                return
+            self._lists[:count] = lists
+            if self._count > count:
+                self._lists[count:self._count] = assign_lists(self._vectors[count:self._count], centroids)
+            self._centroids = centroids
+
+    def refresh(self, version=None):
+        """
+        Reload the confirmed cases and train or update the approximate index.
+
+        Description:
+            Runs on the background thread after a search finds the confirmed
+            set out of date, or directly from the command line.
+
+        Arguments:
+            version (str, optional): Defaults to the registry's version.
+
+        Returns:
+            None
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        import numpy as np
+
+        version = version or self.registry.get_version()
+        if version is None:
+            return
+
+        with self._lock:
+            self._sync(version)
+            saved = self._load_centroids(version)
+        if saved is not None:
+            self._install(version, saved)
+
+        outcomes = dict(list_confirmed_outcomes())
+        confirmed = self._snapshot(outcomes)
+
+        with self._lock:
+            train = self._needs_training(confirmed)
+            vectors = self._vectors[:confirmed["rows"]][confirmed["mask"]] if train else None
+
+        if train:
+            centroids = train_centroids(vectors, int(np.sqrt(len(vectors))))
+            self._save_centroids(version, centroids)
+            self._install(version, centroids)
+            confirmed = self._snapshot(outcomes)
+
+        with self._lock:
+            if self._version == version:
+                self._confirmed = confirmed
+                self._confirmed_at = time.monotonic()
+
+    def _save_centroids(self, version, centroids):
+        folder = self._folder(version)
+        path = os.path.join(folder, CENTROIDS_FILE)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with file_lock(folder, LOCK_FILE):
+            centroids.tofile(tmp_path)
+            os.replace(tmp_path, path)
+        with self._lock:
+            self._centroids_mtime = os.path.getmtime(path)
+
+    def _maintain(self, version):
+        try:
+            self.refresh(version)
+        except Exception as e:
+            print(f"Embedding index refresh failed: {e}")
+        finally:
+            with self._lock:
+                self._maintaining = False
+
+    def _current(self, version):
+        """
+        Get the matrix and confirmed cases to search, refreshing them in the background when stale.
+
+        Description:
+            Only the very first call in a process builds the confirmed set
+            inline, without the approximate index.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        with self._lock:
+            self._sync(version)
+            first = self._confirmed is None and self._count > 0
+
+        if first:
+            confirmed = self._snapshot(dict(list_confirmed_outcomes()))
+            confirmed["ivf"] = None
+            with self._lock:
+                if self._confirmed is None:
+                    self._confirmed = confirmed
+                    self._confirmed_at = 0.0
+
+        with self._lock:
+            stale = time.monotonic() - self._confirmed_at >= CONFIRMED_REFRESH_SECONDS
+            start = self._confirmed is not None and stale and not self._maintaining
+            if start:
+                self._maintaining = True
+            state = (self._ids, self._vectors, self._row_of, self._centroids, self._confirmed)
+
+        if start:
+            threading.Thread(target=self._maintain, args=(version,), name="embedding-refresh", daemon=True).start()
+        return state
+
+    def similar(self, patient_id, k=SIMILAR_CASES):
+        """
+        Find the confirmed cases whose x-rays look most like a patient's.
+
+        Arguments:
+            patient_id (int)
+            k (int): Most cases to return.
+
+        Returns:
+            list: Dicts of patient_id, pneumonia_confirmed and cosine
+            similarity, most similar first. Empty if the patient's x-ray has
+            no embedding for the current model version.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        import numpy as np
+
+        version = self.registry.get_version()
+        if version is None:
+            return []
+
+        ids, vectors, row_of, centroids, confirmed = self._current(version)
+        row = row_of.get(patient_id)
+        if confirmed is None or row is None:
+            return []
+        query = vectors[row]
+
+        if confirmed["ivf"] is not None and centroids is not None:
+            order, offsets = confirmed["ivf"]
+            probe = min(ANN_PROBE, len(centroids))
+            nearest = np.argpartition(-(centroids @ query), probe - 1)[:probe]
+            candidates = np.concatenate([order[offsets[cluster]:offsets[cluster + 1]] for cluster in nearest])
+            similarity = vectors[candidates] @ query
+        else:
+            candidates = np.arange(confirmed["rows"])
+            similarity = vectors[:confirmed["rows"]] @ query
+            similarity[~confirmed["mask"]] = -np.inf
+
+        # Never return the patient as their own match
+        similarity[candidates == row] = -np.inf
+
+        count = min(k, int(np.isfinite(similarity).sum()))
+        if count == 0:
+            return []
+        top = np.argpartition(-similarity, count - 1)[:count]
+        top = top[np.argsort(-similarity[top])]
+
+        self.searches += 1
+        return [
+            {
+                "patient_id": int(ids[candidates[index]]),
+                "pneumonia_confirmed": bool(confirmed["outcomes"][candidates[index]]),
+                "similarity": float(similarity[index])
+            }
+            for index in top
+        ]
+
+    def embedded_patients(self, version):
+        """
+        Get the patients that have an embedding for a model version.
+
+        Returns:
+            set: Patient IDs.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        with self._lock:
+            self._sync(version)
+            return set(self._row_of)
+
+    def stats(self):
+        """
+        Describe the current version's index.
+
+        Returns:
+            dict: Version, patients embedded, confirmed cases searchable,
+            whether the approximate index is in use and with how many lists,
+            whether a refresh is running, and searches served.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        version = self.registry.get_version()
+        if version:
+            _, _, _, centroids, confirmed = self._current(version)
+        else:
+            centroids, confirmed = None, None
+
+        return {
+            "model_version": version,
+            "patients": self._count if version else 0,
+            "confirmed": int(confirmed["mask"].sum()) if confirmed is not None else 0,
+            "approximate": bool(confirmed and confirmed["ivf"] is not None),
+            "lists": len(centroids) if centroids is not None else 0,
+            "refreshing": self._maintaining,
+            "searches": self.searches
+        }
+
+embedding_index = EmbeddingIndex()
+
+def build(batch_size=64, workers=4, image_folder=None):
+    """
+    Embed every patient x-ray that the current model version has no embedding for.
+
+    Arguments:
+        batch_size (int), workers (int): Decode pool size.
+        image_folder (str, optional): Defaults to the app's x-ray folder.
+
+    Returns:
+        int: X-rays embedded.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    from storage import XRAY_FOLDER
+
+    image_folder = image_folder or XRAY_FOLDER
+    embedding_index.registry.load()
+    done = embedding_index.embedded_patients(embedding_index.registry.get_version())
+
+    added = 0
+    after_id = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            patients = list_xray_patients(after_id, batch_size)
+            if not patients:
+                break
+            after_id = patients[-1]['id']
+
+            patients = [patient for patient in patients if patient['id'] not in done]
+            if not patients:
+                continue
+
+            images, failed = tensor_store.load_many(
+                [patient['xray_img'] for patient in patients],
+                [os.path.join(image_folder, patient['xray_img']) for patient in patients],
+                pool
+            )
+            if images is not None:
+                added += embedding_index.add_many(
+                    [patient['id'] for index, patient in enumerate(patients) if index not in failed], images
+                )
+
+    return added
+
+def main(argv=None):
+    """
+    Command-line entry point.
+
+    Description:
+        python -m inference.embeddings build
+        python -m inference.embeddings train
+        python -m inference.embeddings similar PATIENT_ID
+        python -m inference.embeddings stats
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    parser = argparse.ArgumentParser(description="Build and query the similar-case embedding index.")
+    parser.add_argument("command", choices=["build", "train", "similar", "stats"])
+    parser.add_argument("patient_id", nargs="?", type=int)
+    parser.add_argument("-k", type=int, default=SIMILAR_CASES)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        print(f"Embedded {build()} x-rays")
+    elif args.command == "train":
+        embedding_index.refresh()
+        print(json.dumps(embedding_index.stats(), indent=2))
+    elif args.command == "similar":
+        if args.patient_id is None:
+            parser.error("similar needs a patient ID")
+        started = time.perf_counter()
+        cases = embedding_index.similar(args.patient_id, args.k)
+        print(json.dumps({"cases": cases, "milliseconds": (time.perf_counter() - started) * 1000}, indent=2))
+    else:
+        print(json.dumps(embedding_index.stats(), indent=2))
+
+if __name__ == "__main__":
+    main()
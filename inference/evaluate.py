@@ -0,0 +1,400 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from db import list_confirmed_xrays
+from inference.model import current_thresholds
+from inference.backfill import score, target_version
+from inference.preprocess import decode_xray
+from inference.tensor_store import tensor_store
+from storage import XRAY_FOLDER
+
+EVALUATION_DIR = 'machine-learning/evaluations'
+BATCH_SIZE = 64
+DECODE_WORKERS = 4
+
+# Candidate thresholds tried for each end of the triage band
+THRESHOLD_STEPS = 1001
+
+# The recommended band is the most precise one that still finds this share
+# of confirmed pneumonia cases
+MIN_RECALL = 0.99
+
+# Most points kept for each curve in the JSON report
+CURVE_POINTS = 200
+
+def labelled_directory(root):
+    """
+    Find labelled x-rays in a folder laid out like the training data.
+
+    Description:
+        Images under a folder named NORMAL are negatives and images under a
+        folder named PNEUMONIA are positives (case-insensitive, at any
+        depth), e.g. test/NORMAL/a.jpeg and test/PNEUMONIA/b.jpeg.
+
+    Arguments:
+        root (str)
+
+    Returns:
+        Tuple: (names relative to root, full paths, labels as 0/1)
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    names, paths, labels = [], [], []
+    for folder, _, files in sorted(os.walk(root)):
+        parts = {part.lower() for part in os.path.relpath(folder, root).split(os.sep)}
+        if 'pneumonia' in parts:
+            label = 1
+        elif 'normal' in parts:
+            label = 0
+        else:
+            continue
+
+        for filename in sorted(files):
+            if filename.lower().endswith(('.jpg', '.jpeg')):
+                path = os.path.join(folder, filename)
+                names.append(os.path.relpath(path, root))
+                paths.append(path)
+                labels.append(label)
+
+    if not names:
+        raise ValueError(f"No x-rays under NORMAL or PNEUMONIA folders in {root}")
+
+    return names, paths, np.array(labels, dtype=np.int8)
+
+def confirmed_cases(image_folder=XRAY_FOLDER):
+    """
+    Use clinician-confirmed patients as labelled data.
+
+    Returns:
+        Tuple: (x-ray filenames, full paths, labels as 0/1)
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    cases = list_confirmed_xrays()
+    if not cases:
+        raise ValueError("No patients have a confirmed result and an x-ray yet")
+
+    names = [case['xray_img'] for case in cases]
+    paths = [os.path.join(image_folder, name) for name in names]
+    labels = np.array([1 if case['pneumonia_confirmed'] else 0 for case in cases], dtype=np.int8)
+    return names, paths, labels
+
+def predict_images(names, paths, use_tensor_store, batch_size=BATCH_SIZE, workers=DECODE_WORKERS):
+    """
+    Score images in batches with the configured model or cascade.
+
+    Arguments:
+        names (list), paths (list)
+        use_tensor_store (bool): Read and fill the tensor store; only for
+            patient x-rays, whose filenames are its keys.
+        batch_size (int), workers (int)
+
+    Returns:
+        numpy.ndarray: One probability per image, NaN where it could not be read.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    probabilities = np.full(len(names), np.nan, dtype=np.float64)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(names), batch_size):
+            batch_names = names[start:start + batch_size]
+            batch_paths = paths[start:start + batch_size]
+
+            if use_tensor_store:
+                images, failed = tensor_store.load_many(batch_names, batch_paths, pool)
+            else:
+                futures = [pool.submit(decode_xray, path) for path in batch_paths]
+                decoded, failed = [], {}
+                for index, future in enumerate(futures):
+                    try:
+                        decoded.append(future.result())
+                    except Exception as e:
+                        failed[index] = e
+                images = np.stack(decoded) if decoded else None
+
+            for index, error in failed.items():
+                print(f"Skipped {batch_names[index]}: {error}", file=sys.stderr)
+
+            if images is not None:
+                scored = [start + index for index in range(len(batch_names)) if index not in failed]
+                probabilities[scored] = np.asarray(score(images), dtype=np.float64).reshape(-1)
+
+    return probabilities
+
+def cached_probabilities(cache_path, names, paths, use_tensor_store):
+    """
+    Get each image's probability, only running the model on images not in the cache.
+
+    Description:
+        The cache is an .npz of image names and probabilities for one model
+        version, so re-running the evaluation, or sweeping other thresholds,
+        never re-runs inference. Newly confirmed cases are scored and added.
+        Unreadable images are cached as NaN so they are not retried.
+
+    Arguments:
+        cache_path (str), names (list), paths (list), use_tensor_store (bool)
+
+    Returns:
+        Tuple: (probabilities aligned with names, images scored this run)
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    cached = {}
+    if os.path.exists(cache_path):
+        with np.load(cache_path, allow_pickle=False) as data:
+            cached = dict(zip(data['names'].tolist(), data['probabilities'].tolist()))
+
+    todo = [index for index, name in enumerate(names) if name not in cached]
+    if todo:
+        fresh = predict_images([names[index] for index in todo], [paths[index] for index in todo], use_tensor_store)
+        cached.update(zip((names[index] for index in todo), fresh.tolist()))
+
+        os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+        tmp_path = f"{cache_path}.tmp.npz"
+        np.savez(tmp_path, names=np.array(list(cached)), probabilities=np.array(list(cached.values())))
+        os.replace(tmp_path, cache_path)
+
+    return np.array([cached[name] for name in names], dtype=np.float64), len(todo)
+
+def roc_pr_curves(labels, probabilities):
+    """
+    ROC and precision-recall curves for "probability at or above t means pneumonia".
+
+    Arguments:
+        labels (numpy.ndarray): 0/1 per image.
+        probabilities (numpy.ndarray)
+
+    Returns:
+        dict: Thresholds, false/true positive rates, precision, recall,
+        ROC AUC and average precision.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    order = np.argsort(-probabilities, kind='stable')
+    ranked, ranked_labels = probabilities[order], labels[order]
+
+    # Last index of each distinct probability, so tied images move together
+    cuts = np.r_[np.flatnonzero(np.diff(ranked)), len(ranked) - 1]
+    tp = np.cumsum(ranked_labels)[cuts]
+    fp = cuts + 1 - tp
+
+    positives, negatives = labels.sum(), len(labels) - labels.sum()
+    tpr = np.r_[0, tp / positives] if positives else np.zeros(len(cuts) + 1)
+    fpr = np.r_[0, fp / negatives] if negatives else np.zeros(len(cuts) + 1)
+    precision = tp / (tp + fp)
+    recall = tp / positives if positives else np.zeros(len(cuts))
+
+    return {
+        "thresholds": ranked[cuts],
+        "fpr": fpr,
+        "tpr": tpr,
+        "precision": precision,
+        "recall": recall,
+        "roc_auc": float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2)),
+        "average_precision": float(np.sum(np.diff(np.r_[0, recall]) * precision))
+    }
+
+def sweep_thresholds(labels, probabilities, thresholds):
+    """
+    Triage metrics for every (low, high) threshold pair at once.
+
+    Description:
+        The app flags an image when low <= probability <= high. Sorting each
+        class once and counting with searchsorted gives how many images of
+        each class sit at or above every low and above every high; one
+        broadcast subtraction then gives the flagged counts for all pairs,
+        so thousands of combinations take milliseconds and no inference.
+
+    Arguments:
+        labels (numpy.ndarray): 0/1 per image.
+        probabilities (numpy.ndarray)
+        thresholds (numpy.ndarray): Candidate values for both ends, ascending.
+
+    Returns:
+        dict: (k, k) arrays indexed [low, high] of tp, fp, fn, tn, recall,
+        precision, specificity and f1. Pairs with low > high are NaN.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    def flagged(values):
+        values = np.sort(values)
+        at_or_above = len(values) - np.searchsorted(values, thresholds, side='left')
+        above = len(values) - np.searchsorted(values, thresholds, side='right')
+        return (at_or_above[:, None] - above[None, :]).astype(np.float64)
+
+    positives = probabilities[labels == 1]
+    negatives = probabilities[labels == 0]
+    valid = thresholds[:, None] <= thresholds[None, :]
+
+    tp, fp = flagged(positives), flagged(negatives)
+    tp[~valid] = fp[~valid] = np.nan
+    fn, tn = len(positives) - tp, len(negatives) - fp
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        recall = tp / len(positives)
+        precision = tp / (tp + fp)
+        specificity = tn / len(negatives)
+        f1 = 2 * tp / (2 * tp + fp + fn)
+
+    return {
+        "tp": tp, "fp": fp, "fn": fn, "tn": tn,
+        "recall": recall, "precision": precision, "specificity": specificity, "f1": f1
+    }
+
+def pair_metrics(sweep, thresholds, low_index, high_index):
+    metrics = {name: float(values[low_index, high_index]) for name, values in sweep.items()}
+    for count in ("tp", "fp", "fn", "tn"):
+        metrics[count] = int(metrics[count])
+    return {"low": float(thresholds[low_index]), "high": float(thresholds[high_index]), **metrics}
+
+def best_pair(sweep, thresholds, min_recall):
+    """
+    Pick the most precise band that keeps recall at or above min_recall.
+
+    Description:
+        Ties on precision go to the higher specificity.
+
+    Returns:
+        dict or None: The pair's metrics, None if no band reaches min_recall.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    eligible = sweep["recall"] >= min_recall
+    if not eligible.any():
+        return None
+
+    precision = np.where(eligible, np.nan_to_num(sweep["precision"], nan=0.0), -1)
+    specificity = np.where(eligible, sweep["specificity"], -1)
+    flat = np.lexsort((specificity.ravel(), precision.ravel()))[-1]
+    return pair_metrics(sweep, thresholds, *np.unravel_index(flat, precision.shape))
+
+def downsample(curve, points=CURVE_POINTS):
+    step = max(1, len(curve) // points)
+    return [round(float(value), 6) for value in curve[::step]]
+
+def evaluation_report(labels, probabilities, thresholds, min_recall=MIN_RECALL, current=None):
+    """
+    Summarise how the model and triage band perform on labelled images.
+
+    Arguments:
+        labels (numpy.ndarray), probabilities (numpy.ndarray)
+        thresholds (numpy.ndarray): Candidate band ends.
+        min_recall (float)
+        current (tuple, optional): (low, high) band in use.
+
+    Returns:
+        dict: Counts, ROC/PR summaries, metrics for the current band, the
+        recommended band and the best-F1 band.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    readable = ~np.isnan(probabilities)
+    labels, probabilities = labels[readable], probabilities[readable]
+
+    started = time.perf_counter()
+    curves = roc_pr_curves(labels, probabilities)
+    sweep = sweep_thresholds(labels, probabilities, thresholds)
+    f1 = np.nan_to_num(sweep["f1"], nan=-1)
+    best_f1 = pair_metrics(sweep, thresholds, *np.unravel_index(np.argmax(f1), f1.shape))
+
+    report = {
+        "images": int(len(labels)),
+        "unreadable": int((~readable).sum()),
+        "positives": int(labels.sum()),
+        "negatives": int(len(labels) - labels.sum()),
+        "roc_auc": curves["roc_auc"],
+        "average_precision": curves["average_precision"],
+        "pairs_swept": int(np.count_nonzero(~np.isnan(sweep["tp"]))),
+        "recommended": best_pair(sweep, thresholds, min_recall),
+        "min_recall": min_recall,
+        "best_f1": best_f1,
+        "roc": {"fpr": downsample(curves["fpr"]), "tpr": downsample(curves["tpr"])},
+        "pr": {"recall": downsample(curves["recall"]), "precision": downsample(curves["precision"])}
+    }
+
+    if current is not None:
+        low, high = current
+        flagged = (probabilities >= low) & (probabilities <= high)
+        tp = int((flagged & (labels == 1)).sum())
+        fp = int((flagged & (labels == 0)).sum())
+        report["current"] = {
+            "low": low, "high": high,
+            "tp": tp, "fp": fp, "fn": report["positives"] - tp, "tn": report["negatives"] - fp,
+            "recall": tp / report["positives"] if report["positives"] else None,
+            "precision": tp / (tp + fp) if tp + fp else None
+        }
+
+    report["sweep_seconds"] = time.perf_counter() - started
+    return report
+
+def main(argv=None):
+    """
+    Command-line entry point.
+
+    Description:
+        python -m inference.evaluate --confirmed
+        python -m inference.evaluate --directory /path/to/chest_xray/test
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    parser = argparse.ArgumentParser(description="Evaluate the model and triage thresholds on labelled x-rays.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--confirmed", action="store_true", help="Use clinician-confirmed patient cases")
+    source.add_argument("--directory", help="Folder with NORMAL and PNEUMONIA sub-folders")
+    parser.add_argument("--min-recall", type=float, default=MIN_RECALL)
+    parser.add_argument("--steps", type=int, default=THRESHOLD_STEPS, help="Candidate thresholds between 0 and 1")
+    parser.add_argument("--cache-dir", default=EVALUATION_DIR)
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args(argv)
+
+    model_version = target_version()
+    if model_version is None:
+        raise SystemExit("No model is available to evaluate")
+
+    if args.confirmed:
+        names, paths, labels = confirmed_cases()
+        source_key = "confirmed"
+    else:
+        names, paths, labels = labelled_directory(args.directory)
+        source_key = "dir-" + hashlib.sha256(os.path.abspath(args.directory).encode()).hexdigest()[:12]
+
+    cache_path = os.path.join(args.cache_dir, f"{source_key}-{model_version}.npz")
+    probabilities, scored = cached_probabilities(cache_path, names, paths, use_tensor_store=args.confirmed)
+    print(f"{scored} images scored, {len(names) - scored} from {cache_path}", file=sys.stderr)
+
+    report = evaluation_report(labels, probabilities, np.linspace(0, 1, args.steps), args.min_recall, current_thresholds())
+    report["model_version"] = model_version
+    report["source"] = "confirmed cases" if args.confirmed else args.directory
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+if __name__ == "__main__":
+    main()
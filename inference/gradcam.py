@@ -0,0 +1,372 @@
+import argparse
+import json
+import os
+import re
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from db import list_heatmap_candidates, store_heatmap
+from inference.model import model_registry
+from inference.tensor_store import tensor_store
+
+HEATMAP_BATCH_SIZE = 16
+HEATMAP_POLL_INTERVAL = 10.0
+DECODE_WORKERS = 4
+
+# Overlays are scaled so their longest side is OVERLAY_SIZE pixels; the
+# hottest regions are blended in at OVERLAY_ALPHA
+OVERLAY_SIZE = 256
+OVERLAY_ALPHA = 0.5
+OVERLAY_QUALITY = 80
+
+def gradcam_function(model):
+    """
+    Get a function that computes Grad-CAM heatmaps for a batch of images.
+
+    Description:
+        The gradient of each image's predicted probability with respect to
+        the last convolutional layer's output is averaged per channel, and
+        the channels are summed with those weights. The layers are run in
+        order, as in the app's Sequential model, and only those after the
+        convolution are taped. One tape covers the whole batch, since every
+        prediction only depends on its own image.
+
+    Arguments:
+        model: Keras model.
+
+    Returns:
+        callable or None: (n, 64, 64, 1) images to (n, h, w) heatmaps scaled
+        to 0-1, None for backends without gradients (TFLite, NumPy) or models
+        without a convolutional layer.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    if not hasattr(model, 'layers'):
+        return None
+
+    import keras
+    import numpy as np
+    import tensorflow as tf
+
+    last_convolution = max(
+        (index for index, layer in enumerate(model.layers) if isinstance(layer, keras.layers.Conv2D)), default=None
+    )
+    if last_convolution is None:
+        return None
+    head, tail = model.layers[:last_convolution + 1], model.layers[last_convolution + 1:]
+
+    def heatmaps(images):
+        features = tf.convert_to_tensor(images, dtype=tf.float32)
+        for layer in head:
+            features = layer(features, training=False)
+
+        with tf.GradientTape() as tape:
+            tape.watch(features)
+            predictions = features
+            for layer in tail:
+                predictions = layer(predictions, training=False)
+            score = tf.reduce_sum(predictions[:, 0])
+
+        gradients = tape.gradient(score, features)
+        weights = tf.reduce_mean(gradients, axis=(1, 2), keepdims=True)
+        maps = tf.nn.relu(tf.reduce_sum(features * weights, axis=-1)).numpy()
+
+        peaks = maps.reshape(len(maps), -1).max(axis=1)
+        return maps / np.maximum(peaks, 1e-12)[:, None, None]
+
+    return heatmaps
+
+def render_overlay(path, heatmap, size=OVERLAY_SIZE, alpha=OVERLAY_ALPHA):
+    """
+    Blend a heatmap over a small copy of the x-ray.
+
+    Arguments:
+        path (str): X-ray JPEG.
+        heatmap (numpy.ndarray): (h, w) values in 0-1.
+        size (int): Longest side of the overlay.
+        alpha (float): Opacity of the hottest regions.
+
+    Returns:
+        PIL.Image.Image: RGB overlay.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image.draft('L', (size, size))
+        image = image.convert('L')
+        image.thumbnail((size, size))
+
+    base = np.asarray(image, dtype=np.float32)[..., None] / 255.0
+    heat = Image.fromarray((heatmap * 255).astype(np.uint8)).resize(image.size, Image.BILINEAR)
+    heat = np.asarray(heat, dtype=np.float32)[..., None] / 255.0
+
+    # Black through red and yellow to white
+    colour = np.clip(np.concatenate([3 * heat, 3 * heat - 1, 3 * heat - 2], axis=-1), 0, 1)
+    weight = alpha * heat
+    blended = base * (1 - weight) + colour * weight
+    return Image.fromarray((blended * 255).round().astype(np.uint8), 'RGB')
+
+def heatmap_filename(xray_img, patient_id, model_version):
+    """
+    Name an x-ray's overlay after the image, its patient and the model version it came from.
+
+    Description:
+        Patients with identical x-rays share one stored image, so the
+        patient ID keeps each overlay owned by one patient and safe to
+        remove with them.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    stem = os.path.splitext(xray_img)[0]
+    version = re.sub(r'[^A-Za-z0-9_-]', '', model_version)[:16]
+    return f"{stem}.gradcam-{patient_id}-{version}.jpg"
+
+def delete_heatmap(image_folder, heatmap_img):
+    """
+    Remove an overlay file, if there is one.
+
+    Arguments:
+        image_folder (str): Folder holding the x-rays and their overlays.
+        heatmap_img (str or None): Overlay filename.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    if heatmap_img:
+        try:
+            os.remove(os.path.join(image_folder, heatmap_img))
+        except FileNotFoundError:
+            pass
+
+class HeatmapWorker:
+    """
+    Background thread that caches Grad-CAM overlays for scored x-rays.
+
+    Description:
+        Every poll it asks for scored patients whose overlay is missing or
+        was made by another model version, newest first, reads their model
+        input from the tensor store and computes the whole batch's heatmaps
+        in one pass. Each overlay is written as a small JPEG next to the
+        x-ray, under a temporary name and renamed into place, so the patient
+        form only ever serves finished files. Promoting a new model version
+        makes every overlay stale, and they are regenerated in batches.
+
+        X-rays that cannot be read are recorded without an overlay so they
+        are not retried until the next model version.
+
+    Arguments:
+        image_folder (str): Folder holding the x-rays and their overlays.
+        registry (ModelRegistry): Model the heatmaps are computed from.
+        batch_size (int): Overlays per pass.
+        poll_interval (float): Seconds to wait once nothing is left to do.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    def __init__(self, image_folder, registry=model_registry, batch_size=HEATMAP_BATCH_SIZE,
+                 poll_interval=HEATMAP_POLL_INTERVAL):
+        self.image_folder = image_folder
+        self.registry = registry
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.generated = 0
+        self.failed = 0
+        self.supported = None
+        self._function = (None, None)
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=DECODE_WORKERS)
+
+    def start(self):
+        """
+        Start the worker thread.
+
+        Returns:
+            bool: True if this call started it, False if already running.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        with self._lock:
+            if self._thread is not None:
+                return False
+
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="heatmap-worker", daemon=True)
+            self._thread.start()
+
+        return True
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def notify(self):
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.clear()
+            try:
+                done = self.run_once()
+            except Exception as e:
+                print(f"Heatmap error: {e}")
+                done = 0
+
+            if done < self.batch_size:
+                self._wakeup.wait(self.poll_interval)
+
+    def _heatmaps(self, model):
+        if self._function[0] is not model:
+            self._function = (model, gradcam_function(model))
+            self.supported = self._function[1] is not None
+        return self._function[1]
+
+    def delete(self, heatmap_img):
+        """
+        Remove an overlay file, if there is one.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        delete_heatmap(self.image_folder, heatmap_img)
+
+    def _write(self, xray_img, patient_id, heatmap, model_version):
+        name = heatmap_filename(xray_img, patient_id, model_version)
+        path = os.path.join(self.image_folder, name)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+
+        overlay = render_overlay(os.path.join(self.image_folder, xray_img), heatmap)
+        overlay.save(tmp_path, 'JPEG', quality=OVERLAY_QUALITY)
+        os.replace(tmp_path, path)
+        return name
+
+    def run_once(self):
+        """
+        Generate overlays for one batch of patients.
+
+        Arguments:
+            None
+
+        Returns:
+            int: Patients handled, 0 if there was nothing to do or the backend
+            cannot compute heatmaps.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        model = self.registry.load()
+        model_version = self.registry.get_version()
+        heatmaps = self._heatmaps(model)
+        if heatmaps is None or model_version is None:
+            return 0
+
+        patients = list_heatmap_candidates(model_version, self.batch_size)
+        if not patients:
+            return 0
+
+        images, failed = tensor_store.load_many(
+            [patient['xray_img'] for patient in patients],
+            [os.path.join(self.image_folder, patient['xray_img']) for patient in patients],
+            self._pool
+        )
+        maps = iter(heatmaps(images) if images is not None else [])
+
+        # A newer version was swapped in mid-batch; leave the batch for it
+        if self.registry.get_version() != model_version:
+            return 0
+
+        for index, patient in enumerate(patients):
+            name = None
+            if index not in failed:
+                heatmap = next(maps)
+                try:
+                    name = self._write(patient['xray_img'], patient['id'], heatmap, model_version)
+                except Exception as e:
+                    print(f"Heatmap error for patient {patient['id']}: {e}")
+
+            stored = store_heatmap(patient['id'], patient['xray_img'], name, model_version)
+            if not stored:
+                # The x-ray was replaced or removed while this one was drawn
+                self.delete(name)
+            elif patient['heatmap_img'] != name:
+                self.delete(patient['heatmap_img'])
+
+            with self._lock:
+                if name is None:
+                    self.failed += 1
+                elif stored:
+                    self.generated += 1
+
+        return len(patients)
+
+    def status(self):
+        """
+        Describe the worker.
+
+        Returns:
+            dict: Whether it is running, whether the backend supports Grad-CAM,
+            and overlays generated or failed here.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "supported": self.supported,
+            "generated": self.generated,
+            "failed": self.failed
+        }
+
+def main(argv=None):
+    """
+    Command-line entry point.
+
+    Description:
+        python -m inference.gradcam          generate every missing or stale overlay
+        python -m inference.gradcam --watch  keep generating them as x-rays are scored
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    from storage import XRAY_FOLDER
+
+    parser = argparse.ArgumentParser(description="Generate cached Grad-CAM overlays for scored x-rays.")
+    parser.add_argument("--batch-size", type=int, default=HEATMAP_BATCH_SIZE)
+    parser.add_argument("--watch", action="store_true", help="Keep running, polling for newly scored x-rays")
+    args = parser.parse_args(argv)
+
+    worker = HeatmapWorker(XRAY_FOLDER, batch_size=args.batch_size)
+
+    if args.watch:
+        model_registry.watch()
+        worker._run()
+        return
+
+    while worker.run_once():
+        pass
+    print(json.dumps(worker.status(), indent=2))
+
+if __name__ == "__main__":
+    main()
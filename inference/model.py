@@ -0,0 +1,435 @@
+import os
+import threading
+import time
+from db import get_ai_thresholds
+from inference.versions import MODEL_DIR, ModelStore, file_version
+
+# Used until a version is promoted with python -m inference.versions
+MODEL_PATH = 'machine-learning/final_pneumonia_model.keras'
+TFLITE_MODEL_PATH = 'machine-learning/final_pneumonia_model.tflite'
+NUMPY_MODEL_PATH = 'machine-learning/final_pneumonia_model.npz'
+
+# 'keras' runs the full model, 'tflite' runs the int8 model built by
+# python -m inference.tflite_backend convert, 'numpy' runs the weights
+# exported by python -m inference.numpy_backend export without TensorFlow
+INFERENCE_BACKEND = 'keras'
+INPUT_SHAPE = (64, 64, 1)
+
+# How often running processes look for a newly promoted model version
+MODEL_WATCH_INTERVAL = 10.0
+
+# When True the web app sends predictions to the separate
+# python -m inference.server process instead of loading the model itself
+USE_INFERENCE_SERVER = False
+INFERENCE_SOCKET = '/tmp/pneumonia-inference.sock'
+INFERENCE_TIMEOUT = 30.0
+
+# Defaults for when the settings table has no thresholds; admins change
+# them on the settings page
+LOW_THRESHOLD = 0.050
+HIGH_THRESHOLD = 0.99
+
+LEGACY_PATHS = {'keras': MODEL_PATH, 'tflite': TFLITE_MODEL_PATH, 'numpy': NUMPY_MODEL_PATH}
+
+class ModelRegistry:
+    """
+    Process-wide holder for the pneumonia model.
+
+    Description:
+        Loads the model once, runs a warm-up prediction so the first real
+        request does not pay for graph tracing, and hands the same model object
+        to every caller. Records how long the load took and whether it is warm.
+
+        Without an explicit model_path the model comes from the versioned
+        model store, falling back to the legacy model file if no version has
+        been promoted. check_for_update() loads and warms a newly promoted
+        version in the background while the old one keeps serving, then
+        switches to it in a single assignment.
+
+    Arguments:
+        model_path (str, optional): Path to a fixed model file. Defaults to
+            the promoted version in the model store.
+        backend (str): 'keras', 'tflite' or 'numpy'.
+        model_dir (str): Model store folder.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    def __init__(self, model_path=None, backend=INFERENCE_BACKEND, model_dir=MODEL_DIR):
+        if backend not in LEGACY_PATHS:
+            raise ValueError(f"Unknown inference backend: {backend}")
+
+        self.backend = backend
+        self.store = ModelStore(model_dir) if model_path is None else None
+        self.legacy_path = LEGACY_PATHS[backend]
+        self.model_path = model_path or self._resolve()[1]
+        self.model = None
+        self.load_time = None
+        self.warm_time = None
+        self.loaded_at = None
+        self.version = None
+        self.error = None
+        self.swaps = 0
+        self.previous_version = None
+        self._lock = threading.Lock()
+        self._swap_lock = threading.Lock()
+        self._failed_version = None
+        self._watcher = None
+        self._file_version = None
+        self._file_version_key = None
+
+    def _resolve(self):
+        """
+        Work out which model file should be served.
+
+        Returns:
+            Tuple: (version or None, model path). Store versions carry the
+            backend, e.g. 'v3+tflite', since each backend's file gives
+            slightly different probabilities and must not share cached
+            predictions, heatmaps or backfill runs. The version is None for
+            fixed or legacy files, whose version is their content hash.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        if self.store is None:
+            return None, self.model_path
+
+        version = self.store.current()
+        if version is None:
+            return None, self.legacy_path
+        return f"{version}+{self.backend}", self.store.model_path(version, self.backend)
+
+    def _load_model(self, path):
+        """
+        Load and warm a model file without touching the registry's state.
+
+        Returns:
+            Tuple: (model, load seconds, warm-up seconds)
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        # TensorFlow and numpy are only imported here, on the inference
+        # path, so importing the web app stays fast
+        import numpy as np
+
+        start = time.perf_counter()
+        if self.backend == 'tflite':
+            from inference.tflite_backend import TFLiteModel
+            model = TFLiteModel(path)
+        elif self.backend == 'numpy':
+            from inference.numpy_backend import NumpyModel
+            model = NumpyModel(path)
+        else:
+            from tensorflow.keras.models import load_model
+            model = load_model(path)
+        load_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        model.predict(np.zeros((1,) + INPUT_SHAPE, dtype=np.float32), verbose=0)
+        return model, load_time, time.perf_counter() - start
+
+    def _activate(self, model, version, path, load_time, warm_time):
+        self.model_path = path
+        self.version = version
+        self.load_time = load_time
+        self.warm_time = warm_time
+        self.loaded_at = time.time()
+        self.error = None
+        self.model = model
+
+    def load(self):
+        """
+        Load and warm the model if it is not loaded yet.
+
+        Description:
+            Safe to call from several threads; only the first caller loads the
+            model, the others wait for it and get the same object back.
+
+        Arguments:
+            None
+
+        Returns:
+            keras.Model or TFLiteModel: The loaded model.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        if self.model is not None:
+            return self.model
+
+        with self._lock:
+            if self.model is not None:
+                return self.model
+
+            version, path = self._resolve()
+            version = version or file_version(path)
+            model, load_time, warm_time = self._load_model(path)
+            self._activate(model, version, path, load_time, warm_time)
+
+        return self.model
+
+    def check_for_update(self):
+        """
+        Switch to a newly promoted model version.
+
+        Description:
+            Loads and warms the promoted version while the current model keeps
+            serving, then swaps it in. Callers that already hold the old model
+            finish with it; every later get_model() gets the new one. A
+            version that fails to load is skipped until a different one is
+            promoted, and the old model stays active.
+
+        Arguments:
+            None
+
+        Returns:
+            bool: True if a new version was swapped in.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        if self.store is None or self.model is None:
+            return False
+
+        with self._swap_lock:
+            version, path = self._resolve()
+            if version is None or version in (self.version, self._failed_version):
+                return False
+
+            try:
+                model, load_time, warm_time = self._load_model(path)
+            except Exception as e:
+                self._failed_version = version
+                self.error = f"Could not load model version {version}: {e}"
+                print(self.error)
+                return False
+
+            with self._lock:
+                self.previous_version = self.version
+                self._activate(model, version, path, load_time, warm_time)
+                self.swaps += 1
+
+        print(f"Switched to model version {version}")
+        return True
+
+    def watch(self, interval=MODEL_WATCH_INTERVAL):
+        """
+        Check for newly promoted versions on a background thread.
+
+        Arguments:
+            interval (float): Seconds between checks.
+
+        Returns:
+            threading.Thread or None: The watcher, None if one is already running
+            or the model is a fixed file.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        if self.store is None or self._watcher is not None:
+            return None
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.check_for_update()
+                except Exception as e:
+                    print(f"Model update check error: {e}")
+
+        self._watcher = threading.Thread(target=run, name="model-watcher", daemon=True)
+        self._watcher.start()
+        return self._watcher
+
+    def warm_up(self):
+        """
+        Load the model at app start without taking the app down on failure.
+
+        Description:
+            Calls load() and records the error instead of raising, so the web
+            app still starts when the model file is missing. Uploads will then
+            retry the load on demand.
+
+        Arguments:
+            None
+
+        Returns:
+            bool: True if the model is loaded and warm.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        try:
+            self.load()
+            return True
+        except Exception as e:
+            self.error = str(e)
+            print(f"Model warm-up error: {e}")
+            return False
+
+    def warm_up_in_background(self):
+        """
+        Warm the model on a background thread.
+
+        Description:
+            Lets the web process start serving straight away while TensorFlow
+            is imported and the model is loaded.
+
+        Arguments:
+            None
+
+        Returns:
+            threading.Thread: The warm-up thread.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        thread = threading.Thread(target=self.warm_up, name="model-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def is_warm(self):
+        return self.model is not None
+
+    def get_version(self):
+        """
+        Get the version of the model that predictions will come from.
+
+        Description:
+            Returns the loaded model's version. If nothing is loaded yet it is
+            the promoted version, or the hash of the model file on disk. The
+            file hash is only recomputed when the file's size or modification
+            time changes.
+
+        Arguments:
+            None
+
+        Returns:
+            str or None: Model version, None if there is no model file.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        if self.version is not None:
+            return self.version
+
+        version, path = self._resolve()
+        if version is not None:
+            return version
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        key = (stat.st_mtime_ns, stat.st_size)
+        if self._file_version_key != key:
+            self._file_version = file_version(path)
+            self._file_version_key = key
+        return self._file_version
+
+    def status(self):
+        """
+        Describe the current state of the model.
+
+        Arguments:
+            None
+
+        Returns:
+            dict: Backend, model path and version, warm state, load and warm-up
+            times, swaps to newer versions and last error.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        return {
+            "backend": self.backend,
+            "model_path": self.model_path,
+            "version": self.version,
+            "promoted_version": self.store.current() if self.store else None,
+            "previous_version": self.previous_version,
+            "swaps": self.swaps,
+            "warm": self.is_warm(),
+            "load_time": self.load_time,
+            "warm_time": self.warm_time,
+            "loaded_at": self.loaded_at,
+            "error": self.error
+        }
+
+model_registry = ModelRegistry()
+
+def get_model():
+    """
+    Get the shared pneumonia model.
+
+    Description:
+        Returns the model held by the process-wide registry, loading it on
+        first use if app start-up did not manage to.
+
+    Arguments:
+        None
+
+    Returns:
+        keras.Model or TFLiteModel: The loaded model.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    return model_registry.load()
+
+def classify(prediction_prob, low_threshold=LOW_THRESHOLD, high_threshold=HIGH_THRESHOLD):
+    """
+    Turn a model probability into a triage label.
+
+    Description:
+        Probabilities outside the low/high band are treated as normal,
+        anything inside it is flagged as suspected pneumonia.
+
+    Arguments:
+        prediction_prob (float): Model output for one image.
+        low_threshold (float), high_threshold (float)
+
+    Returns:
+        str: "Pneumonia" or "Normal"
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    if prediction_prob < low_threshold or prediction_prob > high_threshold:
+        return "Normal"
+    return "Pneumonia"
+
+def current_thresholds():
+    """
+    Get the triage band admins have configured.
+
+    Arguments:
+        None
+
+    Returns:
+        Tuple: (low_threshold, high_threshold) from the settings table,
+        falling back to LOW_THRESHOLD / HIGH_THRESHOLD.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    low, high = get_ai_thresholds()
+    return (
+        LOW_THRESHOLD if low is None else low,
+        HIGH_THRESHOLD if high is None else high
+    )
@@ -0,0 +1,417 @@
+import argparse
+import json
+import os
+import numpy as np
+from inference.model import MODEL_PATH, NUMPY_MODEL_PATH, classify
+
+# Images run through the layers at once; bounds the size of the im2col
+# buffers, which grow with batch x output pixels x kernel size
+NUMPY_CHUNK_SIZE = 16
+
+def softmax(x):
+    e = np.exp(x - x.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'sigmoid': lambda x: 1 / (1 + np.exp(-x)),
+    'tanh': np.tanh,
+    'softmax': softmax
+}
+
+def activation_name(activation):
+    name = activation if isinstance(activation, str) else getattr(activation, '__name__', str(activation))
+    if name not in ACTIVATIONS:
+        raise ValueError(f"Unsupported activation: {name}")
+    return name
+
+def export_layers(model):
+    """
+    Describe a Keras model as a list of layer specs and a dict of weights.
+
+    Description:
+        Supports the layer types a small image classifier uses: Conv2D,
+        MaxPooling2D, AveragePooling2D, GlobalAveragePooling2D, Flatten,
+        Dense, BatchNormalization, Activation and ReLU. Dropout and the input
+        layer are dropped because they do nothing at inference time, and
+        batch normalisation is folded into a per-channel scale and shift.
+
+    Arguments:
+        model (keras.Model): Sequential-style model with NHWC input.
+
+    Returns:
+        Tuple: (list of layer spec dicts, dict of weight arrays keyed "index/name")
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    layers = []
+    weights = {}
+
+    for layer in model.layers:
+        kind = type(layer).__name__
+        config = layer.get_config()
+        index = len(layers)
+
+        if kind in ('InputLayer', 'Dropout'):
+            continue
+
+        if config.get('data_format', 'channels_last') != 'channels_last':
+            raise ValueError(f"{layer.name}: only channels_last layers are supported")
+
+        if kind == 'Conv2D':
+            if tuple(config['dilation_rate']) != (1, 1) or config.get('groups', 1) != 1:
+                raise ValueError(f"{layer.name}: dilated and grouped convolutions are not supported")
+            spec = {
+                'type': 'conv2d', 'strides': list(config['strides']), 'padding': config['padding'],
+                'activation': activation_name(config['activation'])
+            }
+            weights[f"{index}/kernel"] = layer.kernel.numpy()
+            if config['use_bias']:
+                weights[f"{index}/bias"] = layer.bias.numpy()
+        elif kind in ('MaxPooling2D', 'AveragePooling2D'):
+            spec = {
+                'type': 'max_pool' if kind == 'MaxPooling2D' else 'avg_pool',
+                'pool_size': list(config['pool_size']), 'strides': list(config['strides'] or config['pool_size']),
+                'padding': config['padding']
+            }
+        elif kind == 'GlobalAveragePooling2D':
+            spec = {'type': 'global_avg_pool', 'keepdims': config.get('keepdims', False)}
+        elif kind == 'Flatten':
+            spec = {'type': 'flatten'}
+        elif kind == 'Dense':
+            spec = {'type': 'dense', 'activation': activation_name(config['activation'])}
+            weights[f"{index}/kernel"] = layer.kernel.numpy()
+            if config['use_bias']:
+                weights[f"{index}/bias"] = layer.bias.numpy()
+        elif kind == 'BatchNormalization':
+            variance = layer.moving_variance.numpy()
+            scale = 1 / np.sqrt(variance + config['epsilon'])
+            if config['scale']:
+                scale = scale * layer.gamma.numpy()
+            shift = -layer.moving_mean.numpy() * scale
+            if config['center']:
+                shift = shift + layer.beta.numpy()
+            spec = {'type': 'scale_shift'}
+            weights[f"{index}/scale"] = scale
+            weights[f"{index}/shift"] = shift
+        elif kind == 'Activation':
+            spec = {'type': 'activation', 'activation': activation_name(config['activation'])}
+        elif kind == 'ReLU' and not config.get('max_value') and not config.get('negative_slope') and not config.get('threshold'):
+            spec = {'type': 'activation', 'activation': 'relu'}
+        else:
+            raise ValueError(f"{layer.name}: unsupported layer type {kind}")
+
+        layers.append(spec)
+
+    return layers, weights
+
+def export_model(keras_path=MODEL_PATH, output_path=NUMPY_MODEL_PATH):
+    """
+    Write a Keras model's layers and weights to a .npz file for NumpyModel.
+
+    Arguments:
+        keras_path (str): Path to the Keras model.
+        output_path (str): Where to write the .npz file.
+
+    Returns:
+        int: Size of the written file in bytes.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    from tensorflow.keras.models import load_model
+
+    layers, weights = export_layers(load_model(keras_path))
+    weights = {name: value.astype(np.float32) for name, value in weights.items()}
+
+    # np.savez adds .npz to names without it, so write under a name that
+    # already ends in .npz and rename it into place
+    tmp_path = f"{output_path}.tmp.npz"
+    np.savez(tmp_path, __layers__=np.array(json.dumps(layers)), **weights)
+    os.replace(tmp_path, output_path)
+
+    return os.path.getsize(output_path)
+
+def same_padding(size, kernel, stride):
+    """
+    Split TensorFlow's 'same' padding for one axis into (before, after).
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    out = -(-size // stride)
+    total = max((out - 1) * stride + kernel - size, 0)
+    return total // 2, total - total // 2
+
+def windows(x, kernel, strides, padding, fill=0.0):
+    """
+    View every kernel-sized window of an NHWC batch without copying.
+
+    Arguments:
+        x (numpy.ndarray): (n, h, w, c) batch.
+        kernel (tuple), strides (tuple): (height, width).
+        padding (str): 'valid' or 'same'.
+        fill (float): Value padded borders take.
+
+    Returns:
+        numpy.ndarray: (n, out_h, out_w, c, kernel_h, kernel_w) view.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    if padding == 'same':
+        pad_h = same_padding(x.shape[1], kernel[0], strides[0])
+        pad_w = same_padding(x.shape[2], kernel[1], strides[1])
+        if any(pad_h + pad_w):
+            x = np.pad(x, ((0, 0), pad_h, pad_w, (0, 0)), constant_values=fill)
+
+    view = np.lib.stride_tricks.sliding_window_view(x, kernel, axis=(1, 2))
+    return view[:, ::strides[0], ::strides[1]]
+
+def conv2d(x, kernel, bias, strides, padding):
+    """
+    2D convolution as one matrix multiply over the im2col matrix.
+
+    Arguments:
+        x (numpy.ndarray): (n, h, w, c) batch.
+        kernel (numpy.ndarray): Keras layout (kernel_h, kernel_w, c, filters).
+        bias (numpy.ndarray or None): (filters,)
+        strides (tuple), padding (str)
+
+    Returns:
+        numpy.ndarray: (n, out_h, out_w, filters)
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    kernel_h, kernel_w, channels, filters = kernel.shape
+    view = windows(x, (kernel_h, kernel_w), strides, padding)
+    n, out_h, out_w = view.shape[:3]
+
+    # Reorder each window to (kernel_h, kernel_w, c) to match the kernel, and
+    # copy once into a contiguous (pixels, window) matrix
+    columns = view.transpose(0, 1, 2, 4, 5, 3).reshape(n * out_h * out_w, kernel_h * kernel_w * channels)
+    out = columns @ kernel.reshape(-1, filters)
+    if bias is not None:
+        out += bias
+
+    return out.reshape(n, out_h, out_w, filters)
+
+def pool2d(x, pool_size, strides, padding, reduce):
+    """
+    Max or average pooling over NHWC windows.
+
+    Description:
+        Average pooling with 'same' padding divides by the number of real
+        pixels in each window, as TensorFlow does.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    if reduce == 'max':
+        return windows(x, pool_size, strides, padding, fill=-np.inf).max(axis=(4, 5))
+
+    sums = windows(x, pool_size, strides, padding).sum(axis=(4, 5))
+    if padding != 'same':
+        return sums / (pool_size[0] * pool_size[1])
+
+    counts = windows(np.ones((1, x.shape[1], x.shape[2], 1), dtype=x.dtype), pool_size, strides, padding).sum(axis=(4, 5))
+    return sums / counts
+
+class NumpyModel:
+    """
+    Exported model run with NumPy alone, with the same predict() call as a Keras model.
+
+    Description:
+        Reads the .npz written by export_model() and runs the forward pass
+        with vectorised NumPy: convolutions use im2col and one matrix
+        multiply, pooling reduces over strided window views. Needs neither
+        TensorFlow nor the TFLite runtime, so small deployments can triage
+        x-rays with only NumPy installed. Batches are processed in chunks of
+        chunk_size to bound memory.
+
+    Arguments:
+        model_path (str): Path to the .npz file.
+        chunk_size (int): Images run through the layers at once.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    def __init__(self, model_path=NUMPY_MODEL_PATH, chunk_size=NUMPY_CHUNK_SIZE):
+        self.model_path = model_path
+        self.chunk_size = chunk_size
+
+        with np.load(model_path, allow_pickle=False) as data:
+            self.layers = json.loads(str(data['__layers__']))
+            self.weights = {name: data[name] for name in data.files if name != '__layers__'}
+
+    def _forward(self, x, depth=None, start=0):
+        for index, layer in enumerate(self.layers[start:depth], start):
+            kind = layer['type']
+
+            if kind == 'conv2d':
+                x = conv2d(x, self.weights[f"{index}/kernel"], self.weights.get(f"{index}/bias"), layer['strides'], layer['padding'])
+                x = ACTIVATIONS[layer['activation']](x)
+            elif kind in ('max_pool', 'avg_pool'):
+                x = pool2d(x, tuple(layer['pool_size']), layer['strides'], layer['padding'], kind[:3])
+            elif kind == 'global_avg_pool':
+                x = x.mean(axis=(1, 2), keepdims=layer['keepdims'])
+            elif kind == 'flatten':
+                x = x.reshape(len(x), -1)
+            elif kind == 'dense':
+                x = x @ self.weights[f"{index}/kernel"]
+                bias = self.weights.get(f"{index}/bias")
+                if bias is not None:
+                    x = x + bias
+                x = ACTIVATIONS[layer['activation']](x)
+            elif kind == 'scale_shift':
+                x = x * self.weights[f"{index}/scale"] + self.weights[f"{index}/shift"]
+            elif kind == 'activation':
+                x = ACTIVATIONS[layer['activation']](x)
+            else:
+                raise ValueError(f"Unknown layer type in {self.model_path}: {kind}")
+
+        return x
+
+    def predict(self, batch, batch_size=None, verbose=0):
+        """
+        Run the model on a batch of images.
+
+        Arguments:
+            batch (numpy.ndarray): float32 array of shape (n, 64, 64, 1).
+            batch_size, verbose: Accepted for Keras compatibility, ignored.
+
+        Returns:
+            numpy.ndarray: Probabilities of shape (n, 1).
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        batch = np.asarray(batch, dtype=np.float32)
+        return np.concatenate([
+            self._forward(batch[start:start + self.chunk_size])
+            for start in range(0, len(batch), self.chunk_size)
+        ]).astype(np.float32)
+
+    def embed(self, batch):
+        """
+        Run the model up to the input of its final Dense layer.
+
+        Arguments:
+            batch (numpy.ndarray): float32 array of shape (n, 64, 64, 1).
+
+        Returns:
+            numpy.ndarray: Penultimate-layer features of shape (n, d).
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        return self.predict_with_features(batch)[1]
+
+    def predict_with_features(self, batch):
+        """
+        Run the model once, keeping the input of its final Dense layer on the way.
+
+        Arguments:
+            batch (numpy.ndarray): float32 array of shape (n, 64, 64, 1).
+
+        Returns:
+            Tuple: (probabilities of shape (n, 1), penultimate-layer features
+            of shape (n, d))
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        depth = max(index for index, layer in enumerate(self.layers) if layer['type'] == 'dense')
+        batch = np.asarray(batch, dtype=np.float32)
+        probabilities, features = [], []
+        for start in range(0, len(batch), self.chunk_size):
+            chunk = self._forward(batch[start:start + self.chunk_size], depth)
+            probabilities.append(self._forward(chunk, start=depth))
+            features.append(chunk.reshape(len(chunk), -1))
+
+        return (np.concatenate(probabilities).astype(np.float32),
+                np.concatenate(features).astype(np.float32))
+
+def parity_report(keras_model, numpy_model, images, batch_size=16):
+    """
+    Compare the NumPy engine against the Keras model.
+
+    Arguments:
+        keras_model, numpy_model: Objects with a Keras-style predict().
+        images (numpy.ndarray): (n, 64, 64, 1) float32 images.
+        batch_size (int)
+
+    Returns:
+        dict: Delta statistics, triage decisions changed and throughput figures.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    from inference.tflite_backend import time_predictions
+
+    keras_probs, keras_rate = time_predictions(keras_model, images, batch_size)
+    numpy_probs, numpy_rate = time_predictions(numpy_model, images, batch_size)
+
+    deltas = np.abs(keras_probs - numpy_probs)
+
+    return {
+        "images": len(images),
+        "max_abs_delta": float(deltas.max()),
+        "mean_abs_delta": float(deltas.mean()),
+        "decisions_changed": int(sum(classify(a) != classify(b) for a, b in zip(keras_probs, numpy_probs))),
+        "keras_images_per_second": keras_rate,
+        "numpy_images_per_second": numpy_rate
+    }
+
+def main(argv=None):
+    """
+    Command-line entry point.
+
+    Description:
+        python -m inference.numpy_backend export
+        python -m inference.numpy_backend parity --samples /path/to/xrays
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    parser = argparse.ArgumentParser(description="Export and check the NumPy-only inference engine.")
+    parser.add_argument("command", choices=["export", "parity"])
+    parser.add_argument("--samples", help="Folder of sample x-rays for parity")
+    parser.add_argument("--limit", type=int, default=200, help="Most sample images to use")
+    parser.add_argument("--keras-model", default=MODEL_PATH)
+    parser.add_argument("--numpy-model", default=NUMPY_MODEL_PATH)
+    parser.add_argument("--batch-size", type=int, default=16)
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        size = export_model(args.keras_model, args.numpy_model)
+        print(f"Wrote {args.numpy_model} ({size / 1024:.0f} KB)")
+        return
+
+    if not args.samples:
+        parser.error("parity needs --samples")
+
+    from tensorflow.keras.models import load_model
+    from inference.tflite_backend import sample_images
+
+    images = sample_images(args.samples, args.limit)
+    report = parity_report(load_model(args.keras_model), NumpyModel(args.numpy_model), images, args.batch_size)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import io
+from inference.model import INPUT_SHAPE
+
+def load_xray(path):
+    """
+    Load an x-ray as model input.
+
+    Description:
+        Reads the image as 64x64 grayscale and scales pixel values to 0-1.
+        This is the Keras reference path the model was trained with;
+        decode_xray() is the fast path used for serving.
+
+    Arguments:
+        path (str): Path to the image file.
+
+    Returns:
+        numpy.ndarray: float32 array of shape (64, 64, 1).
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    import numpy as np
+    from tensorflow.keras.preprocessing.image import load_img, img_to_array
+
+    image = load_img(path, target_size=(64, 64), color_mode='grayscale')
+    return (img_to_array(image) / 255.0).astype(np.float32)
+
+def decode_xray(source):
+    """
+    Decode an x-ray straight to model input.
+
+    Description:
+        For colour JPEGs, Pillow's draft mode asks the decoder for the luma
+        channel alone. The image is resized to 64x64 with nearest-neighbour
+        sampling, as load_img() does, before any colour conversion, and
+        scaled to 0-1 in a single conversion to float32. Needs only Pillow
+        and NumPy, so the NumPy and TFLite backends never import TensorFlow.
+
+        The image is not scaled down in the DCT domain. That averages blocks
+        of pixels where load_img() samples single ones, and on rib texture
+        with film grain every scale from 1/2 to 1/8 misses the parity
+        tolerance (mean difference 0.03 to 0.06). Entropy decoding dominates
+        for such images anyway, so even 1/8 was only 1.45x faster.
+
+    Arguments:
+        source (bytes or str or file): Image bytes, a path or an open file.
+
+    Returns:
+        numpy.ndarray: float32 array of shape (64, 64, 1).
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    import numpy as np
+    from PIL import Image
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+
+    height, width, _ = INPUT_SHAPE
+    with Image.open(source) as image:
+        image.draft('L', image.size)
+        if image.size != (width, height):
+            image = image.resize((width, height), Image.NEAREST)
+
+    # Nearest-neighbour sampling picks whole pixels, so converting the 64x64
+    # result gives the same values as converting the full image first
+    if image.mode != 'L':
+        image = image.convert('L')
+
+    pixels = np.asarray(image)
+    return np.divide(pixels, np.float32(255.0), dtype=np.float32).reshape(INPUT_SHAPE)
@@ -0,0 +1,424 @@
+import os
+import threading
+import time
+from collections import deque
+from db import (claim_inference_job, complete_inference_job, fail_inference_job, requeue_inference_job,
+                count_inference_jobs, count_pending_inference_jobs, get_queue_limits)
+from inference.admission import Overloaded, STATS_WINDOW
+from inference.model import USE_INFERENCE_SERVER, classify, current_thresholds, model_registry
+from inference.batching import batcher
+from inference.client import InferenceClient, InferenceServerBusy
+from inference.cascade import CASCADE_ENABLED, cascade
+from inference.cache import prediction_cache
+from inference.tensor_store import tensor_store
+from inference.embeddings import embedding_index
+
+INFERENCE_WORKERS = 4
+POLL_INTERVAL = 2.0
+JOB_LEASE_SECONDS = 300
+MAX_ATTEMPTS = 3
+
+# Uploads wait up to QUEUE_WAIT_SECONDS while this many jobs are waiting or
+# running, then are turned away and told to come back after
+# BACKLOG_RETRY_AFTER seconds. Both defaults can be changed on the settings page
+MAX_PENDING_JOBS = 500
+QUEUE_WAIT_SECONDS = 5.0
+BACKLOG_RETRY_AFTER = 30.0
+BACKLOG_POLL_INTERVAL = 0.25
+
+def current_queue_limits():
+    """
+    Get the backlog limit and upload wait currently in force.
+
+    Arguments:
+        None
+
+    Returns:
+        Tuple: (max_pending_jobs, wait_seconds) from the settings table,
+        falling back to MAX_PENDING_JOBS / QUEUE_WAIT_SECONDS.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    max_pending, wait_seconds = get_queue_limits()
+    return (
+        MAX_PENDING_JOBS if max_pending is None else max_pending,
+        QUEUE_WAIT_SECONDS if wait_seconds is None else wait_seconds
+    )
+
+def default_predictor():
+    """
+    Pick what the workers send their images to.
+
+    Arguments:
+        None
+
+    Returns:
+        InferenceClient, CascadePredictor or MicroBatcher: A client for the
+        inference server when USE_INFERENCE_SERVER is set, the two-stage
+        cascade when CASCADE_ENABLED is set, otherwise the in-process batcher.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    if USE_INFERENCE_SERVER:
+        return InferenceClient()
+    return cascade if CASCADE_ENABLED else batcher
+
+class InferenceWorkerPool:
+    """
+    Background workers that drain the inference job table.
+
+    Description:
+        Each worker thread claims the oldest queued job and checks the
+        prediction cache for the image digest. On a miss it decodes the
+        job's x-ray into the tensor store and runs the model on it through
+        the shared micro-batcher (or the inference server), so concurrent
+        jobs share one predict call. The result is written back to the
+        patient record, and the penultimate features from the same predict
+        call are added to the similar-case index. Images the cascade's first
+        stage decided have no features and are left to the embeddings build
+        job, so the full model never runs just to embed them.
+
+        Workers sleep until notify() is called or the poll interval passes,
+        so jobs queued by other processes are still picked up. If the
+        inference server is overloaded the job goes back in the queue
+        without using up an attempt and the worker backs off for as long as
+        the server asks.
+
+    Arguments:
+        image_folder (str): Folder the job filenames are relative to.
+        size (int): Number of worker threads.
+        poll_interval (float): Seconds to wait between empty polls.
+        predictor (optional): Runs the workers' images, defaults to
+            default_predictor().
+        max_pending (int, optional): Backlog size at which check_backlog()
+            holds uploads back, defaults to the settings page's limit.
+        wait_timeout (float, optional): Seconds check_backlog() waits for
+            room before rejecting, defaults to the settings page's wait.
+        embeddings (EmbeddingIndex, optional): Where to add each scored
+            x-ray's embedding. Defaults to the shared index when the default
+            predictor runs the model in this process.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    def __init__(self, image_folder, size=INFERENCE_WORKERS, poll_interval=POLL_INTERVAL, predictor=None,
+                 max_pending=None, wait_timeout=None, embeddings=None):
+        self.image_folder = image_folder
+        if embeddings is None and predictor is None and not USE_INFERENCE_SERVER:
+            embeddings = embedding_index
+        self.embeddings = embeddings
+        self.predictor = predictor or default_predictor()
+        self.size = size
+        self.poll_interval = poll_interval
+        self.max_pending = max_pending
+        self.wait_timeout = wait_timeout
+        self.completed = 0
+        self.failed = 0
+        self.deferred = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self.backlog_rejections = 0
+        self._outcomes = deque(maxlen=STATS_WINDOW)
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Start the worker threads.
+
+        Arguments:
+            None
+
+        Returns:
+            bool: True if this call started them, False if already running.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        with self._lock:
+            if self._threads:
+                return False
+
+            self._stopping.clear()
+            for index in range(self.size):
+                thread = threading.Thread(target=self._run, name=f"inference-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+        return True
+
+    def stop(self, timeout=None):
+        """
+        Ask the workers to finish their current job and exit.
+
+        Arguments:
+            timeout (float, optional): Seconds to wait for each thread.
+
+        Returns:
+            None
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self):
+        """
+        Wake idle workers because a job was just queued.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        self._wakeup.set()
+
+    def limits(self):
+        """
+        Get the backlog limit and upload wait, as set here or on the settings page.
+
+        Returns:
+            Tuple: (max_pending, wait_timeout)
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        if self.max_pending is not None and self.wait_timeout is not None:
+            return self.max_pending, self.wait_timeout
+        max_pending, wait_timeout = current_queue_limits()
+        return (
+            max_pending if self.max_pending is None else self.max_pending,
+            wait_timeout if self.wait_timeout is None else self.wait_timeout
+        )
+
+    def check_backlog(self):
+        """
+        Hold new work back while the job table is backed up.
+
+        Description:
+            While max_pending jobs are queued or running, waits up to
+            wait_timeout seconds for workers (here or in other processes) to
+            finish some, re-counting every BACKLOG_POLL_INTERVAL seconds.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+
+        Raises:
+            Overloaded: The backlog was still full when the wait ran out.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        max_pending, wait_timeout = self.limits()
+        if count_pending_inference_jobs() < max_pending:
+            with self._lock:
+                self._outcomes.append(True)
+            return
+
+        deadline = time.monotonic() + wait_timeout
+        with self._lock:
+            self.waiting += 1
+        try:
+            while count_pending_inference_jobs() >= max_pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    with self._lock:
+                        self.backlog_rejections += 1
+                        self._outcomes.append(False)
+                    raise Overloaded("The AI queue is full, please try again", BACKLOG_RETRY_AFTER)
+                time.sleep(min(BACKLOG_POLL_INTERVAL, remaining))
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+        with self._lock:
+            self._outcomes.append(True)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.clear()
+            try:
+                job = claim_inference_job(JOB_LEASE_SECONDS)
+            except Exception as e:
+                print(f"Inference queue error: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                continue
+
+            self.process(job)
+
+    def model_version(self):
+        """
+        Get the version of whatever scores the workers' images.
+
+        Arguments:
+            None
+
+        Returns:
+            str or None: The predictor's own version (e.g. the cascade's),
+            otherwise the model registry's.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        get_version = getattr(self.predictor, 'get_version', None)
+        return get_version() if get_version else model_registry.get_version()
+
+    def _predict(self, image):
+        # Returns (probability, penultimate features or None, version that
+        # scored it or None if the predictor cannot say)
+        predict_with_version = getattr(self.predictor, 'predict_with_version', None)
+        if predict_with_version is not None:
+            probability, version = predict_with_version(image)
+            return probability, None, version
+
+        predict_with_features = getattr(self.predictor, 'predict_with_features', None)
+        if self.embeddings is None or predict_with_features is None:
+            return self.predictor.predict(image), None, None
+        return predict_with_features(image) + (None,)
+
+    def _add_embedding(self, patient_id, features):
+        # No features means the full model never saw the image (the cascade's
+        # first stage decided it); python -m inference.embeddings build
+        # fills those in later rather than running the full model here
+        if self.embeddings is None or features is None:
+            return
+        try:
+            self.embeddings.add_features([patient_id], features)
+        except Exception as e:
+            # Similar-case lookup is a convenience; never fail the job over it
+            print(f"Embedding error: {e}")
+
+    def process(self, job):
+        """
+        Run the model for one claimed job and store the result.
+
+        Arguments:
+            job (sqlite3.Row): Row from the inference_jobs table.
+
+        Returns:
+            bool: True if the prediction was stored.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        with self._lock:
+            self.in_flight += 1
+        try:
+            return self._process(job)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def _process(self, job):
+        try:
+            model_version = self.model_version()
+            prediction_prob = prediction_cache.lookup(job['xray_digest'], model_version)
+            cached = prediction_prob is not None
+            latency_ms = None
+
+            if not cached:
+                started = time.perf_counter()
+                path = os.path.join(self.image_folder, job['xray_img'])
+                image = tensor_store.load(job['xray_img'], path)
+                prediction_prob, features, scored_by = self._predict(image)
+
+                # A new model version may have been swapped in mid-predict;
+                # run again so the stored version is the one that scored it,
+                # unless the inference server said which one did
+                if scored_by is not None:
+                    model_version = scored_by
+                elif self.model_version() != model_version:
+                    model_version = self.model_version()
+                    prediction_prob, features, _ = self._predict(image)
+
+                latency_ms = (time.perf_counter() - started) * 1000
+                prediction_cache.store(job['xray_digest'], model_version, prediction_prob)
+                self._add_embedding(job['patient_id'], features)
+
+            prediction = classify(prediction_prob, *current_thresholds())
+            complete_inference_job(
+                job['id'], job['patient_id'], job['xray_img'], prediction_prob, prediction,
+                model_version, latency_ms, cached
+            )
+            with self._lock:
+                self.completed += 1
+            return True
+
+        except InferenceServerBusy as e:
+            requeue_inference_job(job['id'])
+            with self._lock:
+                self.deferred += 1
+            self._stopping.wait(e.retry_after)
+            return False
+
+        except Exception as e:
+            print(f"Prediction error: {e}")
+            fail_inference_job(job['id'], str(e), MAX_ATTEMPTS)
+            with self._lock:
+                self.failed += 1
+            return False
+
+    def status(self):
+        """
+        Describe the pool and the job table.
+
+        Arguments:
+            None
+
+        Returns:
+            dict: Worker count, jobs completed/failed/deferred here, jobs
+            running and uploads waiting right now, the limits in force,
+            uploads turned away and their share of the last STATS_WINDOW
+            upload checks, and jobs by status.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        max_pending, wait_timeout = self.limits()
+        with self._lock:
+            outcomes = list(self._outcomes)
+
+        return {
+            "workers": len([thread for thread in self._threads if thread.is_alive()]),
+            "completed": self.completed,
+            "failed": self.failed,
+            "deferred": self.deferred,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_pending": max_pending,
+            "wait_timeout": wait_timeout,
+            "backlog_rejections": self.backlog_rejections,
+            "rejection_rate": outcomes.count(False) / len(outcomes) if outcomes else None,
+            "jobs": count_inference_jobs(),
+            "batching": self.predictor.stats(),
+            "cache": prediction_cache.stats()
+        }
@@ -0,0 +1,285 @@
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from inference.model import INFERENCE_SOCKET, model_registry
+from inference.admission import AdmissionController, Overloaded
+
+MAX_RSS_MB = 2048
+SUPERVISOR_CHECK_INTERVAL = 5.0
+RESTART_DELAY = 1.0
+
+# Requests predicting at once, requests allowed to wait for a slot, and how
+# long they may wait before being told to try again
+SERVER_MAX_IN_FLIGHT = 32
+SERVER_MAX_WAITING = 64
+SERVER_ADMISSION_TIMEOUT = 5.0
+
+def attach_shared_memory(name):
+    """
+    Attach to a shared memory block created by a client.
+
+    Description:
+        The client owns the block and unlinks it, so the server must not let
+        Python's resource tracker unlink it when the server exits.
+
+    Arguments:
+        name (str): Shared memory block name.
+
+    Returns:
+        SharedMemory: The attached block.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    try:
+        return SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+class InferenceServer:
+    """
+    Serves model predictions to web workers over a Unix domain socket.
+
+    Description:
+        Clients write their images into a shared memory block and send a one
+        line JSON request naming the block and the array shape. The server
+        maps the block without copying, submits every image to its
+        micro-batcher (so requests from different web workers share predict
+        calls) and replies with one JSON line of probabilities. Requests past
+        the admission limits get an "overloaded" reply instead of piling up.
+
+    Arguments:
+        socket_path (str): Path of the Unix socket to listen on.
+        predictor (MicroBatcher, optional): Defaults to the shared batcher.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    def __init__(self, socket_path=INFERENCE_SOCKET, predictor=None):
+        if predictor is None:
+            from inference.batching import batcher
+            predictor = batcher
+
+        self.socket_path = socket_path
+        self.predictor = predictor
+        self.admission = AdmissionController("Inference server", SERVER_MAX_IN_FLIGHT, SERVER_MAX_WAITING, SERVER_ADMISSION_TIMEOUT)
+        self.requests = 0
+        self._listener = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        """
+        Bind the socket and accept connections on a background thread.
+
+        Arguments:
+            None
+
+        Returns:
+            threading.Thread: The accept loop thread.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self.socket_path)
+        self._listener.listen(64)
+
+        thread = threading.Thread(target=self._accept_loop, name="inference-server", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stopping.set()
+        if self._listener is not None:
+            self._listener.close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def _accept_loop(self):
+        while not self._stopping.is_set():
+            try:
+                connection, _ = self._listener.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve_connection, args=(connection,), daemon=True).start()
+
+    def _serve_connection(self, connection):
+        # A client that timed out and hung up breaks the pipe on the write
+        # or on the flush when the stream is closed; either way it is gone
+        try:
+            with connection, connection.makefile('rwb') as stream:
+                for line in stream:
+                    try:
+                        response = self.handle(json.loads(line))
+                    except Exception as e:
+                        response = {"error": str(e)}
+                    stream.write(json.dumps(response).encode() + b"\n")
+                    stream.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def handle(self, request):
+        """
+        Answer one client request.
+
+        Arguments:
+            request (dict): {"op": "predict", "shm": name, "shape": [n, 64, 64, 1]}
+                or {"op": "status"}.
+
+        Returns:
+            dict: Probabilities and model version, status, or an overloaded
+            error with a retry_after hint.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        if request.get("op") == "status":
+            return {
+                "pid": os.getpid(),
+                "requests": self.requests,
+                "model": model_registry.status(),
+                "model_version": model_registry.get_version(),
+                "batching": self.predictor.stats(),
+                "admission": self.admission.stats()
+            }
+
+        import numpy as np
+
+        try:
+            with self.admission.admit():
+                shm = attach_shared_memory(request["shm"])
+                try:
+                    images = np.ndarray(tuple(request["shape"]), dtype=np.float32, buffer=shm.buf)
+                    # Score again if a new version was swapped in meanwhile,
+                    # so the version returned is the one that scored them
+                    while True:
+                        version = model_registry.get_version()
+                        futures = [self.predictor.submit(image) for image in images]
+                        probabilities = [future.result() for future in futures]
+                        if model_registry.get_version() == version:
+                            break
+                    del images
+                finally:
+                    shm.close()
+        except Overloaded as e:
+            return {"error": str(e), "overloaded": True, "retry_after": e.retry_after}
+
+        self.requests += 1
+        return {"probabilities": probabilities, "model_version": version}
+
+def serve(socket_path):
+    """
+    Run an inference server in this process until it is killed.
+
+    Description:
+        Loads and warms the model before accepting connections, so clients
+        never wait on a cold model, and hot-swaps newly promoted versions.
+
+    Arguments:
+        socket_path (str)
+
+    Returns:
+        None
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    model_registry.load()
+    model_registry.watch()
+    server = InferenceServer(socket_path)
+    server.start().join()
+
+def process_rss_mb(pid):
+    """
+    Read a process's resident memory from /proc.
+
+    Arguments:
+        pid (int)
+
+    Returns:
+        float or None: Resident set size in MB, None if it cannot be read.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+def supervise(socket_path=INFERENCE_SOCKET, max_rss_mb=MAX_RSS_MB, check_interval=SUPERVISOR_CHECK_INTERVAL):
+    """
+    Keep an inference server process running.
+
+    Description:
+        Starts the server in a child process and restarts it whenever it
+        exits or its resident memory grows past max_rss_mb, so a crash or a
+        leak in TensorFlow never takes inference down for long.
+
+    Arguments:
+        socket_path (str), max_rss_mb (float), check_interval (float)
+
+    Returns:
+        None
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    context = multiprocessing.get_context('spawn')
+
+    while True:
+        child = context.Process(target=serve, args=(socket_path,), name="inference-server")
+        child.start()
+        print(f"Inference server started (pid {child.pid}) on {socket_path}")
+
+        while child.is_alive():
+            child.join(check_interval)
+            rss = process_rss_mb(child.pid)
+            if rss is not None and rss > max_rss_mb:
+                print(f"Inference server using {rss:.0f} MB, over the {max_rss_mb} MB limit; restarting")
+                child.terminate()
+                child.join()
+
+        print(f"Inference server exited with code {child.exitcode}; restarting")
+        time.sleep(RESTART_DELAY)
+
+def main(argv=None):
+    """
+    Command-line entry point.
+
+    Description:
+        python -m inference.server --socket /tmp/pneumonia-inference.sock
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    parser = argparse.ArgumentParser(description="Run the supervised pneumonia inference server.")
+    parser.add_argument("--socket", default=INFERENCE_SOCKET)
+    parser.add_argument("--max-rss-mb", type=float, default=MAX_RSS_MB)
+    args = parser.parse_args(argv)
+
+    supervise(args.socket, args.max_rss_mb)
+
+if __name__ == "__main__":
+    main()
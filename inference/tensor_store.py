@@ -0,0 +1,375 @@
+import argparse
+import fcntl
+import json
+import os
+import uuid
+from contextlib import contextmanager
+from db import (get_tensor_rows, store_tensor_rows, delete_tensor_row, count_tensor_rows, list_live_tensor_rows,
+                replace_tensor_rows)
+from inference.model import INPUT_SHAPE
+from inference.preprocess import decode_xray
+
+TENSOR_STORE_DIR = 'database/xray_tensors'
+TENSOR_FILE = 'tensors.f32'
+LOCK_FILE = 'tensors.lock'
+
+# float32 pixels per stored image
+ROW_BYTES = INPUT_SHAPE[0] * INPUT_SHAPE[1] * INPUT_SHAPE[2] * 4
+
+# Backfills compact the store first once this share of rows is dead
+COMPACT_DEAD_SHARE = 0.25
+
+@contextmanager
+def file_lock(directory, name, shared=False):
+    """
+    Hold a lock on a file, shared by every process and thread.
+
+    Arguments:
+        directory (str): Created if missing.
+        name (str): Lock file name inside it.
+        shared (bool): Take a shared lock, held alongside other shared
+            locks but never alongside the exclusive one.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, name), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+class TensorStore:
+    """
+    Memory-mapped file of decoded 64x64 model inputs, one row per x-ray.
+
+    Description:
+        Rows are appended as images are decoded and never moved except by
+        compact(). The xray_tensors table maps each x-ray filename to its
+        row, keyed by the store's folder so stores never see each other's
+        rows, so batch jobs can read model input straight from the page cache
+        instead of decoding full-resolution JPEGs again; rows for patients in
+        ID order come back as a single zero-copy slice.
+
+        Appends take an exclusive lock file so the web app, inference server
+        and batch jobs can all add rows. Reads look up the index and map the
+        file under a shared lock, so they never pair rows from before a
+        compaction with the compacted file. Deleted and replaced images leave
+        dead rows behind until compact() rewrites the file. The store is only
+        a cache: if the file goes missing its index is dropped and rows are
+        filled in again as images are next loaded.
+
+    Arguments:
+        root (str): Folder holding the tensor file.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    def __init__(self, root=TENSOR_STORE_DIR):
+        self.root = root
+        self.path = os.path.join(root, TENSOR_FILE)
+        self.key = os.path.realpath(root)
+        self.hits = 0
+        self.misses = 0
+        self._map = None
+        self._map_key = None
+
+    def _rows_in_file(self):
+        try:
+            return os.path.getsize(self.path) // ROW_BYTES
+        except FileNotFoundError:
+            return 0
+
+    def _view(self):
+        """
+        Map the tensor file read-only, remapping if it grew or was replaced.
+
+        Returns:
+            numpy.memmap or None: (rows, 64, 64, 1) view, None if the file is empty or missing.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        import numpy as np
+
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._map = self._map_key = None
+            return None
+
+        key = (stat.st_ino, stat.st_size)
+        if key != self._map_key:
+            rows = stat.st_size // ROW_BYTES
+            self._map = np.memmap(self.path, dtype=np.float32, mode='r', shape=(rows,) + INPUT_SHAPE) if rows else None
+            self._map_key = key
+        return self._map
+
+    def put_many(self, items):
+        """
+        Append decoded images to the store.
+
+        Description:
+            Writes every image under one lock and records the rows in one
+            transaction. Index entries pointing past the end of the file (it
+            was deleted or truncated) are dropped first, which is how a lost
+            file is rebuilt lazily.
+
+        Arguments:
+            items (list): (x-ray filename, float32 array of shape (64, 64, 1)) pairs.
+
+        Returns:
+            None
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        import numpy as np
+
+        if not items:
+            return
+
+        data = np.ascontiguousarray(np.stack([image for _, image in items]), dtype=np.float32).tobytes()
+
+        with file_lock(self.root, LOCK_FILE):
+            first_row = self._rows_in_file()
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT, 0o644)
+            try:
+                os.pwrite(fd, data, first_row * ROW_BYTES)
+            finally:
+                os.close(fd)
+
+            store_tensor_rows(self.key, first_row, [(name, first_row + index) for index, (name, _) in enumerate(items)])
+
+    def put(self, xray_img, image):
+        self.put_many([(xray_img, image)])
+
+    def get_many(self, xray_imgs):
+        """
+        Read stored images.
+
+        Arguments:
+            xray_imgs (list): X-ray filenames.
+
+        Returns:
+            Tuple: (float32 array of shape (n, 64, 64, 1) or None, list of
+            filenames not in the store). The array is a zero-copy view when
+            every image is stored in consecutive rows, otherwise one copy.
+            It is None if any image is missing.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        # compact() swaps the file and rewrites the index under the exclusive
+        # lock; a view mapped here keeps the file it was mapped from
+        with file_lock(self.root, LOCK_FILE, shared=True):
+            rows = get_tensor_rows(self.key, xray_imgs)
+            view = self._view()
+        available = len(view) if view is not None else 0
+
+        missing = [name for name in xray_imgs if rows.get(name, available) >= available]
+        self.hits += len(xray_imgs) - len(missing)
+        self.misses += len(missing)
+        if missing or not xray_imgs:
+            return None, missing
+
+        indices = [rows[name] for name in xray_imgs]
+        first = indices[0]
+        if indices == list(range(first, first + len(indices))):
+            return view[first:first + len(indices)], []
+        return view[indices], []
+
+    def get(self, xray_img):
+        images, _ = self.get_many([xray_img])
+        return None if images is None else images[0]
+
+    def load(self, xray_img, path):
+        """
+        Get an image's model input, decoding and storing it on a miss.
+
+        Arguments:
+            xray_img (str): X-ray filename, the store key.
+            path (str): Where the JPEG is.
+
+        Returns:
+            numpy.ndarray: float32 array of shape (64, 64, 1).
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        image = self.get(xray_img)
+        if image is None:
+            image = decode_xray(path)
+            self.put(xray_img, image)
+        return image
+
+    def load_many(self, xray_imgs, paths, pool):
+        """
+        Get model input for several images, decoding only the ones not stored.
+
+        Arguments:
+            xray_imgs (list): X-ray filenames, the store keys.
+            paths (list): Where each JPEG is.
+            pool (ThreadPoolExecutor): Decodes the missing images in parallel.
+
+        Returns:
+            Tuple: (float32 array of shape (n, 64, 64, 1) or None for the
+            images that loaded, in order; dict of failed index to exception)
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        import numpy as np
+
+        images, missing = self.get_many(xray_imgs)
+        if images is not None:
+            return images, {}
+
+        missing = set(missing)
+        stored = self.get_many([name for name in xray_imgs if name not in missing])[0]
+        stored = iter(stored if stored is not None else [])
+        futures = {
+            index: pool.submit(decode_xray, path)
+            for index, (name, path) in enumerate(zip(xray_imgs, paths)) if name in missing
+        }
+
+        loaded, decoded, failed = [], [], {}
+        for index, name in enumerate(xray_imgs):
+            if index not in futures:
+                loaded.append(next(stored))
+                continue
+            try:
+                image = futures[index].result()
+            except Exception as e:
+                failed[index] = e
+                continue
+            loaded.append(image)
+            decoded.append((name, image))
+
+        self.put_many(decoded)
+        return (np.stack(loaded) if loaded else None), failed
+
+    def delete(self, xray_img):
+        """
+        Forget an image. Its row stays in the file until compact().
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        delete_tensor_row(self.key, xray_img)
+
+    def compact(self):
+        """
+        Rewrite the file with only live rows, in patient ID order.
+
+        Description:
+            Rows of deleted or replaced images, and of patients that no
+            longer exist, are dropped. The new file is written under a
+            temporary name and renamed into place; processes that already
+            have the old file mapped keep reading it until they remap. The
+            rename happens inside the transaction that rewrites the index,
+            and the old file is put back if the index cannot be committed,
+            so rows and index always change together.
+
+        Arguments:
+            None
+
+        Returns:
+            dict: Rows before and after.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        with file_lock(self.root, LOCK_FILE):
+            view = self._view()
+            before = len(view) if view is not None else 0
+            live = [(name, row) for name, row in list_live_tensor_rows(self.key) if row < before]
+
+            tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+            backup_path = f"{self.path}.{uuid.uuid4().hex}.bak"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    for _, row in live:
+                        f.write(view[row].tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                if view is not None:
+                    os.link(self.path, backup_path)
+                try:
+                    replace_tensor_rows(
+                        self.key,
+                        [(name, index) for index, (name, _) in enumerate(live)],
+                        before_commit=lambda: os.replace(tmp_path, self.path)
+                    )
+                except BaseException:
+                    if os.path.exists(backup_path):
+                        os.replace(backup_path, self.path)
+                    raise
+            finally:
+                for path in (tmp_path, backup_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+
+        return {"rows_before": before, "rows_after": len(live)}
+
+    def stats(self):
+        """
+        Describe the store's size and dead space.
+
+        Returns:
+            dict: Rows in the file, live rows, dead share, file size and this
+            process's hit/miss counts.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        rows = self._rows_in_file()
+        live = min(count_tensor_rows(self.key), rows)
+
+        return {
+            "rows": rows,
+            "live_rows": live,
+            "dead_share": (rows - live) / rows if rows else 0.0,
+            "size_mb": rows * ROW_BYTES / (1024 * 1024),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+tensor_store = TensorStore()
+
+def main(argv=None):
+    """
+    Command-line entry point.
+
+    Description:
+        python -m inference.tensor_store stats
+        python -m inference.tensor_store compact
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    parser = argparse.ArgumentParser(description="Inspect or compact the decoded x-ray tensor store.")
+    parser.add_argument("command", choices=["stats", "compact"])
+    parser.add_argument("--root", default=TENSOR_STORE_DIR)
+    args = parser.parse_args(argv)
+
+    store = TensorStore(args.root)
+    report = store.compact() if args.command == "compact" else store.stats()
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+import argparse
+import glob
+import json
+import os
+import threading
+import time
+import numpy as np
+from inference.model import MODEL_PATH, TFLITE_MODEL_PATH, classify
+
+TFLITE_THREADS = os.cpu_count() or 1
+CALIBRATION_SAMPLES = 200
+
+def load_interpreter(model_path, num_threads):
+    """
+    Create a TFLite interpreter for a model file.
+
+    Description:
+        Uses the standalone LiteRT runtime when it is installed, so CPU-only
+        servers do not need TensorFlow to serve predictions, and falls back to
+        the interpreter bundled with TensorFlow otherwise.
+
+    Arguments:
+        model_path (str), num_threads (int)
+
+    Returns:
+        Interpreter: TFLite interpreter for the model.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+
+    return Interpreter(model_path=model_path, num_threads=num_threads)
+
+class TFLiteModel:
+    """
+    Quantised TFLite model with the same predict() call as a Keras model.
+
+    Description:
+        Resizes the interpreter input to the batch size on demand, so batches
+        from the micro-batcher run as one invoke. The interpreter is not
+        thread-safe, so calls are serialised.
+
+    Arguments:
+        model_path (str): Path to the .tflite file.
+        num_threads (int): CPU threads the interpreter may use.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    def __init__(self, model_path=TFLITE_MODEL_PATH, num_threads=TFLITE_THREADS):
+        self.model_path = model_path
+        self.interpreter = load_interpreter(model_path, num_threads)
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = None
+        self._lock = threading.Lock()
+
+    def predict(self, batch, batch_size=None, verbose=0):
+        """
+        Run the model on a batch of images.
+
+        Arguments:
+            batch (numpy.ndarray): float32 array of shape (n, 64, 64, 1).
+            batch_size, verbose: Accepted for Keras compatibility, ignored.
+
+        Returns:
+            numpy.ndarray: Probabilities of shape (n, 1).
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        batch = np.asarray(batch, dtype=np.float32)
+
+        with self._lock:
+            if self._batch_size != len(batch):
+                self.interpreter.resize_tensor_input(self._input['index'], [len(batch), *batch.shape[1:]])
+                self.interpreter.allocate_tensors()
+                self._batch_size = len(batch)
+
+            self.interpreter.set_tensor(self._input['index'], batch)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output['index']).copy()
+
+def sample_images(sample_dir, limit):
+    """
+    Load up to limit x-rays from a folder as model input.
+
+    Arguments:
+        sample_dir (str): Folder searched recursively for .jpg/.jpeg files.
+        limit (int): Most images to load.
+
+    Returns:
+        numpy.ndarray: float32 array of shape (n, 64, 64, 1).
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    from inference.preprocess import decode_xray
+
+    paths = sorted(
+        path for path in glob.glob(os.path.join(sample_dir, '**', '*'), recursive=True)
+        if path.lower().endswith(('.jpg', '.jpeg'))
+    )[:limit]
+
+    if not paths:
+        raise ValueError(f"No .jpg/.jpeg images found in {sample_dir}")
+
+    return np.stack([decode_xray(path) for path in paths])
+
+def convert_model(keras_path, output_path=TFLITE_MODEL_PATH, calibration_images=None):
+    """
+    Convert the Keras model to a post-training int8-quantised TFLite model.
+
+    Description:
+        Weights and activations are quantised to int8 using the calibration
+        images to pick activation ranges. Input and output stay float32 so the
+        backend is a drop-in replacement for the Keras model. Without
+        calibration images random inputs are used, which is only suitable for
+        testing the pipeline.
+
+    Arguments:
+        keras_path (str): Path to the Keras model.
+        output_path (str): Where to write the .tflite file.
+        calibration_images (numpy.ndarray, optional): (n, 64, 64, 1) float32 images.
+
+    Returns:
+        int: Size of the written model in bytes.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    import tensorflow as tf
+
+    if calibration_images is None:
+        calibration_images = np.random.default_rng(0).random((32, 64, 64, 1), dtype=np.float32)
+
+    def representative_dataset():
+        for image in calibration_images:
+            yield [image[None, ...].astype(np.float32)]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(tf.keras.models.load_model(keras_path))
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    tflite_model = converter.convert()
+
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(tflite_model)
+    os.replace(tmp_path, output_path)
+
+    return len(tflite_model)
+
+def time_predictions(model, images, batch_size):
+    """
+    Predict every image in batches and time it.
+
+    Arguments:
+        model: Object with a Keras-style predict().
+        images (numpy.ndarray), batch_size (int)
+
+    Returns:
+        Tuple: (probabilities as a flat array, images per second)
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    model.predict(images[:batch_size], batch_size=batch_size, verbose=0)
+
+    start = time.perf_counter()
+    probabilities = np.concatenate([
+        np.asarray(model.predict(images[i:i + batch_size], batch_size=batch_size, verbose=0)).reshape(-1)
+        for i in range(0, len(images), batch_size)
+    ])
+    elapsed = time.perf_counter() - start
+
+    return probabilities, len(images) / elapsed
+
+def parity_report(keras_model, tflite_model, images, batch_size=16):
+    """
+    Compare the quantised model against the Keras model.
+
+    Description:
+        Reports how far the TFLite probabilities drift from the Keras ones,
+        how many triage decisions change at the current 0.05/0.99 band, and
+        the throughput of each backend on the same images.
+
+    Arguments:
+        keras_model, tflite_model: Objects with a Keras-style predict().
+        images (numpy.ndarray): (n, 64, 64, 1) float32 images.
+        batch_size (int)
+
+    Returns:
+        dict: Delta statistics, decision changes and throughput figures.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    keras_probs, keras_rate = time_predictions(keras_model, images, batch_size)
+    tflite_probs, tflite_rate = time_predictions(tflite_model, images, batch_size)
+
+    deltas = np.abs(keras_probs - tflite_probs)
+    changed = [
+        index for index, (a, b) in enumerate(zip(keras_probs, tflite_probs))
+        if classify(a) != classify(b)
+    ]
+
+    return {
+        "images": len(images),
+        "max_abs_delta": float(deltas.max()),
+        "mean_abs_delta": float(deltas.mean()),
+        "p99_abs_delta": float(np.percentile(deltas, 99)),
+        "decisions_changed": len(changed),
+        "changed_indices": changed,
+        "keras_images_per_second": keras_rate,
+        "tflite_images_per_second": tflite_rate,
+        "speedup": tflite_rate / keras_rate
+    }
+
+def main(argv=None):
+    """
+    Command-line entry point.
+
+    Description:
+        python -m inference.tflite_backend convert --samples /path/to/xrays
+        python -m inference.tflite_backend parity --samples /path/to/xrays
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    parser = argparse.ArgumentParser(description="Build and check the int8 TFLite inference backend.")
+    parser.add_argument("command", choices=["convert", "parity"])
+    parser.add_argument("--samples", help="Folder of sample x-rays for calibration / parity")
+    parser.add_argument("--limit", type=int, default=CALIBRATION_SAMPLES, help="Most sample images to use")
+    parser.add_argument("--keras-model", default=MODEL_PATH)
+    parser.add_argument("--tflite-model", default=TFLITE_MODEL_PATH)
+    parser.add_argument("--batch-size", type=int, default=16)
+    args = parser.parse_args(argv)
+
+    images = sample_images(args.samples, args.limit) if args.samples else None
+
+    if args.command == "convert":
+        size = convert_model(args.keras_model, args.tflite_model, images)
+        print(f"Wrote {args.tflite_model} ({size / 1024:.0f} KB)")
+        return
+
+    if images is None:
+        parser.error("parity needs --samples")
+
+    from tensorflow.keras.models import load_model
+
+    report = parity_report(load_model(args.keras_model), TFLiteModel(args.tflite_model), images, args.batch_size)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import argparse
+import hashlib
+import os
+import shutil
+import uuid
+
+MODEL_DIR = 'machine-learning/models'
+CURRENT_FILE = 'CURRENT'
+MODEL_FILES = {'keras': 'model.keras', 'tflite': 'model.tflite', 'numpy': 'model.npz'}
+
+def file_version(path):
+    """
+    Derive a model version from the model file contents.
+
+    Arguments:
+        path (str): Path to the model file.
+
+    Returns:
+        str: First 16 hex characters of the file's SHA-256.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+def write_atomically(path, data):
+    """
+    Replace a small file so readers see either the old or the new contents.
+
+    Arguments:
+        path (str), data (str)
+
+    Returns:
+        None
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class ModelStore:
+    """
+    Directory of immutable model versions with one promoted version.
+
+    Description:
+        Each version lives in its own folder (models/<version>/model.keras,
+        model.tflite and/or model.npz) and is never changed once written. The CURRENT
+        file names the version the app serves. Files are copied in under a
+        temporary name and renamed into place, and CURRENT is replaced with
+        a rename, so a reader never sees a half-written model or pointer.
+
+    Arguments:
+        root (str): Folder holding the versions.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    def __init__(self, root=MODEL_DIR):
+        self.root = root
+
+    def current(self):
+        """
+        Get the promoted version.
+
+        Returns:
+            str or None: Version named in CURRENT, None if nothing is promoted.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def versions(self):
+        """
+        List the stored versions.
+
+        Returns:
+            list: Version names, oldest first.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        if not os.path.isdir(self.root):
+            return []
+
+        folders = [
+            entry for entry in os.scandir(self.root)
+            if entry.is_dir() and not entry.name.startswith('.')
+        ]
+        return [entry.name for entry in sorted(folders, key=lambda entry: entry.stat().st_mtime)]
+
+    def model_path(self, version, backend='keras'):
+        return os.path.join(self.root, version, MODEL_FILES[backend])
+
+    def add(self, source_path, version=None, backend='keras'):
+        """
+        Copy a model file into the store as a new version.
+
+        Description:
+            The version defaults to the file's content hash. A version's file
+            for a backend can only be written once; adding the .tflite or
+            .npz conversion of an existing version is allowed.
+
+        Arguments:
+            source_path (str): Model file to add.
+            version (str, optional): Version name.
+            backend (str): 'keras', 'tflite' or 'numpy'.
+
+        Returns:
+            str: The version name.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        version = version or file_version(source_path)
+        if version.startswith('.') or os.sep in version or version == CURRENT_FILE:
+            raise ValueError(f"Invalid model version name: {version}")
+
+        destination = self.model_path(version, backend)
+        if os.path.exists(destination):
+            raise FileExistsError(f"Version {version} already has a {backend} model")
+
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        tmp_path = f"{destination}.{uuid.uuid4().hex}.tmp"
+        shutil.copyfile(source_path, tmp_path)
+        with open(tmp_path, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, destination)
+
+        return version
+
+    def promote(self, version):
+        """
+        Make a stored version the one the app serves.
+
+        Description:
+            Running processes notice the change, warm the new model in the
+            background and switch over once it is ready.
+
+        Arguments:
+            version (str)
+
+        Returns:
+            None
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        if not any(os.path.exists(self.model_path(version, backend)) for backend in MODEL_FILES):
+            raise ValueError(f"Unknown model version: {version}")
+
+        write_atomically(os.path.join(self.root, CURRENT_FILE), version + "\n")
+
+def main(argv=None):
+    """
+    Command-line entry point.
+
+    Description:
+        python -m inference.versions add path/to/model.keras [--promote]
+        python -m inference.versions promote VERSION
+        python -m inference.versions list
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    parser = argparse.ArgumentParser(description="Manage versioned pneumonia models.")
+    parser.add_argument("command", choices=["list", "add", "promote"])
+    parser.add_argument("target", nargs="?", help="Model file for add, version for promote")
+    parser.add_argument("--version", help="Version name for add (default: content hash)")
+    parser.add_argument("--backend", choices=sorted(MODEL_FILES), default="keras")
+    parser.add_argument("--promote", action="store_true", help="Promote the version after adding it")
+    parser.add_argument("--root", default=MODEL_DIR)
+    args = parser.parse_args(argv)
+
+    store = ModelStore(args.root)
+
+    if args.command == "list":
+        current = store.current()
+        for version in store.versions():
+            print(f"{'*' if version == current else ' '} {version}")
+        return
+
+    if not args.target:
+        parser.error(f"{args.command} needs a target")
+
+    if args.command == "add":
+        version = store.add(args.target, args.version, args.backend)
+        print(f"Added {version}")
+        if args.promote:
+            store.promote(version)
+            print(f"Promoted {version}")
+    else:
+        store.promote(args.target)
+        print(f"Promoted {args.target}")
+
+if __name__ == "__main__":
+    main()
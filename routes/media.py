@@ -0,0 +1,101 @@
+import os
+import posixpath
+import re
+from flask import Blueprint, abort, request, send_from_directory
+from images import IMAGES_FOLDER, SIGNED_FOLDERS, check_image_signature
+
+media = Blueprint('media', __name__)
+
+# Sub-folders of static/images served by this route
+IMAGE_FOLDERS = ('xrays', 'avatars')
+
+# Names starting with a SHA-256 digest (or a UUID, for uploads from before
+# content hashing) never change content, along with their resized copies
+# and Grad-CAM overlays
+IMMUTABLE_NAME = re.compile(r'^[0-9a-f]{32}(?:[0-9a-f]{32})?\.')
+
+# How long browsers keep an immutable image, in seconds
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+@media.before_app_request
+def hide_uploads_from_static():
+    """
+    Stop the generic static route serving uploaded images.
+
+    Description:
+        Uploads live under static/images, so without this anyone with a
+        filename could fetch an x-ray from /static/images/xrays/ and skip
+        the signature check in serve_image(). The default avatar and
+        thumbnail directly inside static/images are still served.
+
+    Returns:
+        None, or aborts with 404.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    if request.endpoint != 'static':
+        return None
+
+    path = posixpath.normpath((request.view_args or {}).get('filename', '')).lstrip('/')
+    if path.startswith('images/') and '/' in path[len('images/'):]:
+        abort(404)
+
+@media.route('/images/<folder>/<filename>', methods=['GET'])
+def serve_image(folder, filename):
+    """
+    Route to serve an uploaded x-ray or avatar, or one of its resized copies.
+
+    Description:
+        Content-named files are sent with a year-long immutable
+        Cache-Control and their name as the ETag, so repeat page views
+        reuse the browser's copy without asking. Other files are
+        revalidated each time and answered with 304 while unchanged.
+        Range requests are supported. The file is handed to the server's
+        wsgi.file_wrapper, which sends it with sendfile() where available.
+        X-rays are marked private so shared caches do not keep them.
+
+        X-ray URLs must carry a valid signature from image_url(). It is
+        checked with an HMAC alone, with no database query, so a list page
+        full of thumbnails costs no more than before. Browsers keep a signed
+        image no longer than its URL is valid.
+
+    Arguments:
+        folder (str): 'xrays' or 'avatars'.
+        filename (str): Image filename.
+
+    Returns:
+        Response: The image, 206 for a range, 304 if unchanged, 403 for a
+        missing, wrong or expired signature, or 404.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    if folder not in IMAGE_FOLDERS:
+        abort(404)
+
+    max_age = IMMUTABLE_MAX_AGE
+    if folder in SIGNED_FOLDERS:
+        remaining = check_image_signature(folder, filename, request.args)
+        if remaining is None:
+            abort(403)
+        max_age = min(max_age, remaining)
+
+    immutable = IMMUTABLE_NAME.match(filename) is not None
+    response = send_from_directory(
+        os.path.abspath(os.path.join(IMAGES_FOLDER, folder)),
+        filename,
+        conditional=True,
+        etag=filename if immutable else True,
+        max_age=max_age if immutable else None
+    )
+
+    if immutable:
+        response.cache_control.immutable = True
+    if folder == 'xrays' and response.cache_control.public:
+        response.cache_control.public = False
+        response.cache_control.private = True
+
+    return response
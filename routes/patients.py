@@ -1,7 +1,9 @@
 import os
 from flask import Blueprint, request, render_template, redirect, url_for, flash, session
 from routes.auth import check_jwt_tokens, check_is_worker, get_user_from_token, check_is_clinician
-from db import add_patient, get_user, get_user_id, list_patients, patients_to_review, all_pneumonia_cases, reviewed_patients, delete_patient, update_patient, get_patient, delete_xray_image, get_closed_cases, close_patient_case, reopen_patient_case, get_reviewed_cases_for_worker, update_clinician_reviewed, update_clinician_to_review
+from inference.embeddings import embedding_index
+from storage import release_xray
+from db import add_patient, get_user, get_user_id, list_patients, patients_to_review, all_pneumonia_cases, reviewed_patients, delete_patient, update_patient, get_patient, delete_xray_image, get_closed_cases, close_patient_case, reopen_patient_case, get_reviewed_cases_for_worker, update_clinician_reviewed, update_clinician_to_review, get_inference_job_status
 from datetime import datetime
 patients = Blueprint('patients', __name__)
 
@@ -440,7 +442,8 @@ def delete_existing_patient(id):
 
     Description:
         Only workers can delete patients. This route removes the patient
-        from the system by ID and redirects with a success or error message.
+        from the system by ID, releases their x-ray and redirects with a
+        success or error message.
 
     Arguments:
         id (int): The ID of the patient to delete.
@@ -460,8 +463,12 @@ def delete_existing_patient(id):
     if not is_worker:
         return response
 
+    patient = get_patient(id)
     success = delete_patient(id)
 
+    if success and patient:
+        release_xray(patient['xray_img'], patient['heatmap_img'])
+
     if success:
         flash("Patient deleted successfully.", "success")
     else:
@@ -476,7 +483,9 @@ def edit_patient(id):
 
     Description:
         Loads patient data into a form for editing. Saves changes on submission.
-        Clinicians can also leave notes and mark review status.
+        Clinicians can also leave notes and mark review status. Confirmed
+        cases whose x-rays look most like this patient's are listed to help
+        with borderline reviews.
 
     Arguments:
         id (int): The ID of the patient to edit.
@@ -597,9 +606,29 @@ def edit_patient(id):
         else:
             flash("Failed to modify patient.", "error")
 
-        return render_template('patients/patient_form.html', user=get_user(current_user), current_user=get_user(current_user), patient=get_patient(id))
+        return render_template('patients/patient_form.html', user=get_user(current_user), current_user=get_user(current_user), patient=get_patient(id), prediction_status=get_inference_job_status(id), similar_cases=similar_confirmed_cases(id))
+
+    return render_template('patients/patient_form.html', user=get_user(current_user), current_user=get_user(current_user), patient=get_patient(id), prediction_status=get_inference_job_status(id), similar_cases=similar_confirmed_cases(id))
+
+def similar_confirmed_cases(patient_id):
+    """
+    Get confirmed cases with x-rays like a patient's, for the edit page.
+
+    Arguments:
+        patient_id (int)
+
+    Returns:
+        list: Matches from the embedding index, empty if the lookup fails.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
 
-    return render_template('patients/patient_form.html', user=get_user(current_user), current_user=get_user(current_user), patient=get_patient(id))
+    try:
+        return embedding_index.similar(patient_id)
+    except Exception as e:
+        print(f"Similar case lookup error: {e}")
+        return []
 
 @patients.route('/patients/triage')
 def workers_follow_ups():
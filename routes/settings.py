@@ -1,7 +1,7 @@
 import bcrypt
 from flask import Blueprint, request, render_template, redirect, url_for, flash, session
 from routes.auth import check_jwt_tokens, check_is_admin, get_user_from_token
-from db import get_user, get_settings, update_twilio_settings, update_smtp_settings
+from db import get_user, get_settings, update_twilio_settings, update_smtp_settings, update_ai_thresholds, retriage_patients, update_queue_limits
 
 settings = Blueprint('settings', __name__)
 
@@ -125,3 +125,104 @@ def update_smtp():
         flash("Failed to update SMTP settings.", "error")
 
     return redirect(url_for('settings.edit_settings'))
+
+@settings.route('/settings/ai', methods=['POST'])
+def update_ai():
+    """
+    Route to update the AI triage thresholds.
+
+    Description:
+        Saves the probability band used to flag suspected pneumonia. If
+        requested, stored predictions are re-triaged straight away from
+        their saved probabilities, without running the model again.
+
+    Arguments:
+        None
+
+    Returns:
+        Response: Redirects back to the settings page after saving.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    user_data, response = check_jwt_tokens()
+    if not user_data:
+        return response
+
+    is_admin, response = check_is_admin(user_data)
+    if not is_admin:
+        return response
+
+    session.pop('_flashes', None)
+
+    try:
+        low_threshold = float(request.form.get('ai_low_threshold'))
+        high_threshold = float(request.form.get('ai_high_threshold'))
+    except (TypeError, ValueError):
+        flash("Thresholds must be numbers.", "error")
+        return redirect(url_for('settings.edit_settings'))
+
+    if not 0 <= low_threshold < high_threshold <= 1:
+        flash("Thresholds must be between 0 and 1, with the low threshold below the high one.", "error")
+        return redirect(url_for('settings.edit_settings'))
+
+    if not update_ai_thresholds(low_threshold, high_threshold):
+        flash("Failed to update AI settings.", "error")
+        return redirect(url_for('settings.edit_settings'))
+
+    if 'retriage' in request.form:
+        changed = retriage_patients(low_threshold, high_threshold)
+        flash(f"AI settings updated. {changed} patient(s) re-triaged.", "success")
+    else:
+        flash("AI settings updated successfully.", "success")
+
+    return redirect(url_for('settings.edit_settings'))
+
+@settings.route('/settings/queue', methods=['POST'])
+def update_queue():
+    """
+    Route to update the AI queue limits.
+
+    Description:
+        Saves how many inference jobs may be unfinished before uploads are
+        turned away, and how long an upload waits for room before it is.
+        Takes effect on the next upload.
+
+    Arguments:
+        None
+
+    Returns:
+        Response: Redirects back to the settings page after saving.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    user_data, response = check_jwt_tokens()
+    if not user_data:
+        return response
+
+    is_admin, response = check_is_admin(user_data)
+    if not is_admin:
+        return response
+
+    session.pop('_flashes', None)
+
+    try:
+        max_pending_jobs = int(request.form.get('ai_max_pending_jobs'))
+        wait_seconds = float(request.form.get('ai_queue_wait_seconds'))
+    except (TypeError, ValueError):
+        flash("Queue limits must be numbers.", "error")
+        return redirect(url_for('settings.edit_settings'))
+
+    if max_pending_jobs < 1 or not 0 <= wait_seconds <= 60:
+        flash("Allow at least one unfinished job and a wait of 0 to 60 seconds.", "error")
+        return redirect(url_for('settings.edit_settings'))
+
+    if update_queue_limits(max_pending_jobs, wait_seconds):
+        flash("AI queue settings updated successfully.", "success")
+    else:
+        flash("Failed to update AI queue settings.", "error")
+
+    return redirect(url_for('settings.edit_settings'))
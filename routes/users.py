@@ -1,7 +1,8 @@
 import bcrypt
 from flask import Blueprint, request, render_template, redirect, url_for, flash, session
 from routes.auth import check_jwt_tokens, check_is_admin, get_user_from_token
-from db import check_user_exists, add_user, get_users, delete_user, update_user, get_user
+from storage import avatar_store
+from db import check_user_exists, add_user, get_users, delete_user, update_user, get_user, get_user_image
 
 users = Blueprint('users', __name__)
 
@@ -159,7 +160,8 @@ def delete_existing_user(username):
 
     Description:
         Admin-only route that deletes a user by their username. If the user exists,
-        it removes them from the system and shows a success or error message.
+        it removes them from the system, releases their avatar and shows a
+        success or error message.
 
     Arguments:
         username (str): The username of the user to delete.
@@ -179,7 +181,11 @@ def delete_existing_user(username):
     if not is_admin:
         return response
     
+    profile_img = get_user_image(username)
     success = delete_user(username)
+
+    if success:
+        avatar_store.release(profile_img)
     
     session.pop('_flashes', None)
 
@@ -1,25 +1,27 @@
-import os, uuid
+import os, math
 import smtplib
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing.image import load_img, img_to_array
-import numpy as np
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from flask import Blueprint, request, redirect, url_for, flash, session
-from routes.auth import get_user_from_token, check_is_clinician, check_is_worker, check_jwt_tokens
-from db import update_user_image, get_user_image, update_xray_image, get_xray_image, get_patient, delete_xray_image, get_settings, get_user, update_ai_suspected, update_clinician_to_review
+from flask import Blueprint, request, redirect, url_for, flash, session, jsonify
+from routes.auth import get_user_from_token, check_is_clinician, check_is_worker, check_is_admin, check_jwt_tokens
+from inference.model import model_registry, classify, current_thresholds
+from inference.queue import InferenceWorkerPool
+from inference.admission import Overloaded
+from inference.cache import prediction_cache
+from inference.embeddings import embedding_index
+from inference.gradcam import HeatmapWorker
+from inference.tensor_store import tensor_store
+from storage import xray_store, avatar_store, release_xray, XRAY_FOLDER
+from uploads import upload_error
+from db import update_user_image, update_xray_image, get_patient, delete_xray_image, get_settings, get_user, enqueue_inference_job, cancel_inference_jobs, record_prediction, get_latest_backfill_run
 
 utilities = Blueprint('utilities', __name__)
 
-AVATAR_FOLDER = "static/images/avatars"
-XRAY_FOLDER = "static/images/xrays"
-
-
-os.makedirs(AVATAR_FOLDER, exist_ok=True)
-os.makedirs(XRAY_FOLDER, exist_ok=True)
-
 ALLOWED_EXTENSIONS = {"jpg", "jpeg"}
 
+inference_pool = InferenceWorkerPool(XRAY_FOLDER)
+heatmap_worker = HeatmapWorker(XRAY_FOLDER)
+
 def allowed_file(filename):
     """
     Check if a file has an allowed extension.
@@ -39,36 +41,14 @@ def allowed_file(filename):
 
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def save_file(file, folder):
-    """
-    Save an uploaded file with a unique name.
-
-    Description:
-        Generates a unique filename and saves the file to the given folder.
-
-    Arguments:
-        file (FileStorage): The uploaded file.
-        folder (str): Destination folder path.
-
-    Returns:
-        Tuple: (filename, full path)
-
-    Author:
-        Reece Alqotaibi (ReturnTypeVoid)
-    """
-
-    unique_filename = f"{uuid.uuid4().hex}.jpg"
-    save_path = os.path.join(folder, unique_filename)
-    file.save(save_path)
-    return unique_filename, save_path
-
 @utilities.route('/users/avatar/upload', methods=['POST'])
 def upload_avatar():
     """
     Route to upload a new avatar for the logged-in user.
 
     Description:
-        Saves a new avatar file and removes the old one if it exists. 
+        Stores the new avatar, with its small copy for the sidebar, and
+        releases the old one, which is removed once no other user has it.
         Flashes a success or error message after processing.
 
     Arguments:
@@ -83,6 +63,11 @@ def upload_avatar():
 
     current_user = get_user_from_token()['username']
 
+    error = upload_error(request)
+    if error:
+        flash(error, 'error')
+        return redirect(url_for('profile.view_profile'))
+
     if 'file' not in request.files:
         flash('An error occured. Please contact your administrator.', 'error')
         return redirect(url_for('profile.view_profile'))
@@ -94,23 +79,14 @@ def upload_avatar():
         flash(f'Invalid file type {ext}. Only .jpg and .jpeg files are supported.', 'error')
         return redirect(url_for('profile.view_profile'))
     
-    existing_image = get_user_image(current_user)
-    
-    if existing_image:
-        old_image_path = os.path.join(AVATAR_FOLDER, existing_image)
-        if os.path.exists(old_image_path):
-            os.remove(old_image_path)
-    
-    filename, path = save_file(file, AVATAR_FOLDER)
+    filename, path, _ = avatar_store.save(file.stream)
 
-    success = update_user_image(current_user, filename)
+    existing_image = update_user_image(current_user, filename)
+    avatar_store.release(existing_image)
     
     session.pop('_flashes', None)
 
-    if success:
-        flash("User avatar updated.", "success")
-    else:
-        flash("Failed to update user avatar.", "error")
+    flash("User avatar updated.", "success")
     return redirect(url_for('profile.view_profile'))
 
 @utilities.route('/patients/xray/upload/<int:id>', methods=['POST'])
@@ -119,8 +95,13 @@ def upload_xray(id):
     Route to upload an x-ray image for a patient.
 
     Description:
-        Saves the new image, deletes the old one if it exists, updates the database,
-        and runs an AI model to classify the image. Flags the case for clinician review.
+        Stores the new image, updates the database, releases the old one if it
+        exists, decodes the image into the tensor store, and queues it for AI
+        classification. The inference workers flag the
+        case for clinician review once the prediction is stored. If the same image
+        has already been scored by the current model, the cached result is used
+        straight away. When the AI queue is backed up, the upload is refused
+        before its body is read and the user is asked to try again.
 
     Arguments:
         id (int): Patient ID.
@@ -134,6 +115,17 @@ def upload_xray(id):
 
     patient = get_patient(id)
 
+    try:
+        inference_pool.check_backlog()
+    except Overloaded as e:
+        flash(f"{e} in {math.ceil(e.retry_after)} seconds.", "error")
+        return redirect(url_for('patients.edit_patient', id=patient['id']))
+
+    error = upload_error(request)
+    if error:
+        flash(error, 'error')
+        return redirect(url_for('patients.edit_patient', id=patient['id']))
+
     if 'file' not in request.files:
         flash('An error occured. Please contact your administrator.', 'error')
         return redirect(url_for('patients.edit_patient', id=patient['id']))
@@ -145,41 +137,31 @@ def upload_xray(id):
         flash(f'Invalid file type ({ext}). Only .jpg and .jpeg files are supported.', 'error')
         return redirect(url_for('patients.edit_patient', id=patient['id']))
 
-    
-    existing_image = get_xray_image(patient['id'])
-    if existing_image:
-        old_image_path = os.path.join(XRAY_FOLDER, existing_image)
-        if os.path.exists(old_image_path):
-            os.remove(old_image_path)
-            delete_xray_image(id)
-
-    
-    filename, path = save_file(file, XRAY_FOLDER)
-    success = update_xray_image(patient['id'], filename)
+    filename, path, digest = xray_store.save(file.stream)
+    replaced = update_xray_image(patient['id'], filename)
+    success = replaced is not None
 
-    
-    try:
-        model_path = 'machine-learning/final_pneumonia_model.keras'
-        model = load_model(model_path)
+    if success:
+        release_xray(*replaced)
 
-        image = load_img(path, target_size=(64, 64), color_mode='grayscale')
-        image = img_to_array(image) / 255.0
-        image = np.expand_dims(image, axis=0)
+        # Decoded now, so the worker, backfill and Grad-CAM read the tensor
+        # store even when the cached prediction below means no job runs
+        try:
+            tensor_store.load(filename, path)
+        except Exception as e:
+            print(f"Tensor store error: {e}")
 
-        low_threshold = 0.050
-        high_threshold = 0.99
-        prediction_prob = model.predict(image)[0][0]
+        model_version = inference_pool.model_version()
+        prediction_prob = prediction_cache.lookup(digest, model_version)
 
-        if prediction_prob < low_threshold or prediction_prob > high_threshold:
-            prediction = "Normal"
+        if prediction_prob is not None:
+            prediction = classify(prediction_prob, *current_thresholds())
+            record_prediction(patient['id'], filename, prediction_prob, prediction, model_version, cached=True)
         else:
-            prediction = "Pneumonia"
-
-        update_ai_suspected(patient['id'], prediction)
-        update_clinician_to_review(id, 1)
-
-    except Exception as e:
-        print(f"Prediction error: {e}")
+            enqueue_inference_job(patient['id'], filename, digest)
+            inference_pool.notify()
+    else:
+        xray_store.release(filename)
 
     session.pop('_flashes', None)
 
@@ -195,7 +177,8 @@ def delete_xray(id):
     Route to delete a patient's x-ray image.
 
     Description:
-        Deletes the file and removes the image reference in the database. 
+        Removes the image reference in the database and releases the stored
+        file, which is removed once no other patient has the same image.
         Only accessible by workers and clinicians.
 
     Arguments:
@@ -219,16 +202,52 @@ def delete_xray(id):
     if not patient or not patient['xray_img']:  
         return redirect(url_for('patients.edit_patient', id=id))
     
-    existing_image = get_xray_image(id)
-    
-    if existing_image:
-        old_image_path = os.path.join(XRAY_FOLDER, existing_image)
-        if os.path.exists(old_image_path):
-            os.remove(old_image_path)
-            delete_xray_image(id)  
+    replaced = delete_xray_image(id)
+
+    if replaced and replaced[0]:
+        cancel_inference_jobs(id)
+        release_xray(*replaced)
 
     return redirect(url_for('patients.edit_patient', id=id))
 
+@utilities.route('/inference/status', methods=['GET'])
+def inference_status():
+    """
+    Route to report the state of the inference model.
+
+    Description:
+        Returns the model registry, inference queue, similar-case index,
+        Grad-CAM and latest backfill status as JSON so admins can check
+        whether the model is warm, how many jobs are waiting or were turned
+        away, how many cases the similar-case index holds, how many overlays
+        have been generated and how far a re-scoring backfill has got.
+
+    Arguments:
+        None
+
+    Returns:
+        Response: JSON model status.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    user_data, response = check_jwt_tokens()
+    if not user_data:
+        return response
+
+    is_admin, response = check_is_admin(user_data)
+    if not is_admin:
+        return response
+
+    return jsonify({
+        "model": model_registry.status(),
+        "queue": inference_pool.status(),
+        "embeddings": embedding_index.stats(),
+        "heatmaps": heatmap_worker.status(),
+        "backfill": get_latest_backfill_run()
+    })
+
 @utilities.route('/send-email/<int:patient_id>', methods=['POST'])
 def send_email(patient_id):
     """
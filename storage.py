@@ -0,0 +1,298 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+import uuid
+from db import add_blob_reference, release_blob_reference, count_image_references, list_blobs, set_blob_references
+from images import make_derivatives, delete_derivatives, is_original, XRAY_DERIVATIVES, AVATAR_DERIVATIVES, IMAGES_FOLDER
+from inference.gradcam import delete_heatmap
+from inference.tensor_store import file_lock, tensor_store
+
+# Where uploaded x-rays and avatars are stored. Offline tools import these
+# from here rather than from the web routes
+XRAY_FOLDER = os.path.join(IMAGES_FOLDER, 'xrays')
+AVATAR_FOLDER = os.path.join(IMAGES_FOLDER, 'avatars')
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+LOCK_FILE = '.blobs.lock'
+
+# rebuild() leaves files this new alone, since an upload may have stored
+# its file but not yet pointed a patient or user at it
+REBUILD_GRACE_SECONDS = 3600
+
+class BlobStore:
+    """
+    Folder of uploaded images named by the SHA-256 of their contents.
+
+    Description:
+        Identical uploads are stored once and shared. The blobs table counts
+        how many patients or users point at each file, and the file (with its
+        resized copies) is only removed when the last one lets go. Uploads
+        are streamed to a temporary file while they are hashed and renamed
+        into place, so a half-written file is never served under a real
+        name. Adding and releasing references take a lock file, so processes
+        cannot remove a file another is just adding a reference to.
+
+        Files stored before names were content hashes have no row; they had
+        a single owner, so releasing one removes it. rebuild() recounts every
+        reference from the patients and users tables.
+
+    Arguments:
+        folder (str): Folder the images are stored in.
+        kind (str): 'xrays' or 'avatars', the key in the blobs table.
+        derivatives (tuple): Sizes of resized copies to make, see images.py.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    def __init__(self, folder, kind, derivatives=()):
+        self.folder = folder
+        self.kind = kind
+        self.derivatives = derivatives
+        os.makedirs(folder, exist_ok=True)
+
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+    def _commit(self, tmp_path, digest, size):
+        name = f"{digest}.jpg"
+        path = self.path(name)
+
+        try:
+            # Only new images need their copies made; identical ones are
+            # already on disk with theirs
+            if self.derivatives and not os.path.exists(path):
+                try:
+                    make_derivatives(self.folder, name, self.derivatives, source=tmp_path)
+                except Exception as e:
+                    # Keep the upload; pages show the original instead
+                    print(f"Could not resize {name}: {e}")
+
+            with file_lock(self.folder, LOCK_FILE):
+                if os.path.exists(path):
+                    os.remove(tmp_path)
+                else:
+                    os.replace(tmp_path, path)
+                add_blob_reference(self.kind, name, size)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        return name, path, digest
+
+    def save(self, stream):
+        """
+        Store an upload, or add a reference to the identical image already stored.
+
+        Description:
+            An UploadStream was already hashed and written to disk while the
+            request was parsed, so its file is moved into place as it is.
+            Other streams are copied to a temporary file first.
+
+        Arguments:
+            stream (file): Readable binary stream, e.g. FileStorage.stream.
+
+        Returns:
+            Tuple: (filename, full path, SHA-256 hex digest)
+
+        Raises:
+            InvalidUpload: The upload ended before its JPEG frame header.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        staged = getattr(stream, 'staged', None)
+        if staged is not None:
+            tmp_path, digest, size = staged()
+            return self._commit(tmp_path, digest, size)
+
+        tmp_path = self.path(f".upload-{uuid.uuid4().hex}.tmp")
+        digest = hashlib.sha256()
+        size = 0
+
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        return self._commit(tmp_path, digest.hexdigest(), size)
+
+    def save_bytes(self, data):
+        """
+        Store an image already in memory, as save() does.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        tmp_path = self.path(f".upload-{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        return self._commit(tmp_path, hashlib.sha256(data).hexdigest(), len(data))
+
+    def _remove(self, name):
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            pass
+        delete_derivatives(self.folder, name, self.derivatives)
+
+    def release(self, name):
+        """
+        Drop one reference to an image, removing the file if it was the last.
+
+        Arguments:
+            name (str or None): Filename; None does nothing.
+
+        Returns:
+            bool: True if the file was removed, so anything keyed by its name
+            (e.g. its tensor store row) can go too.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        if not name:
+            return False
+
+        with file_lock(self.folder, LOCK_FILE):
+            remaining = release_blob_reference(self.kind, name)
+            if remaining:
+                return False
+            self._remove(name)
+
+        return True
+
+    def rebuild(self, grace=REBUILD_GRACE_SECONDS):
+        """
+        Recount references from the database and remove unreferenced files.
+
+        Description:
+            Catches up after patients or users were deleted, or after images
+            were stored before reference counts existed. Files modified in
+            the last grace seconds are left as they are.
+
+        Arguments:
+            grace (float): Age in seconds below which files are skipped.
+
+        Returns:
+            dict: Files counted, removed and skipped, and bytes on disk.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        with file_lock(self.folder, LOCK_FILE):
+            references = count_image_references(self.kind)
+            recorded = list_blobs(self.kind)
+            now = time.time()
+
+            counted, removed, skipped = [], [], 0
+            for name in sorted(os.listdir(self.folder)):
+                if not is_original(name):
+                    continue
+                stat = os.stat(self.path(name))
+                if now - stat.st_mtime < grace:
+                    skipped += 1
+                elif references.get(name):
+                    counted.append((name, stat.st_size, references[name]))
+                else:
+                    self._remove(name)
+                    removed.append(name)
+
+            present = {name for name, _, _ in counted}
+            missing = [name for name in recorded if name not in present and not os.path.exists(self.path(name))]
+            set_blob_references(self.kind, counted, removed + missing)
+
+        return {
+            "files": len(counted),
+            "removed": len(removed),
+            "skipped": skipped,
+            "size_mb": sum(size for _, size, _ in counted) / (1024 * 1024)
+        }
+
+    def stats(self):
+        """
+        Describe how much deduplication is saving.
+
+        Returns:
+            dict: Stored images, references to them, and bytes stored versus
+            the bytes one copy per reference would take.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        blobs = list_blobs(self.kind).values()
+        stored = sum(size for size, _ in blobs)
+        referenced = sum(size * refcount for size, refcount in blobs)
+
+        return {
+            "images": len(blobs),
+            "references": sum(refcount for _, refcount in blobs),
+            "stored_mb": stored / (1024 * 1024),
+            "saved_mb": (referenced - stored) / (1024 * 1024)
+        }
+
+xray_store = BlobStore(XRAY_FOLDER, 'xrays', XRAY_DERIVATIVES)
+avatar_store = BlobStore(AVATAR_FOLDER, 'avatars', AVATAR_DERIVATIVES)
+
+def release_xray(xray_img, heatmap_img, store=xray_store):
+    """
+    Let go of an x-ray a patient no longer points at.
+
+    Description:
+        Drops the patient's reference to the stored image and, if no other
+        patient has the same image, its decoded tensor too. The Grad-CAM
+        overlay belongs to the patient alone and is always removed. Used by
+        the web app and the bulk importer alike.
+
+    Arguments:
+        xray_img (str or None): X-ray filename.
+        heatmap_img (str or None): Overlay filename.
+        store (BlobStore): Store the x-ray is in, xray_store unless a bulk
+            import was pointed at another folder.
+
+    Returns:
+        None
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    if store.release(xray_img):
+        tensor_store.delete(xray_img)
+    delete_heatmap(store.folder, heatmap_img)
+
+def main(argv=None):
+    """
+    Command-line entry point.
+
+    Description:
+        python -m storage stats
+        python -m storage rebuild
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    parser = argparse.ArgumentParser(description="Inspect or recount the stored x-rays and avatars.")
+    parser.add_argument("command", choices=["stats", "rebuild"])
+    args = parser.parse_args(argv)
+
+    report = {
+        store.kind: store.rebuild() if args.command == "rebuild" else store.stats()
+        for store in (xray_store, avatar_store)
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
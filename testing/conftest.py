@@ -10,4 +10,21 @@ def pytest_configure(config):
     """Register custom markers."""
     config.addinivalue_line(
         "markers", "integration: mark a test as an integration test"
-    )
\ No newline at end of file
+    )
+
+@pytest.fixture(scope="session")
+def tiny_model_path(tmp_path_factory):
+    """Save a small untrained model with the same input shape as the real one."""
+    from tensorflow import keras
+
+    model = keras.Sequential([
+        keras.Input(shape=(64, 64, 1)),
+        keras.layers.Conv2D(4, 3, activation="relu"),
+        keras.layers.MaxPooling2D(2),
+        keras.layers.Flatten(),
+        keras.layers.Dense(8, activation="relu"),
+        keras.layers.Dense(1, activation="sigmoid"),
+    ])
+    path = tmp_path_factory.mktemp("model") / "tiny_model.keras"
+    model.save(path)
+    return str(path)
@@ -0,0 +1,170 @@
+# testing/test_admission.py
+
+import threading
+import time
+import numpy as np
+import pytest
+from inference.admission import AdmissionController, Overloaded
+from inference.batching import MicroBatcher
+from inference.client import InferenceClient, InferenceServerBusy
+from inference.queue import InferenceWorkerPool
+from inference.server import InferenceServer
+
+def hold_slots(controller, count, release):
+    """Occupy count slots until release is set"""
+    entered = threading.Barrier(count + 1)
+
+    def hold():
+        with controller.admit():
+            entered.wait()
+            release.wait()
+
+    threads = [threading.Thread(target=hold) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    entered.wait()
+    return threads
+
+def test_waiting_caller_gets_a_freed_slot():
+    """A caller past the limit waits and runs once a slot frees up"""
+    controller = AdmissionController("test", max_in_flight=1, max_waiting=1, timeout=5)
+    release = threading.Event()
+    threads = hold_slots(controller, 1, release)
+
+    threading.Timer(0.05, release.set).start()
+    with controller.admit():
+        assert controller.in_flight == 1
+
+    for thread in threads:
+        thread.join()
+    assert controller.stats()["admitted"] == 2
+    assert controller.stats()["rejection_rate"] == 0
+
+def test_full_wait_queue_rejects_immediately():
+    """With every slot and wait place taken, new callers are turned away straight away"""
+    controller = AdmissionController("test", max_in_flight=1, max_waiting=0, timeout=5)
+    release = threading.Event()
+    threads = hold_slots(controller, 1, release)
+
+    started = time.perf_counter()
+    with pytest.raises(Overloaded) as error:
+        with controller.admit():
+            pass
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert time.perf_counter() - started < 1
+    assert error.value.retry_after == 5
+    assert controller.rejected == 1
+
+def test_wait_times_out():
+    """A caller that cannot get a slot within the timeout is rejected"""
+    controller = AdmissionController("test", max_in_flight=1, max_waiting=4, timeout=0.05)
+    release = threading.Event()
+    threads = hold_slots(controller, 1, release)
+
+    with pytest.raises(Overloaded):
+        with controller.admit():
+            pass
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    stats = controller.stats()
+    assert stats["timed_out"] == 1
+    assert stats["waiting"] == 0
+    assert stats["rejection_rate"] == pytest.approx(0.5)
+
+def test_server_reports_overload_to_client(tmp_path):
+    """A server with no free slots replies overloaded and the client raises InferenceServerBusy"""
+    server = InferenceServer(str(tmp_path / "busy.sock"), MicroBatcher(lambda batch: batch.mean(axis=(1, 2, 3)).reshape(-1, 1)))
+    server.admission = AdmissionController("Inference server", max_in_flight=0, max_waiting=0, timeout=2)
+    server.start()
+    client = InferenceClient(server.socket_path, timeout=5)
+
+    try:
+        with pytest.raises(InferenceServerBusy) as error:
+            client.predict(np.zeros((64, 64, 1), dtype=np.float32))
+        assert error.value.retry_after == 2
+        assert client.stats()["server"]["admission"]["rejected"] == 1
+    finally:
+        server.stop()
+
+class BusyPredictor:
+    def predict(self, image, timeout=None):
+        raise InferenceServerBusy("busy", 0)
+
+    def get_version(self):
+        return "busy-test"
+
+    def stats(self):
+        return {}
+
+def test_worker_requeues_without_using_an_attempt(monkeypatch):
+    """An overloaded server sends the job back to the queue instead of failing it"""
+    requeued = []
+    monkeypatch.setattr("inference.queue.requeue_inference_job", requeued.append)
+    monkeypatch.setattr("inference.queue.tensor_store.load", lambda name, path: np.zeros((64, 64, 1), dtype=np.float32))
+    monkeypatch.setattr("inference.queue.fail_inference_job", lambda *args: pytest.fail("job should not fail"))
+
+    pool = InferenceWorkerPool("unused", predictor=BusyPredictor())
+    job = {"id": 7, "patient_id": 1, "xray_img": "x.jpg", "xray_digest": "not-cached"}
+
+    assert pool.process(job) is False
+    assert requeued == [7]
+    assert pool.status()["deferred"] == 1
+
+def test_backlog_limit(monkeypatch):
+    """check_backlog() rejects once max_pending jobs are unfinished"""
+    monkeypatch.setattr("inference.queue.count_pending_inference_jobs", lambda: 3)
+
+    InferenceWorkerPool("unused", predictor=BusyPredictor(), max_pending=4).check_backlog()
+    pool = InferenceWorkerPool("unused", predictor=BusyPredictor(), max_pending=3, wait_timeout=0)
+    with pytest.raises(Overloaded):
+        pool.check_backlog()
+    assert pool.backlog_rejections == 1
+
+def test_backlog_waits_for_room(monkeypatch):
+    """An upload that finds the backlog full is let in if a job finishes within the wait"""
+    pending = [5, 5, 4]
+    monkeypatch.setattr("inference.queue.count_pending_inference_jobs", lambda: pending.pop(0) if len(pending) > 1 else pending[0])
+    monkeypatch.setattr("inference.queue.BACKLOG_POLL_INTERVAL", 0.01)
+
+    pool = InferenceWorkerPool("unused", predictor=BusyPredictor(), max_pending=5, wait_timeout=5)
+    pool.check_backlog()
+
+    status = pool.status()
+    assert status["backlog_rejections"] == 0
+    assert status["waiting"] == 0
+    assert status["rejection_rate"] == 0
+
+def test_status_reports_in_flight_jobs_and_rejection_rate(monkeypatch):
+    """In-process mode reports running jobs and the share of recent uploads turned away"""
+    monkeypatch.setattr("inference.queue.count_pending_inference_jobs", lambda: 3)
+    monkeypatch.setattr("inference.queue.count_inference_jobs", lambda: {})
+    monkeypatch.setattr("inference.queue.tensor_store.load", lambda name, path: np.zeros((64, 64, 1), dtype=np.float32))
+    monkeypatch.setattr("inference.queue.requeue_inference_job", lambda job_id: None)
+
+    pool = InferenceWorkerPool("unused", predictor=BusyPredictor(), max_pending=4, wait_timeout=0)
+    pool.check_backlog()
+    pool.max_pending = 3
+    with pytest.raises(Overloaded):
+        pool.check_backlog()
+
+    seen = []
+
+    def predict(image):
+        seen.append(pool.status()["in_flight"])
+        return 0.5, None, "v1"
+
+    pool._predict = predict
+    monkeypatch.setattr("inference.queue.complete_inference_job", lambda *args: None)
+    monkeypatch.setattr("inference.queue.prediction_cache.store", lambda *args: None)
+    pool.process({"id": 7, "patient_id": 1, "xray_img": "x.jpg", "xray_digest": "not-cached"})
+
+    status = pool.status()
+    assert seen == [1]
+    assert status["in_flight"] == 0
+    assert status["max_pending"] == 3
+    assert status["rejection_rate"] == pytest.approx(0.5)
@@ -0,0 +1,97 @@
+# testing/test_ai_thresholds.py
+
+import pytest
+import bcrypt
+from app import app
+import db
+
+PROBABILITIES = (0.01, 0.5, 0.995, None)
+
+@pytest.fixture
+def scored_patients():
+    original = db.get_ai_thresholds()
+    db.add_user("Triage Worker", "test_triage_worker", b"unused", "worker", "triage@example.com")
+    worker_id = db.get_user_id("test_triage_worker")
+
+    ids = []
+    for index, probability in enumerate(PROBABILITIES):
+        email = f"triage{index}@example.com"
+        db.add_patient(
+            first_name="Triage", surname="Patient", address="1 Triage St", city="Test City",
+            state="Test State", zip="12345", dob="1990-01-01", sex="Female", height=165.0,
+            weight=60.0, blood_type="A+", smoker_status="Non-smoker", alcohol_consumption="None",
+            allergies="None", vaccination_history="Up to date", fever=0, cough=0, chest_pain=0,
+            shortness_of_breath=0, fatigue=0, chills_sweating=0, last_updated="2023-06-01",
+            worker_id=worker_id, email=email, cough_duration=0, cough_type="Dry"
+        )
+        connection = db.get_connection()
+        patient_id = connection.execute("SELECT id FROM patients WHERE email = ?", (email,)).fetchone()[0]
+        connection.execute("UPDATE patients SET ai_probability = ?, ai_suspected = NULL WHERE id = ?", (probability, patient_id))
+        connection.commit()
+        connection.close()
+        ids.append(patient_id)
+
+    yield ids
+
+    connection = db.get_connection()
+    connection.execute("DELETE FROM patients WHERE email LIKE 'triage%@example.com'")
+    connection.execute("DELETE FROM users WHERE username IN ('test_triage_worker', 'test_triage_admin')")
+    connection.commit()
+    connection.close()
+    db.update_ai_thresholds(*original)
+
+def ai_suspected(patient_ids):
+    return [db.get_patient(patient_id)['ai_suspected'] for patient_id in patient_ids]
+
+def test_retriage_reapplies_thresholds_without_the_model(scored_patients):
+    """Stored probabilities are re-labelled in one pass; unscored patients are untouched"""
+    db.retriage_patients(0.05, 0.99)
+    assert ai_suspected(scored_patients) == [0, 1, 0, None]
+
+    changed = db.retriage_patients(0.005, 0.999)
+    assert changed >= 2
+    assert ai_suspected(scored_patients) == [1, 1, 1, None]
+
+    assert db.retriage_patients(0.005, 0.999) == 0
+
+@pytest.fixture
+def admin_client(scored_patients):
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        password = bcrypt.hashpw('TriagePass123!'.encode('utf-8'), bcrypt.gensalt())
+        db.add_user("Triage Admin", "test_triage_admin", password, "admin", "triage.admin@example.com")
+        client.post('/login', data={'username': 'test_triage_admin', 'password': 'TriagePass123!'})
+        yield client
+
+def test_settings_form_saves_thresholds_and_retriages(admin_client, scored_patients):
+    """Admins change the band on the settings page and existing patients follow it"""
+    response = admin_client.post('/settings/ai', data={
+        'ai_low_threshold': '0.3', 'ai_high_threshold': '0.6', 'retriage': 'on'
+    })
+
+    assert response.status_code == 302
+    assert db.get_ai_thresholds() == (0.3, 0.6)
+    assert ai_suspected(scored_patients) == [0, 1, 0, None]
+
+def test_settings_form_rejects_an_inverted_band(admin_client):
+    """A low threshold above the high one is refused and nothing is saved"""
+    before = db.get_ai_thresholds()
+
+    admin_client.post('/settings/ai', data={'ai_low_threshold': '0.9', 'ai_high_threshold': '0.1'})
+
+    assert db.get_ai_thresholds() == before
+
+def test_settings_form_saves_queue_limits(admin_client):
+    """Admins set the backlog limit and upload wait that the worker pool uses"""
+    from inference.queue import InferenceWorkerPool
+    before = db.get_queue_limits()
+
+    try:
+        admin_client.post('/settings/queue', data={'ai_max_pending_jobs': '120', 'ai_queue_wait_seconds': '2.5'})
+        assert db.get_queue_limits() == (120, 2.5)
+        assert InferenceWorkerPool("unused", predictor=object()).limits() == (120, 2.5)
+
+        admin_client.post('/settings/queue', data={'ai_max_pending_jobs': '0', 'ai_queue_wait_seconds': '2.5'})
+        assert db.get_queue_limits() == (120, 2.5)
+    finally:
+        db.update_queue_limits(*before)
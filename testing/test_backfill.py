@@ -0,0 +1,109 @@
+# testing/test_backfill.py
+
+from datetime import datetime
+import pytest
+from PIL import Image
+import db
+import inference.backfill as backfill
+import inference.batching as batching
+from inference.model import ModelRegistry
+from inference.tensor_store import TensorStore
+from inference.embeddings import EmbeddingIndex
+
+TEST_VERSION = "backfill-test-version"
+PATIENT_EMAILS = tuple(f"backfill{index}@example.com" for index in range(5))
+
+@pytest.fixture
+def xray_patients(tmp_path, tiny_model_path, monkeypatch):
+    registry = ModelRegistry(tiny_model_path)
+    monkeypatch.setattr(batching, "get_model", registry.load)
+    monkeypatch.setattr(backfill, "target_version", lambda: TEST_VERSION)
+    monkeypatch.setattr(backfill, "tensor_store", TensorStore(str(tmp_path / "tensors")))
+    monkeypatch.setattr(backfill, "embedding_index", EmbeddingIndex(str(tmp_path / "embeddings"), registry))
+
+    db.add_user("Backfill Worker", "test_backfill_worker", b"unused", "worker", "backfill@example.com")
+    worker_id = db.get_user_id("test_backfill_worker")
+
+    ids = []
+    for index, email in enumerate(PATIENT_EMAILS):
+        db.add_patient(
+            first_name="Backfill", surname="Patient", address="1 Backfill St", city="Test City",
+            state="Test State", zip="12345", dob="1990-01-01", sex="Male", height=180.0,
+            weight=80.0, blood_type="O+", smoker_status="Non-smoker", alcohol_consumption="None",
+            allergies="None", vaccination_history="Up to date", fever=0, cough=0, chest_pain=0,
+            shortness_of_breath=0, fatigue=0, chills_sweating=0, last_updated="2023-06-01",
+            worker_id=worker_id, email=email, cough_duration=0, cough_type="Dry"
+        )
+        connection = db.get_connection()
+        patient_id = connection.execute("SELECT id FROM patients WHERE email = ?", (email,)).fetchone()[0]
+        connection.close()
+
+        filename = f"backfill_{index}.jpg"
+        Image.new('L', (128, 128), color=30 * index).save(tmp_path / filename, format='JPEG')
+        db.update_xray_image(patient_id, filename)
+        ids.append(patient_id)
+
+    (tmp_path / "backfill_4.jpg").write_bytes(b"not a jpeg")
+
+    yield ids
+
+    connection = db.get_connection()
+    connection.execute("DELETE FROM predictions WHERE model_version = ?", (TEST_VERSION,))
+    connection.execute("DELETE FROM backfill_runs WHERE model_version = ?", (TEST_VERSION,))
+    connection.execute(f"DELETE FROM patients WHERE email IN ({', '.join('?' for _ in PATIENT_EMAILS)})", PATIENT_EMAILS)
+    connection.execute("DELETE FROM users WHERE username = ?", ("test_backfill_worker",))
+    connection.commit()
+    connection.close()
+
+def test_backfill_rescores_every_readable_xray(xray_patients, tmp_path):
+    """Every patient with a readable x-ray gets a prediction from the new version"""
+    summary = backfill.run_backfill(str(tmp_path), batch_size=2, workers=2, pause=lambda: 0)
+
+    assert summary["model_version"] == TEST_VERSION
+    for patient_id in xray_patients[:4]:
+        patient = db.get_patient(patient_id)
+        assert patient['ai_model_version'] == TEST_VERSION
+        assert patient['ai_suspected'] in (0, 1)
+        assert 0 <= patient['ai_probability'] <= 1
+    assert db.get_patient(xray_patients[4])['ai_model_version'] is None
+
+    embedded = backfill.embedding_index.embedded_patients(backfill.embedding_index.registry.get_version())
+    assert set(xray_patients[:4]) <= embedded
+
+    run = db.get_latest_backfill_run()
+    assert run["model_version"] == TEST_VERSION
+    assert run["finished_at"] is not None
+    assert run["rescored"] >= 4
+
+    assert backfill.run_backfill(str(tmp_path), batch_size=2, pause=lambda: 0)["rescored"] == 0
+
+def test_interrupted_backfill_resumes_after_last_chunk(xray_patients, tmp_path, monkeypatch):
+    """A crash mid-run leaves progress behind that the next run continues from"""
+    original = backfill.rescore_chunk
+    calls = []
+
+    def crash_on_second_chunk(pool, patients, image_folder, model_version):
+        calls.append([patient['id'] for patient in patients])
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+        return original(pool, patients, image_folder, model_version)
+
+    monkeypatch.setattr(backfill, "rescore_chunk", crash_on_second_chunk)
+    with pytest.raises(KeyboardInterrupt):
+        backfill.run_backfill(str(tmp_path), batch_size=2, pause=lambda: 0)
+
+    connection = db.get_connection()
+    run = connection.execute("SELECT * FROM backfill_runs WHERE model_version = ?", (TEST_VERSION,)).fetchone()
+    connection.close()
+    assert run['last_patient_id'] == calls[0][-1]
+    assert run['finished_at'] is None
+
+    monkeypatch.setattr(backfill, "rescore_chunk", original)
+    backfill.run_backfill(str(tmp_path), batch_size=2, pause=lambda: 0)
+
+    assert all(db.get_patient(patient_id)['ai_model_version'] == TEST_VERSION for patient_id in xray_patients[:4])
+
+def test_pause_is_longer_during_clinic_hours():
+    """The backfill rests between chunks while the clinic is open"""
+    assert backfill.chunk_pause(datetime(2024, 5, 6, 10, 0), (8, 18), 2.0, 0.0) == 2.0
+    assert backfill.chunk_pause(datetime(2024, 5, 6, 22, 0), (8, 18), 2.0, 0.0) == 0.0
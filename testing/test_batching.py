@@ -0,0 +1,88 @@
+# testing/test_batching.py
+
+import threading
+import time
+import numpy as np
+import pytest
+from inference.batching import MicroBatcher
+
+def test_concurrent_requests_share_a_batch():
+    """Images submitted together run as one predict call and get their own result back"""
+    seen_batches = []
+
+    def predict_fn(batch):
+        seen_batches.append(len(batch))
+        time.sleep(0.01)
+        return batch.mean(axis=(1, 2, 3)).reshape(-1, 1)
+
+    batcher = MicroBatcher(predict_fn, max_batch_size=8, window=0.2)
+    results = {}
+
+    def worker(value):
+        image = np.full((64, 64, 1), value, dtype=np.float32)
+        results[value] = batcher.predict(image, timeout=5)
+
+    values = [i / 10 for i in range(8)]
+    threads = [threading.Thread(target=worker, args=(value,)) for value in values]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == pytest.approx({value: value for value in values})
+    assert max(seen_batches) > 1
+    assert max(seen_batches) <= 8
+
+    stats = batcher.stats()
+    assert stats["images"] == 8
+    assert stats["batches"] == len(seen_batches)
+    assert stats["mean_queue_wait_ms"] is not None
+
+def test_batch_size_is_capped():
+    """No predict call receives more images than max_batch_size"""
+    seen_batches = []
+
+    def predict_fn(batch):
+        seen_batches.append(len(batch))
+        return np.zeros((len(batch), 1))
+
+    batcher = MicroBatcher(predict_fn, max_batch_size=3, window=0.2)
+    futures = [batcher.submit(np.zeros((64, 64, 1), dtype=np.float32)) for _ in range(7)]
+
+    assert [future.result(timeout=5) for future in futures] == [0.0] * 7
+    assert max(seen_batches) <= 3
+    assert sum(seen_batches) == 7
+
+def test_predict_error_reaches_every_caller():
+    """A failing predict call is raised to each caller in the batch"""
+    def predict_fn(batch):
+        raise RuntimeError("model failed")
+
+    batcher = MicroBatcher(predict_fn, max_batch_size=4, window=0.05)
+    futures = [batcher.submit(np.zeros((64, 64, 1), dtype=np.float32)) for _ in range(2)]
+
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
+
+def test_features_come_from_the_same_predict_call():
+    """A batch with a caller wanting features runs once through features_fn"""
+    calls = []
+
+    def predict_fn(batch):
+        calls.append("predict")
+        return np.zeros((len(batch), 1))
+
+    def features_fn(batch):
+        calls.append("features")
+        return batch.mean(axis=(1, 2, 3)).reshape(-1, 1), batch.reshape(len(batch), -1)[:, :2] * 2
+
+    batcher = MicroBatcher(predict_fn, max_batch_size=4, window=0.2, features_fn=features_fn)
+    plain = batcher.submit(np.full((64, 64, 1), 0.25, dtype=np.float32))
+    probability, features = batcher.predict_with_features(np.full((64, 64, 1), 0.5, dtype=np.float32), timeout=5)
+
+    assert plain.result(timeout=5) == pytest.approx(0.25)
+    assert probability == pytest.approx(0.5)
+    np.testing.assert_allclose(features, [1.0, 1.0])
+    assert calls == ["features"]
+    assert MicroBatcher(predict_fn).predict_with_features(np.zeros((64, 64, 1), dtype=np.float32), 5) == (0.0, None)
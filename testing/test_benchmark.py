@@ -0,0 +1,32 @@
+# testing/test_benchmark.py
+
+import json
+import inference.benchmark as benchmark
+
+def test_percentiles_use_nearest_rank():
+    """p50/p95/p99 come from the sorted timings, reported in milliseconds"""
+    timings = [index / 1000 for index in range(1, 101)]
+
+    assert benchmark.percentiles(timings) == {"p50_ms": 51.0, "p95_ms": 96.0, "p99_ms": 100.0}
+
+def test_suite_reports_every_section_as_json(tmp_path, tiny_model_path):
+    """A small suite run covers cold start, latency, the throughput grid and memory"""
+    paths = benchmark.synthetic_xrays(str(tmp_path), count=2, size=(256, 256))
+    output = tmp_path / "results.json"
+
+    benchmark.main([
+        "suite", "--model", tiny_model_path, "--samples", str(tmp_path),
+        "--iterations", "5", "--batch-sizes", "1,4", "--threads", "1,2",
+        "--seconds", "0.1", "--output", str(output)
+    ])
+    report = json.loads(output.read_text())
+
+    assert report["environment"]["backend"] == "keras"
+    assert report["environment"]["model_version"]
+    assert report["cold_start"]["total_seconds"] > 0
+    assert report["warm_latency"]["iterations"] == 5
+    assert report["warm_latency"]["p50_ms"] <= report["warm_latency"]["p99_ms"]
+    assert [(row["batch_size"], row["threads"]) for row in report["throughput"]] == [(1, 1), (1, 2), (4, 1), (4, 2)]
+    assert all(row["images_per_second"] > 0 for row in report["throughput"])
+    assert report["peak_rss_mb"] > 0
+    assert len(paths) == 2
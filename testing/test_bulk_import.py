@@ -0,0 +1,136 @@
+# testing/test_bulk_import.py
+
+import csv
+import hashlib
+import json
+import os
+import pytest
+from PIL import Image
+import db
+import inference.bulk_import as bulk_import
+from inference.model import ModelRegistry
+from inference.tensor_store import TensorStore
+
+PATIENT_EMAILS = ("bulk.one@example.com", "bulk.two@example.com")
+
+@pytest.fixture
+def patient_ids():
+    db.add_user("Bulk Worker", "test_bulk_worker", b"unused", "worker", "bulk@example.com")
+    worker_id = db.get_user_id("test_bulk_worker")
+
+    for email in PATIENT_EMAILS:
+        db.add_patient(
+            first_name="Bulk", surname="Patient", address="1 Bulk St", city="Test City",
+            state="Test State", zip="12345", dob="1990-01-01", sex="Female", height=165.0,
+            weight=60.0, blood_type="A+", smoker_status="Non-smoker", alcohol_consumption="None",
+            allergies="None", vaccination_history="Up to date", fever=0, cough=0, chest_pain=0,
+            shortness_of_breath=0, fatigue=0, chills_sweating=0, last_updated="2023-06-01",
+            worker_id=worker_id, email=email, cough_duration=0, cough_type="Dry"
+        )
+
+    connection = db.get_connection()
+    ids = [connection.execute("SELECT id FROM patients WHERE email = ?", (email,)).fetchone()[0] for email in PATIENT_EMAILS]
+    connection.close()
+
+    yield ids
+
+    connection = db.get_connection()
+    connection.execute("DELETE FROM predictions WHERE patient_id IN (?, ?)", ids)
+    connection.execute("DELETE FROM patients WHERE email IN (?, ?)", PATIENT_EMAILS)
+    connection.execute("DELETE FROM users WHERE username = ?", ("test_bulk_worker",))
+    connection.commit()
+    connection.close()
+
+@pytest.fixture
+def screening_drive(tmp_path, patient_ids, tiny_model_path, monkeypatch):
+    registry = ModelRegistry(tiny_model_path)
+    monkeypatch.setattr(bulk_import, "get_model", registry.load)
+    monkeypatch.setattr(bulk_import, "tensor_store", TensorStore(str(tmp_path / "tensors")))
+
+    source = tmp_path / "source"
+    destination = tmp_path / "xrays"
+    source.mkdir()
+
+    rows = [(patient_ids[0], "a.jpg"), (999999999, "b.jpg"), (patient_ids[1], "c.jpg")]
+    for shade, (_, filename) in enumerate(rows):
+        Image.new('L', (256, 256), color=40 * shade).save(source / filename, format='JPEG')
+    (source / "broken.jpg").write_bytes(b"not a jpeg")
+    rows.append((patient_ids[0], "broken.jpg"))
+
+    manifest = tmp_path / "manifest.csv"
+    with open(manifest, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["patient_id", "filename"])
+        writer.writerows(rows)
+
+    yield str(manifest), str(source), str(destination)
+
+    if destination.exists():
+        connection = db.get_connection()
+        connection.executemany("DELETE FROM blobs WHERE kind = 'xrays' AND name = ?", [(name,) for name in os.listdir(destination)])
+        connection.commit()
+        connection.close()
+
+def test_import_scores_and_stores_every_valid_row(screening_drive, patient_ids):
+    """Valid rows are copied and scored, bad rows are skipped, the checkpoint covers all rows"""
+    manifest, source, destination = screening_drive
+
+    summary = bulk_import.run_import(manifest, source, destination, batch_size=2, workers=2)
+
+    assert summary["rows_done"] == 4
+    assert summary["imported"] == 2
+    assert summary["skipped"] == 2
+
+    for patient_id in patient_ids:
+        patient = db.get_patient(patient_id)
+        assert patient['xray_img']
+        assert patient['ai_suspected'] in (0, 1)
+        assert 0 <= patient['ai_probability'] <= 1
+        assert patient['clinician_to_review'] == 1
+        assert bulk_import.tensor_store.get(patient['xray_img']) is not None
+
+    with open(f"{manifest}.checkpoint") as f:
+        assert json.load(f)["rows_done"] == 4
+
+def test_interrupted_import_resumes_after_last_committed_chunk(screening_drive, patient_ids, monkeypatch):
+    """A crash in the second chunk leaves a checkpoint that the next run continues from"""
+    manifest, source, destination = screening_drive
+    original_import_chunk = bulk_import.import_chunk
+    calls = []
+
+    def crash_on_second_chunk(pending, destination_dir):
+        calls.append(len(pending))
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+        return original_import_chunk(pending, destination_dir)
+
+    monkeypatch.setattr(bulk_import, "import_chunk", crash_on_second_chunk)
+    with pytest.raises(KeyboardInterrupt):
+        bulk_import.run_import(manifest, source, destination, batch_size=2, workers=2)
+
+    assert bulk_import.read_checkpoint(f"{manifest}.checkpoint") == 2
+    assert db.get_patient(patient_ids[1])['xray_img'] is None
+
+    monkeypatch.setattr(bulk_import, "import_chunk", original_import_chunk)
+    summary = bulk_import.run_import(manifest, source, destination, batch_size=2, workers=2)
+
+    assert summary["rows_done"] == 4
+    assert summary["imported"] == 1
+    assert db.get_patient(patient_ids[1])['xray_img']
+
+def test_failed_chunk_releases_its_stored_images(screening_drive, patient_ids, monkeypatch):
+    """Images stored for a chunk whose transaction never commits lose their references and files"""
+    manifest, source, destination = screening_drive
+
+    def fail(results):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(bulk_import, "bulk_update_xray_predictions", fail)
+    with pytest.raises(RuntimeError):
+        bulk_import.run_import(manifest, source, destination, batch_size=2, workers=2)
+
+    stored = [name for name in os.listdir(destination) if name.endswith(".jpg")]
+    assert stored == []
+    hashed = {f"{hashlib.sha256(open(os.path.join(source, name), 'rb').read()).hexdigest()}.jpg" for name in ("a.jpg", "c.jpg")}
+    assert not set(db.list_blobs("xrays")) & hashed
+    assert db.get_patient(patient_ids[0])['xray_img'] is None
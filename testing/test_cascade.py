@@ -0,0 +1,80 @@
+# testing/test_cascade.py
+
+import numpy as np
+import pytest
+import inference.cascade as cascade_module
+from inference.batching import MicroBatcher
+from inference.cascade import CascadePredictor
+
+class FixedVersion:
+    def __init__(self, version):
+        self.version = version
+
+    def get_version(self):
+        return self.version
+
+@pytest.fixture
+def cascade(monkeypatch):
+    monkeypatch.setattr(cascade_module, "current_thresholds", lambda: (0.05, 0.99))
+    calls = {"first": 0, "full": 0}
+
+    def first_stage(batch):
+        calls["first"] += len(batch)
+        return batch.mean(axis=(1, 2, 3)).reshape(-1, 1)
+
+    def full(batch):
+        calls["full"] += len(batch)
+        return np.full((len(batch), 1), 0.5, dtype=np.float32)
+
+    predictor = CascadePredictor(
+        MicroBatcher(first_stage, window=0), MicroBatcher(full, window=0), margin=0.005,
+        first_stage_registry=FixedVersion("small"), full_registry=FixedVersion("big")
+    )
+    return predictor, calls
+
+def images(*values):
+    return np.stack([np.full((64, 64, 1), value, dtype=np.float32) for value in values])
+
+def test_only_uncertain_images_reach_the_full_model(cascade):
+    """Confident first-stage scores are final; the band (plus margin) is escalated"""
+    predictor, calls = cascade
+
+    probabilities = predictor.predict_batch(images(0.01, 0.046, 0.3, 0.994, 0.999))
+
+    assert probabilities == pytest.approx([0.01, 0.5, 0.5, 0.5, 0.999])
+    assert calls == {"first": 5, "full": 3}
+
+def test_thresholds_are_read_once_per_batch(cascade, monkeypatch):
+    """A batch queries the thresholds once, not once per image"""
+    predictor, _ = cascade
+    reads = []
+
+    def current_thresholds():
+        reads.append(1)
+        return 0.05, 0.99
+
+    monkeypatch.setattr(cascade_module, "current_thresholds", current_thresholds)
+    predictor.predict_batch(images(0.01, 0.3, 0.5, 0.999))
+
+    assert len(reads) == 1
+
+def test_single_images_and_escalation_share(cascade):
+    """predict() routes one image at a time and the stats report the escalated share"""
+    predictor, calls = cascade
+
+    assert predictor.predict(images(0.001)[0], timeout=5) == pytest.approx(0.001)
+    assert predictor.predict(images(0.5)[0], timeout=5) == pytest.approx(0.5)
+
+    stats = predictor.stats()
+    assert stats["images"] == 2
+    assert stats["escalated"] == 1
+    assert stats["escalation_share"] == pytest.approx(0.5)
+    assert calls == {"first": 2, "full": 1}
+
+def test_version_covers_both_stages(cascade):
+    """Cached predictions are keyed by both stage versions"""
+    predictor, _ = cascade
+
+    assert predictor.get_version() == "cascade-small-big"
+    predictor.first_stage_registry = FixedVersion(None)
+    assert predictor.get_version() is None
@@ -0,0 +1,145 @@
+# testing/test_embeddings.py
+
+import time
+import numpy as np
+import pytest
+from tensorflow.keras.models import load_model
+import inference.embeddings as embeddings
+from inference.embeddings import EmbeddingIndex, penultimate_embedder, penultimate_scorer
+from inference.numpy_backend import NumpyModel, export_model
+
+class VectorModel:
+    """Stands in for a model whose embedding is the input itself"""
+    def embed(self, vectors):
+        return np.asarray(vectors, dtype=np.float32)
+
+class FixedRegistry:
+    def __init__(self):
+        self.model = VectorModel()
+
+    def load(self):
+        return self.model
+
+    def get_version(self):
+        return "embedding-test"
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    outcomes = {}
+    monkeypatch.setattr(embeddings, "list_confirmed_outcomes", lambda: list(outcomes.items()))
+    index = EmbeddingIndex(str(tmp_path / "embeddings"), FixedRegistry())
+    index.outcomes = outcomes
+    return index
+
+def test_keras_and_numpy_embeddings_agree(tiny_model_path, tmp_path):
+    """Both backends return the features feeding the final Dense layer"""
+    npz_path = str(tmp_path / "model.npz")
+    export_model(tiny_model_path, npz_path)
+    images = np.random.default_rng(7).random((4, 64, 64, 1), dtype=np.float32)
+
+    keras_features = penultimate_embedder(load_model(tiny_model_path))(images)
+    numpy_features = penultimate_embedder(NumpyModel(npz_path))(images)
+
+    assert keras_features.shape == (4, 8)
+    np.testing.assert_allclose(numpy_features, keras_features, atol=1e-5)
+
+def test_scorers_return_predict_and_embedding_in_one_pass(tiny_model_path, tmp_path):
+    """Each backend's scorer matches its own predict() and embedder"""
+    npz_path = str(tmp_path / "model.npz")
+    export_model(tiny_model_path, npz_path)
+    images = np.random.default_rng(7).random((4, 64, 64, 1), dtype=np.float32)
+
+    for model in (load_model(tiny_model_path), NumpyModel(npz_path)):
+        probabilities, features = penultimate_scorer(model)(images)
+        np.testing.assert_allclose(probabilities, model.predict(images, verbose=0), atol=1e-5)
+        np.testing.assert_allclose(features, penultimate_embedder(model)(images), atol=1e-5)
+
+def test_add_features_matches_add(index):
+    """Features handed over from scoring are stored like ones the index computes"""
+    index.add_many([1], np.array([[3.0, 4.0]]))
+    index.add_features([2], np.array([[3.0, 4.0]]))
+    index.outcomes.update({1: 1, 2: 0})
+
+    assert index.similar(1)[0]["similarity"] == pytest.approx(1.0, abs=1e-3)
+
+def test_similar_returns_nearest_confirmed_cases(index):
+    """Only confirmed cases are returned, most similar first, never the patient themselves"""
+    index.add_many([1, 2, 3, 4], np.array([[1, 0, 0], [0.9, 0.1, 0], [0, 1, 0], [0.8, 0, 0.2]]))
+    index.outcomes.update({1: 1, 2: 0, 4: 1})
+
+    cases = index.similar(1, k=5)
+
+    assert [case["patient_id"] for case in cases] == [2, 4]
+    assert [case["pneumonia_confirmed"] for case in cases] == [False, True]
+    assert cases[0]["similarity"] == pytest.approx(0.9 / np.sqrt(0.82), abs=1e-3)
+    assert index.similar(99) == []
+
+def test_new_xray_replaces_old_embedding(index):
+    """The latest row for a patient is the one searched"""
+    index.add_many([1, 2], np.array([[1, 0], [0, 1]]))
+    index.outcomes.update({1: 1, 2: 1, 3: 1})
+    index.add_many([3], np.array([[1, 0.1]]))
+    index.add_many([1], np.array([[0, 1]]))
+
+    assert index.similar(1, k=1)[0]["patient_id"] == 2
+    assert index.stats()["patients"] == 3
+
+def test_large_archive_uses_approximate_index(index, monkeypatch):
+    """Past the threshold, searches go through the inverted-file index and stay fast"""
+    rng = np.random.default_rng(8)
+    centres = rng.normal(size=(50, 64))
+    vectors = centres[rng.integers(0, 50, 100000)] + rng.normal(scale=0.1, size=(100000, 64))
+    index.add_many(list(range(100000)), vectors)
+    index.outcomes.update({patient_id: patient_id % 2 for patient_id in range(100000)})
+
+    exact = index.similar(7, k=5)
+    index.ann_threshold = 1000
+    index.refresh()
+    approximate = index.similar(7, k=5)
+
+    assert index.stats()["approximate"]
+    assert approximate[0]["similarity"] == pytest.approx(exact[0]["similarity"], abs=1e-3)
+
+    started = time.perf_counter()
+    for patient_id in range(20):
+        index.similar(patient_id)
+    assert (time.perf_counter() - started) / 20 < 0.05
+
+def test_searches_never_train_the_approximate_index(index, monkeypatch):
+    """Training runs on the background refresh, and new x-rays join the existing lists"""
+    rng = np.random.default_rng(9)
+    index.ann_threshold = 100
+    index.add_many(list(range(2000)), rng.normal(size=(2000, 16)))
+    index.outcomes.update({patient_id: 1 for patient_id in range(2000)})
+
+    trained = []
+    train_centroids = embeddings.train_centroids
+    monkeypatch.setattr(embeddings, "train_centroids", lambda *args: trained.append(1) or train_centroids(*args))
+    scheduled = []
+    thread = embeddings.threading.Thread
+    class PendingThread:
+        """Holds the scheduled refresh without starting it"""
+        def __init__(self, **kwargs):
+            scheduled.append(kwargs)
+        def start(self):
+            pass
+    monkeypatch.setattr(embeddings.threading, "Thread", PendingThread)
+
+    assert len(index.similar(0)) == embeddings.SIMILAR_CASES
+    assert trained == [] and len(scheduled) == 1
+    monkeypatch.setattr(embeddings.threading, "Thread", thread)
+
+    index.refresh()
+    assert trained == [1] and index.stats()["approximate"]
+    lists = index.stats()["lists"]
+
+    index.add_many([5000], np.ones((1, 16)))
+    index.outcomes[5000] = 1
+    index.refresh()
+    assert trained == [1]
+    assert index.stats()["lists"] == lists
+    assert index.similar(5000, k=1)[0]["similarity"] > 0.5
+
+    reloaded = EmbeddingIndex(index.root, index.registry, ann_threshold=100)
+    reloaded.refresh()
+    assert trained == [1] and reloaded.stats()["lists"] == lists
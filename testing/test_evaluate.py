@@ -0,0 +1,92 @@
+# testing/test_evaluate.py
+
+import time
+import numpy as np
+import pytest
+from PIL import Image
+import inference.evaluate as evaluate
+from inference.model import classify
+
+@pytest.fixture
+def scores():
+    rng = np.random.default_rng(5)
+    labels = rng.integers(0, 2, 400).astype(np.int8)
+    probabilities = np.clip(rng.normal(0.3 + 0.4 * labels, 0.2), 0, 1).round(3)
+    return labels, probabilities
+
+def test_sweep_matches_classify(scores):
+    """Every swept pair counts the same images as classify() would flag"""
+    labels, probabilities = scores
+    thresholds = np.linspace(0, 1, 21)
+
+    sweep = evaluate.sweep_thresholds(labels, probabilities, thresholds)
+
+    for low_index, high_index in [(0, 20), (2, 19), (5, 5), (7, 12), (12, 7)]:
+        low, high = thresholds[low_index], thresholds[high_index]
+        if low > high:
+            assert np.isnan(sweep["tp"][low_index, high_index])
+            continue
+        flagged = np.array([classify(p, low, high) == "Pneumonia" for p in probabilities])
+        assert sweep["tp"][low_index, high_index] == (flagged & (labels == 1)).sum()
+        assert sweep["fp"][low_index, high_index] == (flagged & (labels == 0)).sum()
+        assert sweep["tn"][low_index, high_index] == (~flagged & (labels == 0)).sum()
+
+def test_roc_auc_matches_rank_statistic(scores):
+    """ROC AUC equals the chance a positive outranks a negative, counting ties as half"""
+    labels, probabilities = scores
+    positives, negatives = probabilities[labels == 1], probabilities[labels == 0]
+    expected = ((positives[:, None] > negatives[None, :]).mean()
+                + 0.5 * (positives[:, None] == negatives[None, :]).mean())
+
+    curves = evaluate.roc_pr_curves(labels, probabilities)
+
+    assert curves["roc_auc"] == pytest.approx(expected)
+    assert 0 < curves["average_precision"] <= 1
+
+def test_recommended_band_meets_recall(scores):
+    """The recommended band keeps recall at the target and beats the full band's precision"""
+    labels, probabilities = scores
+
+    report = evaluate.evaluation_report(labels, probabilities, np.linspace(0, 1, 101), 0.95, (0.0, 1.0))
+
+    assert report["recommended"]["recall"] >= 0.95
+    assert report["recommended"]["precision"] >= report["current"]["precision"]
+    assert report["current"]["recall"] == 1.0
+
+def test_large_sweep_is_fast():
+    """A 1001 x 1001 sweep over 20,000 images needs no inference and finishes in seconds"""
+    rng = np.random.default_rng(6)
+    labels = rng.integers(0, 2, 20000).astype(np.int8)
+    probabilities = rng.random(20000)
+
+    started = time.perf_counter()
+    report = evaluate.evaluation_report(labels, probabilities, np.linspace(0, 1, 1001))
+
+    assert time.perf_counter() - started < 5
+    assert report["pairs_swept"] == 1001 * 1002 // 2
+
+def test_probabilities_are_cached(tmp_path, monkeypatch):
+    """Images are scored once; a second run reads the cache"""
+    for folder, shade in (("NORMAL", 40), ("PNEUMONIA", 200)):
+        (tmp_path / "test" / folder).mkdir(parents=True)
+        for index in range(3):
+            Image.new('L', (96, 96), color=shade + index).save(tmp_path / "test" / folder / f"{index}.jpeg", format='JPEG')
+    (tmp_path / "test" / "PNEUMONIA" / "broken.jpeg").write_bytes(b"not a jpeg")
+
+    calls = []
+    def fake_score(images):
+        calls.append(len(images))
+        return images.mean(axis=(1, 2, 3)).tolist()
+    monkeypatch.setattr(evaluate, "score", fake_score)
+
+    names, paths, labels = evaluate.labelled_directory(str(tmp_path / "test"))
+    cache_path = str(tmp_path / "cache.npz")
+
+    first, scored = evaluate.cached_probabilities(cache_path, names, paths, use_tensor_store=False)
+    second, rescored = evaluate.cached_probabilities(cache_path, names, paths, use_tensor_store=False)
+
+    assert labels.tolist() == [0, 0, 0, 1, 1, 1, 1]
+    assert scored == 7 and rescored == 0
+    assert calls == [6]
+    np.testing.assert_array_equal(first, second)
+    assert np.isnan(first).sum() == 1
@@ -0,0 +1,104 @@
+# testing/test_gradcam.py
+
+import numpy as np
+import pytest
+from PIL import Image
+import inference.gradcam as gradcam
+from inference.gradcam import HeatmapWorker, gradcam_function, heatmap_filename
+from inference.model import ModelRegistry
+from inference.numpy_backend import NumpyModel, export_model
+from inference.tensor_store import TensorStore
+
+class FakePatients:
+    """Stands in for the patients table's x-ray and overlay columns"""
+    def __init__(self):
+        self.rows = {}
+
+    def candidates(self, model_version, limit):
+        rows = [
+            {"id": patient_id, "xray_img": row["xray_img"], "heatmap_img": row["heatmap_img"]}
+            for patient_id, row in sorted(self.rows.items(), reverse=True)
+            if row["heatmap_model_version"] != model_version
+        ]
+        return rows[:limit]
+
+    def store(self, patient_id, xray_img, heatmap_img, model_version):
+        row = self.rows.get(patient_id)
+        if row is None or row["xray_img"] != xray_img:
+            return False
+        row.update(heatmap_img=heatmap_img, heatmap_model_version=model_version)
+        return True
+
+@pytest.fixture
+def worker(tmp_path, tiny_model_path, monkeypatch):
+    patients = FakePatients()
+    monkeypatch.setattr(gradcam, "list_heatmap_candidates", patients.candidates)
+    monkeypatch.setattr(gradcam, "store_heatmap", patients.store)
+    monkeypatch.setattr(gradcam, "tensor_store", TensorStore(str(tmp_path / "tensors")))
+
+    for patient_id in range(1, 4):
+        Image.new('L', (512, 384), color=60 * patient_id).save(tmp_path / f"xray_{patient_id}.jpg", format='JPEG')
+        patients.rows[patient_id] = {"xray_img": f"xray_{patient_id}.jpg", "heatmap_img": None, "heatmap_model_version": None}
+
+    worker = HeatmapWorker(str(tmp_path), ModelRegistry(tiny_model_path), batch_size=2)
+    worker.patients = patients
+    return worker
+
+def test_batched_heatmaps_match_single_images(tiny_model_path):
+    """One pass over a batch gives each image the heatmap it gets on its own"""
+    from tensorflow.keras.models import load_model
+
+    heatmaps = gradcam_function(load_model(tiny_model_path))
+    images = np.random.default_rng(3).random((4, 64, 64, 1), dtype=np.float32)
+
+    batch = heatmaps(images)
+
+    assert batch.shape == (4, 62, 62)
+    assert batch.min() >= 0 and batch.max() <= 1
+    np.testing.assert_allclose(batch[2], heatmaps(images[2:3])[0], atol=1e-5)
+
+def test_backends_without_gradients_are_unsupported(tiny_model_path, tmp_path):
+    npz_path = str(tmp_path / "model.npz")
+    export_model(tiny_model_path, npz_path)
+
+    assert gradcam_function(NumpyModel(npz_path)) is None
+
+def test_worker_caches_overlays_until_the_model_changes(worker, tmp_path):
+    """Overlays are written once per model version, and stale ones are replaced"""
+    assert worker.run_once() == 2
+    assert worker.run_once() == 1
+    assert worker.run_once() == 0
+
+    version = worker.registry.get_version()
+    row = worker.patients.rows[1]
+    assert row["heatmap_img"] == heatmap_filename("xray_1.jpg", 1, version)
+    with Image.open(tmp_path / row["heatmap_img"]) as overlay:
+        assert overlay.size == (256, 192)
+        assert overlay.mode == 'RGB'
+
+    worker.registry.version = "promoted-version"
+    worker.run_once()
+    worker.run_once()
+
+    assert row["heatmap_img"] == heatmap_filename("xray_1.jpg", 1, "promoted-version")
+    assert not (tmp_path / heatmap_filename("xray_1.jpg", 1, version)).exists()
+    assert worker.status()["generated"] == 6
+
+def test_unreadable_and_replaced_xrays(worker, tmp_path, monkeypatch):
+    """Unreadable x-rays are not retried, and overlays for replaced x-rays are thrown away"""
+    (tmp_path / "xray_3.jpg").write_bytes(b"not a jpeg")
+    original_store = worker.patients.store
+
+    def replace_during_batch(patient_id, xray_img, heatmap_img, model_version):
+        if patient_id == 2:
+            worker.patients.rows[2]["xray_img"] = "xray_2_new.jpg"
+        return original_store(patient_id, xray_img, heatmap_img, model_version)
+
+    monkeypatch.setattr(gradcam, "store_heatmap", replace_during_batch)
+    worker.run_once()
+
+    assert worker.patients.rows[3]["heatmap_img"] is None
+    assert worker.patients.rows[3]["heatmap_model_version"] == worker.registry.get_version()
+    assert worker.patients.rows[2]["heatmap_img"] is None
+    assert not (tmp_path / heatmap_filename("xray_2.jpg", 2, worker.registry.get_version())).exists()
+    assert worker.status() == {"running": False, "supported": True, "generated": 0, "failed": 1}
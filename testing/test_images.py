@@ -0,0 +1,48 @@
+# testing/test_images.py
+
+import os
+import pytest
+from PIL import Image
+import images
+from images import backfill, derivative_name, image_url, is_original, make_derivatives
+from app import app
+
+@pytest.fixture
+def xray_folder(tmp_path):
+    folder = tmp_path / "xrays"
+    folder.mkdir()
+    Image.new('L', (2000, 1600), color=90).save(folder / "abc123.jpg", format='JPEG')
+    return folder
+
+def test_derivatives_fit_their_sizes(xray_folder):
+    """Each copy keeps the aspect ratio and fits inside its size"""
+    written = make_derivatives(str(xray_folder), "abc123.jpg", ('thumb', 'preview'))
+
+    assert sorted(written) == ["abc123.preview.jpg", "abc123.thumb.jpg"]
+    with Image.open(xray_folder / "abc123.thumb.jpg") as thumb:
+        assert thumb.size == (100, 80)
+    with Image.open(xray_folder / "abc123.preview.jpg") as preview:
+        assert preview.size == (800, 640)
+    assert os.path.getsize(xray_folder / "abc123.thumb.jpg") < os.path.getsize(xray_folder / "abc123.jpg")
+
+def test_image_url_falls_back_to_original(tmp_path, xray_folder, monkeypatch):
+    monkeypatch.setattr(images, "IMAGES_FOLDER", str(tmp_path))
+
+    with app.test_request_context():
+        assert image_url('xrays', "abc123.jpg", 'thumb', 7).startswith("/images/xrays/abc123.jpg?")
+        make_derivatives(str(xray_folder), "abc123.jpg", ('thumb',))
+        assert image_url('xrays', "abc123.jpg", 'thumb', 7).startswith("/images/xrays/abc123.thumb.jpg?")
+        assert image_url('xrays', "abc123.jpg", patient_id=7).startswith("/images/xrays/abc123.jpg?")
+
+def test_backfill_only_resizes_originals_missing_copies(xray_folder):
+    """Copies and Grad-CAM overlays are never treated as uploads"""
+    (xray_folder / "broken.jpg").write_bytes(b"not a jpeg")
+    Image.new('RGB', (64, 64)).save(xray_folder / "abc123.gradcam-v1.jpg", format='JPEG')
+
+    assert backfill(str(xray_folder), ('thumb', 'preview')) == {"resized": 1, "up_to_date": 0, "failed": 1}
+    assert not (xray_folder / derivative_name("abc123.gradcam-v1.jpg", 'thumb')).exists()
+    assert backfill(str(xray_folder), ('thumb', 'preview'))["up_to_date"] == 1
+    assert backfill(str(xray_folder), ('thumb', 'preview'), force=True)["resized"] == 1
+
+    assert is_original("abc123.jpg")
+    assert not is_original("abc123.thumb.jpg")
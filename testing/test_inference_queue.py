@@ -0,0 +1,233 @@
+# testing/test_inference_queue.py
+
+import io
+import numpy as np
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from PIL import Image
+from app import app
+import db
+from inference.model import ModelRegistry
+from inference.batching import MicroBatcher
+from inference.queue import InferenceWorkerPool
+from inference.tensor_store import tensor_store
+
+def make_jpeg():
+    img = Image.new('L', (128, 128), color=120)
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG')
+    buffer.seek(0)
+    return buffer
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    # Drop anything other tests left in the queue
+    connection = db.get_connection()
+    connection.execute("UPDATE inference_jobs SET status = 'cancelled' WHERE status IN ('queued', 'running')")
+    connection.commit()
+    connection.close()
+
+    with app.test_client() as client:
+        with app.app_context():
+            worker_password = bcrypt.hashpw('QueuePass123!'.encode('utf-8'), bcrypt.gensalt())
+            db.add_user("Queue Worker", "test_queue_worker", worker_password, "worker", "queue@example.com")
+            db.add_patient(
+                first_name="Queue", surname="Patient", address="1 Queue St", city="Test City",
+                state="Test State", zip="12345", dob="1990-01-01", sex="Male", height=180.0,
+                weight=80.0, blood_type="O+", smoker_status="Non-smoker", alcohol_consumption="None",
+                allergies="None", vaccination_history="Up to date", fever=0, cough=1, chest_pain=0,
+                shortness_of_breath=0, fatigue=0, chills_sweating=0, last_updated="2023-06-01",
+                worker_id=db.get_user_id("test_queue_worker"), email="queue.patient@example.com",
+                cough_duration=0, cough_type="Dry"
+            )
+
+        yield client
+
+        connection = db.get_connection()
+        cursor = connection.cursor()
+        cursor.execute("SELECT id FROM patients WHERE email = ?", ("queue.patient@example.com",))
+        ids = [row[0] for row in cursor.fetchall()]
+        for patient_id in ids:
+            cursor.execute("DELETE FROM inference_jobs WHERE patient_id = ?", (patient_id,))
+            cursor.execute("DELETE FROM predictions WHERE patient_id = ?", (patient_id,))
+        cursor.execute("DELETE FROM patients WHERE email = ?", ("queue.patient@example.com",))
+        cursor.execute("DELETE FROM users WHERE username = ?", ("test_queue_worker",))
+        connection.commit()
+        connection.close()
+
+def get_patient_id():
+    connection = db.get_connection()
+    row = connection.execute("SELECT id FROM patients WHERE email = ?", ("queue.patient@example.com",)).fetchone()
+    connection.close()
+    return row[0]
+
+def test_upload_returns_with_prediction_pending(client):
+    """Uploading an x-ray queues a job instead of running the model inline"""
+    client.post('/login', data={'username': 'test_queue_worker', 'password': 'QueuePass123!'})
+    patient_id = get_patient_id()
+
+    response = client.post(
+        f'/patients/xray/upload/{patient_id}',
+        data={'file': (make_jpeg(), 'queued.jpg')},
+        content_type='multipart/form-data'
+    )
+
+    assert response.status_code == 302
+    assert db.get_inference_job_status(patient_id) == 'queued'
+    assert tensor_store.get(db.get_patient(patient_id)['xray_img']) is not None
+
+    response = client.get(f'/patients/edit/{patient_id}')
+    assert b'AI prediction pending' in response.data
+
+def test_new_upload_cancels_older_queued_job(client):
+    """Only the newest x-ray of a patient stays queued"""
+    patient_id = get_patient_id()
+
+    first = db.enqueue_inference_job(patient_id, "first.jpg")
+    second = db.enqueue_inference_job(patient_id, "second.jpg")
+
+    connection = db.get_connection()
+    statuses = dict(connection.execute(
+        "SELECT id, status FROM inference_jobs WHERE id IN (?, ?)", (first, second)
+    ).fetchall())
+    connection.close()
+
+    assert statuses == {first: 'cancelled', second: 'queued'}
+
+def test_worker_stores_prediction(client, tmp_path, tiny_model_path):
+    """A worker claims the job, runs the model and flags the case for review"""
+    registry = ModelRegistry(tiny_model_path)
+    predictor = MicroBatcher(lambda batch: registry.load().predict(batch, verbose=0))
+
+    patient_id = get_patient_id()
+    (tmp_path / "scan.jpg").write_bytes(make_jpeg().getvalue())
+    db.update_xray_image(patient_id, "scan.jpg")
+    db.enqueue_inference_job(patient_id, "scan.jpg")
+
+    pool = InferenceWorkerPool(str(tmp_path), size=1, predictor=predictor)
+    job = db.claim_inference_job(60)
+    assert job['patient_id'] == patient_id
+    assert db.claim_inference_job(60) is None
+
+    assert pool.process(job) is True
+
+    patient = db.get_patient(patient_id)
+    assert patient['ai_suspected'] in (0, 1)
+    assert 0 <= patient['ai_probability'] <= 1
+    assert patient['clinician_to_review'] == 1
+    assert db.get_inference_job_status(patient_id) == 'done'
+
+    connection = db.get_connection()
+    prediction = connection.execute("SELECT * FROM predictions WHERE patient_id = ?", (patient_id,)).fetchone()
+    connection.close()
+    assert prediction['probability'] == pytest.approx(patient['ai_probability'])
+    assert prediction['latency_ms'] > 0
+    assert prediction['cached'] == 0
+
+def test_upload_refused_when_queue_is_full(client, monkeypatch):
+    """A backed-up queue turns the upload away before the patient's x-ray is touched"""
+    from routes.utilities import inference_pool
+    monkeypatch.setattr(inference_pool, "max_pending", 0)
+    monkeypatch.setattr(inference_pool, "wait_timeout", 0)
+
+    client.post('/login', data={'username': 'test_queue_worker', 'password': 'QueuePass123!'})
+    patient_id = get_patient_id()
+
+    response = client.post(
+        f'/patients/xray/upload/{patient_id}',
+        data={'file': (make_jpeg(), 'refused.jpg')},
+        content_type='multipart/form-data',
+        follow_redirects=True
+    )
+
+    assert b'AI queue is full' in response.data
+    assert db.get_xray_image(patient_id) is None
+    assert db.get_inference_job_status(patient_id) is None
+
+def test_concurrent_uploads_replace_each_image_once(client):
+    """Every old x-ray is handed back by exactly one swap, so none is released twice"""
+    patient_id = get_patient_id()
+    db.update_xray_image(patient_id, "original.jpg")
+    names = [f"upload_{index}.jpg" for index in range(8)]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        replaced = list(pool.map(lambda name: db.update_xray_image(patient_id, name)[0], names))
+
+    assert sorted(replaced + [db.get_xray_image(patient_id)]) == sorted(names + ["original.jpg"])
+    assert db.delete_xray_image(patient_id)[0] in names
+    assert db.delete_xray_image(patient_id) == (None, None)
+
+def test_worker_embeds_from_the_scoring_pass(client, tmp_path):
+    """The embedding added for a scored x-ray comes from the same predict call"""
+    calls = []
+
+    def features_fn(batch):
+        calls.append(len(batch))
+        return np.full((len(batch), 1), 0.5), np.ones((len(batch), 3))
+
+    class Embeddings:
+        added = []
+        def add_features(self, patient_ids, features):
+            self.added.append((patient_ids, np.asarray(features).tolist()))
+        def add(self, patient_id, image):
+            raise AssertionError("second forward pass")
+
+    patient_id = get_patient_id()
+    (tmp_path / "embedded.jpg").write_bytes(make_jpeg().getvalue())
+    db.update_xray_image(patient_id, "embedded.jpg")
+    db.enqueue_inference_job(patient_id, "embedded.jpg")
+
+    predictor = MicroBatcher(lambda batch: pytest.fail("predicted without features"), features_fn=features_fn)
+    pool = InferenceWorkerPool(str(tmp_path), size=1, predictor=predictor, embeddings=Embeddings())
+    pool.model_version = lambda: "embedding-queue-test"
+    assert pool.process(db.claim_inference_job(60)) is True
+
+    assert calls == [1]
+    assert Embeddings.added == [([patient_id], [1.0, 1.0, 1.0])]
+    assert db.get_patient(patient_id)['ai_probability'] == pytest.approx(0.5)
+
+def test_worker_skips_embedding_without_full_model_features(client, tmp_path):
+    """An image the full model never saw is left for the embeddings build job"""
+    class FirstStageOnly:
+        def predict_with_features(self, image, timeout=None):
+            return 0.01, None
+
+    class Embeddings:
+        def add_features(self, patient_ids, features):
+            raise AssertionError("nothing to add")
+        def add(self, patient_id, image):
+            raise AssertionError("full model run inline")
+
+    patient_id = get_patient_id()
+    (tmp_path / "first_stage.jpg").write_bytes(make_jpeg().getvalue())
+    db.update_xray_image(patient_id, "first_stage.jpg")
+    db.enqueue_inference_job(patient_id, "first_stage.jpg")
+
+    pool = InferenceWorkerPool(str(tmp_path), size=1, predictor=FirstStageOnly(), embeddings=Embeddings())
+    pool.model_version = lambda: "first-stage-queue-test"
+    assert pool.process(db.claim_inference_job(60)) is True
+    assert db.get_patient(patient_id)['ai_probability'] == pytest.approx(0.01)
+
+def test_worker_records_the_version_that_scored_the_image(client, tmp_path):
+    """A predictor that reports its version wins over the pool's own registry"""
+    class RemoteModel:
+        def predict_with_version(self, image, timeout=None):
+            return 0.3, "remote-queue-test"
+
+    patient_id = get_patient_id()
+    (tmp_path / "remote.jpg").write_bytes(make_jpeg().getvalue())
+    db.update_xray_image(patient_id, "remote.jpg")
+    db.enqueue_inference_job(patient_id, "remote.jpg")
+
+    pool = InferenceWorkerPool(str(tmp_path), size=1, predictor=RemoteModel())
+    pool.model_version = lambda: "local-queue-test"
+    assert pool.process(db.claim_inference_job(60)) is True
+
+    connection = db.get_connection()
+    prediction = connection.execute("SELECT * FROM predictions WHERE patient_id = ?", (patient_id,)).fetchone()
+    connection.close()
+    assert prediction['model_version'] == "remote-queue-test"
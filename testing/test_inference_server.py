@@ -0,0 +1,72 @@
+# testing/test_inference_server.py
+
+import time
+import numpy as np
+import pytest
+from inference.batching import MicroBatcher
+from inference.client import InferenceClient, InferenceServerError
+from inference.server import InferenceServer
+
+def mean_of_each_image(batch):
+    return batch.mean(axis=(1, 2, 3)).reshape(-1, 1)
+
+@pytest.fixture
+def server(tmp_path):
+    server = InferenceServer(str(tmp_path / "inference.sock"), MicroBatcher(mean_of_each_image, window=0.005))
+    server.start()
+    yield server
+    server.stop()
+
+def test_images_round_trip_through_shared_memory(server):
+    """Images written to shared memory come back as one probability each"""
+    client = InferenceClient(server.socket_path, timeout=5)
+    images = np.stack([np.full((64, 64, 1), value, dtype=np.float32) for value in (0.1, 0.5, 0.9)])
+
+    assert client.predict_batch(images) == pytest.approx([0.1, 0.5, 0.9])
+    assert client.predict(images[1]) == pytest.approx(0.5)
+    assert server.requests == 2
+
+    stats = client.stats()
+    assert stats["requests"] == 2
+    assert stats["server"]["requests"] == 2
+
+@pytest.mark.filterwarnings("error::pytest.PytestUnhandledThreadExceptionWarning")
+def test_client_times_out_and_reconnects(tmp_path):
+    """A slow server raises after the timeout and the next call opens a fresh connection; the server drops the old one quietly"""
+    delays = [0.5]
+
+    def slow_predict(batch):
+        time.sleep(delays.pop() if delays else 0)
+        return mean_of_each_image(batch)
+
+    server = InferenceServer(str(tmp_path / "slow.sock"), MicroBatcher(slow_predict, window=0))
+    server.start()
+    client = InferenceClient(server.socket_path, timeout=0.1)
+    image = np.full((64, 64, 1), 0.25, dtype=np.float32)
+
+    try:
+        with pytest.raises(InferenceServerError):
+            client.predict(image)
+        time.sleep(0.5)
+        assert client.predict(image, timeout=5) == pytest.approx(0.25)
+        assert client.stats()["errors"] == 1
+    finally:
+        server.stop()
+
+def test_unreachable_server_raises(tmp_path):
+    """With no server listening the client fails fast instead of hanging"""
+    client = InferenceClient(str(tmp_path / "missing.sock"), timeout=1)
+
+    with pytest.raises(InferenceServerError):
+        client.predict(np.zeros((64, 64, 1), dtype=np.float32))
+
+def test_client_reports_the_servers_model_version(server, monkeypatch):
+    """The version that comes back is the one the server scored with, not the caller's"""
+    monkeypatch.setattr("inference.server.model_registry.get_version", lambda: "server-v7")
+    client = InferenceClient(server.socket_path, timeout=5)
+    image = np.full((64, 64, 1), 0.5, dtype=np.float32)
+
+    assert client.get_version() == "server-v7"
+    probability, version = client.predict_with_version(image)
+    assert probability == pytest.approx(0.5)
+    assert version == "server-v7"
@@ -0,0 +1,87 @@
+# testing/test_media.py
+
+import hashlib
+import pytest
+from PIL import Image
+import routes.media
+from images import image_url, image_signature, check_image_signature
+from app import app
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    folder = tmp_path / "xrays"
+    folder.mkdir()
+    Image.new('L', (300, 300), color=60).save(folder / "legacy.jpg", format='JPEG')
+    data = (folder / "legacy.jpg").read_bytes()
+    name = f"{hashlib.sha256(data).hexdigest()}.jpg"
+    (folder / name).write_bytes(data)
+    monkeypatch.setattr(routes.media, "IMAGES_FOLDER", str(tmp_path))
+
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client, name, data
+
+def signed(filename, patient_id=1):
+    with app.test_request_context():
+        return image_url('xrays', filename, patient_id=patient_id)
+
+def test_content_named_image_is_cached_until_its_url_expires(client):
+    client, name, data = client
+
+    response = client.get(signed(name))
+
+    assert response.status_code == 200
+    assert response.data == data
+    assert response.cache_control.immutable
+    assert 3600 < response.cache_control.max_age <= 4200
+    assert response.cache_control.private and not response.cache_control.public
+    assert response.get_etag() == (name, False)
+
+    response = client.get(signed(name), headers={'If-None-Match': f'"{name}"'})
+    assert response.status_code == 304
+    assert response.data == b''
+
+def test_other_images_are_revalidated(client):
+    client, _, data = client
+
+    response = client.get(signed('legacy.jpg'))
+    assert response.cache_control.no_cache
+    assert not response.cache_control.immutable
+
+    etag = response.headers['ETag']
+    assert client.get(signed('legacy.jpg'), headers={'If-None-Match': etag}).status_code == 304
+
+def test_range_requests(client):
+    client, name, data = client
+
+    response = client.get(signed(name), headers={'Range': 'bytes=0-9'})
+
+    assert response.status_code == 206
+    assert response.data == data[:10]
+    assert response.headers['Content-Range'] == f'bytes 0-9/{len(data)}'
+
+def test_xrays_need_a_valid_signature(client):
+    """Unsigned, tampered and expired URLs are refused, as is the static route"""
+    client, name, _ = client
+    url = signed(name, patient_id=5)
+
+    assert client.get(f'/images/xrays/{name}').status_code == 403
+    assert client.get(url.replace('patient=5', 'patient=6')).status_code == 403
+    assert client.get(signed('legacy.jpg').replace('legacy.jpg', name, 1)).status_code == 403
+
+    with app.test_request_context():
+        args = {'patient': '5', 'expires': '1000', 'signature': image_signature('xrays', 5, name, 1000)}
+        assert check_image_signature('xrays', name, args, now=990) == 10
+        assert check_image_signature('xrays', name, args, now=1000) is None
+    assert client.get(f'/images/xrays/{name}?patient=5&expires=1000&signature={args["signature"]}').status_code == 403
+
+    assert client.get('/static/images/xrays/anything.jpg').status_code == 404
+    assert client.get('/static/images/../images/.incoming/x.tmp').status_code == 404
+    assert client.get('/static/images/avatar.png').status_code == 200
+
+def test_only_image_folders_are_served(client):
+    client, name, _ = client
+
+    assert client.get(f'/images/database/{name}').status_code == 404
+    assert client.get(signed('missing.jpg')).status_code == 404
+    assert client.get(signed('..%2F..%2Fapp.py')).status_code == 404
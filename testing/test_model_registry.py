@@ -0,0 +1,43 @@
+# testing/test_model_registry.py
+
+import threading
+import pytest
+from inference.model import ModelRegistry
+
+def test_model_loaded_once_and_warm(tiny_model_path):
+    """The registry loads the model once and reports it as warm"""
+    registry = ModelRegistry(tiny_model_path)
+
+    assert not registry.is_warm()
+
+    first = registry.load()
+    second = registry.load()
+
+    assert first is second
+    status = registry.status()
+    assert status["warm"] is True
+    assert status["load_time"] > 0
+    assert status["warm_time"] > 0
+    assert status["error"] is None
+
+def test_concurrent_loads_share_one_model(tiny_model_path):
+    """Threads racing on first use all receive the same model object"""
+    registry = ModelRegistry(tiny_model_path)
+    models = []
+
+    threads = [threading.Thread(target=lambda: models.append(registry.load())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(models) == 4
+    assert all(model is models[0] for model in models)
+
+def test_warm_up_with_missing_model_does_not_raise(tmp_path):
+    """A missing model file is recorded instead of stopping app start-up"""
+    registry = ModelRegistry(str(tmp_path / "missing.keras"))
+
+    assert registry.warm_up() is False
+    assert registry.status()["warm"] is False
+    assert registry.status()["error"]
@@ -0,0 +1,81 @@
+# testing/test_model_versions.py
+
+import os
+import pytest
+from inference.model import ModelRegistry
+from inference.numpy_backend import export_model
+from inference.versions import ModelStore, file_version
+
+def test_add_and_promote_versions(tmp_path, tiny_model_path):
+    """Versions are stored once under their own folder and CURRENT names the promoted one"""
+    store = ModelStore(str(tmp_path / "models"))
+
+    assert store.current() is None
+    version = store.add(tiny_model_path)
+    assert version == file_version(tiny_model_path)
+
+    with pytest.raises(FileExistsError):
+        store.add(tiny_model_path)
+    with pytest.raises(ValueError):
+        store.promote("missing")
+
+    store.promote(version)
+    assert store.current() == version
+    assert store.versions() == [version]
+    assert not [name for name in os.listdir(store.root) if name.endswith(".tmp")]
+
+def test_registry_serves_promoted_version_and_hot_swaps(tmp_path, tiny_model_path):
+    """A newly promoted version is warmed and swapped in; old callers keep their model"""
+    store = ModelStore(str(tmp_path / "models"))
+    store.promote(store.add(tiny_model_path, version="v1"))
+
+    registry = ModelRegistry(model_dir=store.root)
+    old_model = registry.load()
+    assert registry.get_version() == "v1+keras"
+    assert registry.check_for_update() is False
+
+    store.promote(store.add(tiny_model_path, version="v2"))
+    assert registry.load() is old_model
+    assert registry.check_for_update() is True
+
+    new_model = registry.load()
+    assert new_model is not old_model
+    assert registry.get_version() == "v2+keras"
+    assert registry.model_path == store.model_path("v2")
+    status = registry.status()
+    assert status["previous_version"] == "v1+keras"
+    assert status["swaps"] == 1
+    assert status["warm"] is True
+
+def test_broken_version_keeps_the_old_model(tmp_path, tiny_model_path):
+    """A promoted version that fails to load is skipped and the old model keeps serving"""
+    store = ModelStore(str(tmp_path / "models"))
+    store.promote(store.add(tiny_model_path, version="good"))
+    registry = ModelRegistry(model_dir=store.root)
+    model = registry.load()
+
+    broken = tmp_path / "broken.keras"
+    broken.write_bytes(b"not a model")
+    store.promote(store.add(str(broken), version="broken"))
+
+    assert registry.check_for_update() is False
+    assert registry.load() is model
+    assert registry.get_version() == "good+keras"
+    assert "broken" in registry.status()["error"]
+    assert registry.check_for_update() is False
+
+def test_backends_of_a_version_are_told_apart(tmp_path, tiny_model_path):
+    """Each backend's file for a version gets its own version string"""
+    store = ModelStore(str(tmp_path / "models"))
+    npz_path = str(tmp_path / "model.npz")
+    export_model(tiny_model_path, npz_path)
+    store.add(tiny_model_path, version="v1")
+    store.add(npz_path, version="v1", backend="numpy")
+    store.promote("v1")
+
+    keras = ModelRegistry(model_dir=store.root)
+    numpy = ModelRegistry(model_dir=store.root, backend="numpy")
+    numpy.load()
+
+    assert keras.get_version() == "v1+keras"
+    assert numpy.get_version() == "v1+numpy"
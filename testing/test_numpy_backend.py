@@ -0,0 +1,76 @@
+# testing/test_numpy_backend.py
+
+import numpy as np
+import pytest
+from tensorflow import keras
+from tensorflow.keras.models import load_model
+from inference.model import ModelRegistry
+from inference.numpy_backend import NumpyModel, export_model
+
+@pytest.fixture(scope="module")
+def wide_model_path(tmp_path_factory):
+    """A model using every supported layer type, with non-trivial batch norm statistics"""
+    model = keras.Sequential([
+        keras.Input(shape=(64, 64, 1)),
+        keras.layers.Conv2D(6, 3, strides=2, padding="same"),
+        keras.layers.BatchNormalization(),
+        keras.layers.ReLU(),
+        keras.layers.MaxPooling2D(3, strides=2, padding="same"),
+        keras.layers.Conv2D(8, 5, activation="tanh", use_bias=False),
+        keras.layers.AveragePooling2D(2, padding="same"),
+        keras.layers.Dropout(0.5),
+        keras.layers.Conv2D(4, 1, activation="relu"),
+        keras.layers.GlobalAveragePooling2D(),
+        keras.layers.Dense(8),
+        keras.layers.Activation("relu"),
+        keras.layers.Dense(1, activation="sigmoid"),
+    ])
+
+    rng = np.random.default_rng(3)
+    batch_norm = model.layers[1]
+    batch_norm.set_weights([
+        rng.uniform(0.5, 2, 6), rng.normal(size=6), rng.normal(size=6), rng.uniform(0.5, 2, 6)
+    ])
+
+    path = tmp_path_factory.mktemp("numpy") / "wide_model.keras"
+    model.save(path)
+    return str(path)
+
+@pytest.mark.parametrize("model_fixture", ["tiny_model_path", "wide_model_path"])
+def test_numpy_engine_matches_tensorflow(model_fixture, request, tmp_path):
+    """The exported NumPy forward pass gives the same probabilities as Keras"""
+    keras_path = request.getfixturevalue(model_fixture)
+    npz_path = str(tmp_path / "model.npz")
+    export_model(keras_path, npz_path)
+
+    images = np.random.default_rng(4).random((20, 64, 64, 1), dtype=np.float32)
+    expected = load_model(keras_path).predict(images, verbose=0)
+    actual = NumpyModel(npz_path, chunk_size=7).predict(images)
+
+    assert actual.shape == (20, 1)
+    assert actual.dtype == np.float32
+    np.testing.assert_allclose(actual, expected, atol=1e-5)
+
+def test_unsupported_layer_is_rejected(tmp_path):
+    """Models with layers the engine cannot run fail at export, not at predict time"""
+    model = keras.Sequential([
+        keras.Input(shape=(64, 64, 1)),
+        keras.layers.Conv2D(2, 3, dilation_rate=2),
+        keras.layers.Flatten(),
+        keras.layers.Dense(1, activation="sigmoid"),
+    ])
+    path = tmp_path / "dilated.keras"
+    model.save(path)
+
+    with pytest.raises(ValueError, match="dilated"):
+        export_model(str(path), str(tmp_path / "dilated.npz"))
+
+def test_registry_serves_numpy_backend(tiny_model_path, tmp_path):
+    """The registry loads and warms the NumPy backend like the others"""
+    npz_path = str(tmp_path / "model.npz")
+    export_model(tiny_model_path, npz_path)
+
+    model = ModelRegistry(npz_path, backend='numpy').load()
+
+    assert isinstance(model, NumpyModel)
+    assert model.predict(np.zeros((3, 64, 64, 1), dtype=np.float32), batch_size=3, verbose=0).shape == (3, 1)
@@ -0,0 +1,132 @@
+# testing/test_prediction_cache.py
+
+import hashlib
+import io
+import pytest
+import bcrypt
+from PIL import Image
+from app import app
+import db
+from inference.cache import PredictionCache, prediction_cache
+from inference.model import model_registry
+
+TEST_VERSION = "test-cache-version"
+
+@pytest.fixture
+def clean_cache():
+    yield
+    connection = db.get_connection()
+    connection.execute("DELETE FROM prediction_cache WHERE model_version = ?", (TEST_VERSION,))
+    connection.commit()
+    connection.close()
+
+def test_lookup_counts_hits_and_misses(clean_cache):
+    """A stored probability is returned for the same digest and model version only"""
+    cache = PredictionCache(max_entries=100)
+
+    assert cache.lookup("digest-a", TEST_VERSION) is None
+    cache.store("digest-a", TEST_VERSION, 0.42)
+
+    assert cache.lookup("digest-a", TEST_VERSION) == pytest.approx(0.42)
+    assert cache.lookup("digest-a", "another-version") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+def test_least_recently_used_entries_are_evicted(clean_cache):
+    """The cache never grows past max_entries and keeps the entries in use"""
+    connection = db.get_connection()
+    existing = connection.execute("SELECT COUNT(*) FROM prediction_cache").fetchone()[0]
+    connection.close()
+
+    cache = PredictionCache(max_entries=existing + 2, evict_every=1)
+    cache.store("digest-old", TEST_VERSION, 0.1)
+    cache.store("digest-kept", TEST_VERSION, 0.2)
+
+    connection = db.get_connection()
+    connection.execute(
+        "UPDATE prediction_cache SET last_used_at = datetime('now', '-1 day') WHERE digest = ? AND model_version = ?",
+        ("digest-old", TEST_VERSION)
+    )
+    connection.commit()
+    connection.close()
+
+    cache.store("digest-new", TEST_VERSION, 0.3)
+
+    assert cache.evictions == 1
+    assert cache.lookup("digest-old", TEST_VERSION) is None
+    assert cache.lookup("digest-kept", TEST_VERSION) == pytest.approx(0.2)
+    assert cache.lookup("digest-new", TEST_VERSION) == pytest.approx(0.3)
+
+@pytest.fixture
+def client(clean_cache, monkeypatch):
+    app.config['TESTING'] = True
+    monkeypatch.setattr(model_registry, "get_version", lambda: TEST_VERSION)
+
+    with app.test_client() as client:
+        worker_password = bcrypt.hashpw('CachePass123!'.encode('utf-8'), bcrypt.gensalt())
+        db.add_user("Cache Worker", "test_cache_worker", worker_password, "worker", "cache@example.com")
+        db.add_patient(
+            first_name="Cache", surname="Patient", address="1 Cache St", city="Test City",
+            state="Test State", zip="12345", dob="1990-01-01", sex="Male", height=180.0,
+            weight=80.0, blood_type="O+", smoker_status="Non-smoker", alcohol_consumption="None",
+            allergies="None", vaccination_history="Up to date", fever=0, cough=1, chest_pain=0,
+            shortness_of_breath=0, fatigue=0, chills_sweating=0, last_updated="2023-06-01",
+            worker_id=db.get_user_id("test_cache_worker"), email="cache.patient@example.com",
+            cough_duration=0, cough_type="Dry"
+        )
+
+        yield client
+
+        connection = db.get_connection()
+        connection.execute("DELETE FROM inference_jobs WHERE patient_id IN (SELECT id FROM patients WHERE email = ?)", ("cache.patient@example.com",))
+        connection.execute("DELETE FROM predictions WHERE patient_id IN (SELECT id FROM patients WHERE email = ?)", ("cache.patient@example.com",))
+        connection.execute("DELETE FROM patients WHERE email = ?", ("cache.patient@example.com",))
+        connection.execute("DELETE FROM users WHERE username = ?", ("test_cache_worker",))
+        connection.commit()
+        connection.close()
+
+def test_reupload_of_scored_image_skips_inference(client):
+    """Uploading an image the current model already scored uses the cached result"""
+    buffer = io.BytesIO()
+    Image.new('L', (96, 96), color=200).save(buffer, format='JPEG')
+    data = buffer.getvalue()
+    prediction_cache.store(hashlib.sha256(data).hexdigest(), TEST_VERSION, 0.5)
+
+    client.post('/login', data={'username': 'test_cache_worker', 'password': 'CachePass123!'})
+    connection = db.get_connection()
+    patient_id = connection.execute("SELECT id FROM patients WHERE email = ?", ("cache.patient@example.com",)).fetchone()[0]
+    connection.close()
+
+    response = client.post(
+        f'/patients/xray/upload/{patient_id}',
+        data={'file': (io.BytesIO(data), 'repeat.jpg')},
+        content_type='multipart/form-data'
+    )
+
+    assert response.status_code == 302
+    assert db.get_inference_job_status(patient_id) is None
+
+    patient = db.get_patient(patient_id)
+    assert patient['ai_suspected'] == 1
+    assert patient['ai_probability'] == pytest.approx(0.5)
+    assert patient['ai_model_version'] == TEST_VERSION
+    assert patient['clinician_to_review'] == 1
+
+def test_eviction_runs_once_per_sweep_interval(clean_cache, monkeypatch):
+    """Stores only count and trim the table every evict_every inserts"""
+    sweeps = []
+
+    def evict(max_entries):
+        sweeps.append(max_entries)
+        return 0
+
+    monkeypatch.setattr("inference.cache.evict_cached_predictions", evict)
+
+    cache = PredictionCache(max_entries=50, evict_every=3)
+    for index in range(7):
+        cache.store(f"digest-sweep-{index}", TEST_VERSION, 0.5)
+
+    assert sweeps == [50, 50]
+    assert cache.lookup("digest-sweep-6", TEST_VERSION) == pytest.approx(0.5)
@@ -0,0 +1,57 @@
+# testing/test_preprocess.py
+
+import io
+import numpy as np
+import pytest
+from PIL import Image
+from inference.model import ModelRegistry
+from inference.preprocess import load_xray, decode_xray
+
+@pytest.fixture(params=["smooth", "ribs"])
+def radiograph(tmp_path, request):
+    """
+    A large grayscale JPEG like a scanned chest x-ray: smoothly shaded, or
+    with rib-like stripes, hard edges and film grain on top.
+    """
+    y, x = np.mgrid[0:1536, 0:1280].astype(np.float32)
+    pixels = 30 + 200 * np.exp(-((x - 600) ** 2 + (y - 800) ** 2) / (2 * 350 ** 2))
+    if request.param == "ribs":
+        ribs = 60 * (np.sin(2 * np.pi * y / (12 + x / 40)) > 0.3)
+        edges = np.where((x > 200) & (x < 1080), 0, -25)
+        grain = np.random.default_rng(3).normal(0, 8, pixels.shape)
+        pixels = np.clip(0.7 * pixels + ribs + edges + grain, 0, 255)
+    path = tmp_path / "radiograph.jpg"
+    Image.fromarray(pixels.astype(np.uint8), 'L').save(path, format='JPEG', quality=90)
+    return str(path)
+
+def test_draft_decode_matches_keras_tensor(radiograph):
+    """The draft-mode tensor has the same shape and type as load_img and close pixel values"""
+    reference = load_xray(radiograph)
+    with open(radiograph, 'rb') as f:
+        fast = decode_xray(f.read())
+
+    assert fast.shape == reference.shape == (64, 64, 1)
+    assert fast.dtype == np.float32
+    assert 0.0 <= fast.min() and fast.max() <= 1.0
+    assert np.abs(fast - reference).mean() < 0.02
+    assert np.abs(fast - reference).max() < 0.1
+
+def test_draft_decode_gives_the_same_prediction(radiograph, tiny_model_path):
+    """Both tensors lead to practically the same model output"""
+    model = ModelRegistry(tiny_model_path).load()
+    batch = np.stack([load_xray(radiograph), decode_xray(radiograph)])
+
+    reference, fast = model.predict(batch, verbose=0)[:, 0]
+    assert fast == pytest.approx(reference, abs=0.02)
+
+def test_decode_accepts_paths_files_and_other_formats(radiograph):
+    """Paths, open files and non-JPEG colour images all decode to the same layout"""
+    from_path = decode_xray(radiograph)
+    with open(radiograph, 'rb') as f:
+        assert np.array_equal(decode_xray(f), from_path)
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (300, 200), color=(255, 255, 255)).save(buffer, format='PNG')
+    png = decode_xray(buffer.getvalue())
+    assert png.shape == (64, 64, 1)
+    assert png == pytest.approx(np.ones((64, 64, 1)))
@@ -0,0 +1,37 @@
+# testing/test_startup.py
+
+import json
+import os
+import subprocess
+import sys
+
+# Importing the app must stay well under the seconds a TensorFlow import costs
+STARTUP_BUDGET_SECONDS = 2.0
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+def import_app_in_fresh_process():
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        "import app\n"
+        "elapsed = time.perf_counter() - start\n"
+        "print(json.dumps({'seconds': elapsed, 'modules': sorted(sys.modules)}))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def test_import_app_is_within_startup_budget():
+    """A fresh process can import the app within the startup budget"""
+    result = import_app_in_fresh_process()
+
+    assert result["seconds"] < STARTUP_BUDGET_SECONDS, (
+        f"import app took {result['seconds']:.2f}s, budget is {STARTUP_BUDGET_SECONDS}s"
+    )
+
+def test_import_app_does_not_load_inference_libraries():
+    """TensorFlow and numpy are only imported once inference actually runs"""
+    modules = import_app_in_fresh_process()["modules"]
+
+    assert "tensorflow" not in modules
+    assert "numpy" not in modules
@@ -0,0 +1,81 @@
+# testing/test_storage.py
+
+import io
+import os
+import pytest
+from PIL import Image
+import db
+import storage
+from storage import BlobStore
+
+TEST_KIND = "storage-test"
+
+def jpeg_bytes(shade):
+    buffer = io.BytesIO()
+    Image.new('L', (1200, 900), color=shade).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+@pytest.fixture
+def store(tmp_path):
+    yield BlobStore(str(tmp_path / "xrays"), TEST_KIND, ('thumb', 'preview'))
+
+    connection = db.get_connection()
+    connection.execute("DELETE FROM blobs WHERE kind = ?", (TEST_KIND,))
+    connection.commit()
+    connection.close()
+
+def test_identical_uploads_are_stored_once(store):
+    """The second upload of the same image only adds a reference"""
+    first, path, digest = store.save(io.BytesIO(jpeg_bytes(50)))
+    second, _, _ = store.save(io.BytesIO(jpeg_bytes(50)))
+    other, _, _ = store.save_bytes(jpeg_bytes(200))
+
+    assert first == second == f"{digest}.jpg"
+    assert other != first
+    assert sorted(os.listdir(store.folder)) == sorted([
+        first, other, ".blobs.lock",
+        f"{digest}.thumb.jpg", f"{digest}.preview.jpg",
+        other.replace(".jpg", ".thumb.jpg"), other.replace(".jpg", ".preview.jpg")
+    ])
+    assert store.stats()["references"] == 3
+    assert store.stats()["images"] == 2
+
+def test_file_is_removed_with_its_last_reference(store):
+    name, path, digest = store.save_bytes(jpeg_bytes(80))
+    store.save_bytes(jpeg_bytes(80))
+
+    assert store.release(name) is False
+    assert os.path.exists(path)
+    assert store.release(name) is True
+    assert not os.path.exists(path)
+    assert not os.path.exists(os.path.join(store.folder, f"{digest}.thumb.jpg"))
+    assert store.release(None) is False
+
+def test_failed_upload_leaves_nothing_behind(store):
+    class BrokenStream:
+        def read(self, size):
+            raise OSError("connection reset")
+
+    with pytest.raises(OSError):
+        store.save(BrokenStream())
+
+    assert [name for name in os.listdir(store.folder) if name.endswith(".tmp")] == []
+
+def test_rebuild_recounts_references(store, monkeypatch):
+    """Referenced files get their true count, unreferenced old files are removed"""
+    kept, kept_path, _ = store.save_bytes(jpeg_bytes(10))
+    orphan, orphan_path, _ = store.save_bytes(jpeg_bytes(20))
+    legacy = "0123456789abcdef.jpg"
+    with open(os.path.join(store.folder, legacy), "wb") as f:
+        f.write(jpeg_bytes(30))
+    monkeypatch.setattr(storage, "count_image_references", lambda kind: {kept: 4, legacy: 1})
+
+    assert store.rebuild()["skipped"] == 3
+
+    report = store.rebuild(grace=0)
+
+    assert report["files"] == 2
+    assert report["removed"] == 1
+    assert not os.path.exists(orphan_path)
+    assert db.list_blobs(TEST_KIND)[kept][1] == 4
+    assert db.list_blobs(TEST_KIND)[legacy][1] == 1
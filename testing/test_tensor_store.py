@@ -0,0 +1,182 @@
+# testing/test_tensor_store.py
+
+import os
+import threading
+import numpy as np
+import pytest
+from PIL import Image
+import db
+from inference import tensor_store
+from inference.tensor_store import TensorStore
+
+PATIENT_EMAILS = tuple(f"tensors{index}@example.com" for index in range(3))
+
+def image(value):
+    return np.full((64, 64, 1), value, dtype=np.float32)
+
+@pytest.fixture
+def store(tmp_path):
+    store = TensorStore(str(tmp_path / "tensors"))
+    yield store
+
+    connection = db.get_connection()
+    connection.execute("DELETE FROM xray_tensors WHERE store = ?", (store.key,))
+    connection.commit()
+    connection.close()
+
+@pytest.fixture
+def patients():
+    db.add_user("Tensor Worker", "test_tensor_worker", b"unused", "worker", "tensor@example.com")
+    worker_id = db.get_user_id("test_tensor_worker")
+
+    names = []
+    for index, email in enumerate(PATIENT_EMAILS):
+        db.add_patient(
+            first_name="Tensor", surname="Patient", address="1 Tensor St", city="Test City",
+            state="Test State", zip="12345", dob="1990-01-01", sex="Male", height=180.0,
+            weight=80.0, blood_type="O+", smoker_status="Non-smoker", alcohol_consumption="None",
+            allergies="None", vaccination_history="Up to date", fever=0, cough=0, chest_pain=0,
+            shortness_of_breath=0, fatigue=0, chills_sweating=0, last_updated="2023-06-01",
+            worker_id=worker_id, email=email, cough_duration=0, cough_type="Dry"
+        )
+        connection = db.get_connection()
+        patient_id = connection.execute("SELECT id FROM patients WHERE email = ?", (email,)).fetchone()[0]
+        connection.close()
+        db.update_xray_image(patient_id, f"tensor_{index}.jpg")
+        names.append(f"tensor_{index}.jpg")
+
+    yield names
+
+    connection = db.get_connection()
+    connection.execute(f"DELETE FROM patients WHERE email IN ({', '.join('?' for _ in PATIENT_EMAILS)})", PATIENT_EMAILS)
+    connection.execute("DELETE FROM users WHERE username = ?", ("test_tensor_worker",))
+    connection.commit()
+    connection.close()
+
+def test_consecutive_rows_are_read_without_copying(store):
+    """Images stored together come back as one slice of the memory map"""
+    store.put_many([("a.jpg", image(0.1)), ("b.jpg", image(0.2)), ("c.jpg", image(0.3))])
+
+    images, missing = store.get_many(["a.jpg", "b.jpg", "c.jpg"])
+    assert missing == []
+    assert isinstance(images, np.memmap)
+    assert images[:, 0, 0, 0] == pytest.approx([0.1, 0.2, 0.3])
+
+    images, _ = store.get_many(["c.jpg", "a.jpg"])
+    assert images[:, 0, 0, 0] == pytest.approx([0.3, 0.1])
+
+    images, missing = store.get_many(["a.jpg", "unknown.jpg"])
+    assert images is None
+    assert missing == ["unknown.jpg"]
+
+def test_load_decodes_once(store, tmp_path):
+    """A miss decodes the JPEG and stores it; the next load reads the store"""
+    path = tmp_path / "scan.jpg"
+    Image.new('L', (128, 128), color=200).save(path, format='JPEG')
+
+    first = store.load("scan.jpg", str(path))
+    os.remove(path)
+    second = store.load("scan.jpg", str(path))
+
+    assert np.array_equal(first, second)
+    assert store.stats()["hits"] == 1
+
+def test_compact_drops_dead_rows(store, patients):
+    """Deleted, replaced and orphaned images are dropped and live rows follow patient order"""
+    first, second, third = patients
+    store.put_many([(third, image(0.3)), ("orphan.jpg", image(0.9)), (first, image(0.1)), (second, image(0.0))])
+    store.put(second, image(0.2))
+    store.delete(third)
+
+    assert store.stats()["dead_share"] == pytest.approx(0.4)
+
+    report = store.compact()
+
+    assert report == {"rows_before": 5, "rows_after": 2}
+    images, missing = store.get_many([first, second])
+    assert isinstance(images, np.memmap)
+    assert images[:, 0, 0, 0] == pytest.approx([0.1, 0.2])
+    assert store.get_many([third])[1] == [third]
+    assert store.stats()["dead_share"] == 0
+
+def test_missing_file_is_rebuilt_lazily(store):
+    """Losing the tensor file turns every entry into a miss and new rows start again from zero"""
+    store.put_many([("a.jpg", image(0.1)), ("b.jpg", image(0.2))])
+    os.remove(store.path)
+
+    assert store.get("a.jpg") is None
+
+    store.put("b.jpg", image(0.5))
+    assert store.get("b.jpg")[0, 0, 0] == pytest.approx(0.5)
+    assert store.get("a.jpg") is None
+    assert store.stats()["rows"] == 1
+
+def test_compact_keeps_shared_images_once(store, patients):
+    """An x-ray shared by two patients keeps a single row, and every image keeps its own tensor"""
+    shared, _, other = patients
+    connection = db.get_connection()
+    patient_id = connection.execute("SELECT id FROM patients WHERE email = ?", (PATIENT_EMAILS[1],)).fetchone()[0]
+    connection.close()
+    db.update_xray_image(patient_id, shared)
+
+    store.put_many([("orphan.jpg", image(0.9)), (other, image(0.2)), (shared, image(0.5))])
+
+    assert store.compact() == {"rows_before": 3, "rows_after": 2}
+    assert store.get(shared)[0, 0, 0] == pytest.approx(0.5)
+    assert store.get(other)[0, 0, 0] == pytest.approx(0.2)
+
+def test_failed_index_write_keeps_old_file(store, patients, monkeypatch):
+    """If the index cannot be rewritten the file is not swapped either"""
+    first = patients[0]
+    store.put_many([("orphan.jpg", image(0.9)), (first, image(0.1))])
+
+    def broken(store_key, entries, before_commit=None):
+        before_commit()
+        raise RuntimeError("database is locked")
+    monkeypatch.setattr(tensor_store, "replace_tensor_rows", broken)
+
+    with pytest.raises(RuntimeError):
+        store.compact()
+
+    assert store.stats()["rows"] == 2
+    assert store.get(first)[0, 0, 0] == pytest.approx(0.1)
+    assert sorted(os.listdir(store.root)) == ["tensors.f32", "tensors.lock"]
+
+def test_reads_wait_for_compaction(store, patients, monkeypatch):
+    """A read started during compact() sees either the old file and index or the new ones"""
+    first = patients[0]
+    store.put_many([("orphan.jpg", image(0.9)), (first, image(0.1))])
+    reader = TensorStore(store.root)
+    assert reader.get(first)[0, 0, 0] == pytest.approx(0.1)
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(reader.get(first)[0, 0, 0]))
+    swap = tensor_store.replace_tensor_rows
+    def read_mid_swap(store_key, entries, before_commit=None):
+        thread.start()
+        thread.join(0.2)
+        assert thread.is_alive()
+        swap(store_key, entries, before_commit)
+    monkeypatch.setattr(tensor_store, "replace_tensor_rows", read_mid_swap)
+
+    store.compact()
+    thread.join(5)
+    assert results == [pytest.approx(0.1)]
+
+def test_stores_keep_separate_indexes(store, patients, tmp_path):
+    """Compacting one store leaves another store's rows alone"""
+    first = patients[0]
+    other = TensorStore(str(tmp_path / "other"))
+    try:
+        other.put_many([("orphan.jpg", image(0.9)), (first, image(0.4))])
+        store.put_many([(first, image(0.1))])
+
+        assert store.compact() == {"rows_before": 1, "rows_after": 1}
+        assert other.get("orphan.jpg")[0, 0, 0] == pytest.approx(0.9)
+        assert other.get(first)[0, 0, 0] == pytest.approx(0.4)
+        assert store.get(first)[0, 0, 0] == pytest.approx(0.1)
+    finally:
+        connection = db.get_connection()
+        connection.execute("DELETE FROM xray_tensors WHERE store = ?", (other.key,))
+        connection.commit()
+        connection.close()
@@ -0,0 +1,42 @@
+# testing/test_tflite_backend.py
+
+import numpy as np
+import pytest
+from tensorflow.keras.models import load_model
+from inference.model import ModelRegistry
+from inference.tflite_backend import TFLiteModel, convert_model, parity_report
+
+@pytest.fixture(scope="module")
+def tflite_path(tiny_model_path, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("tflite") / "tiny_model.tflite")
+    calibration = np.random.default_rng(1).random((16, 64, 64, 1), dtype=np.float32)
+    convert_model(tiny_model_path, path, calibration)
+    return path
+
+def test_quantised_model_tracks_keras_model(tiny_model_path, tflite_path):
+    """The int8 model stays close to the float model and reports its throughput"""
+    images = np.random.default_rng(2).random((24, 64, 64, 1), dtype=np.float32)
+
+    report = parity_report(load_model(tiny_model_path), TFLiteModel(tflite_path), images, batch_size=8)
+
+    assert report["images"] == 24
+    assert report["max_abs_delta"] < 0.05
+    assert report["keras_images_per_second"] > 0
+    assert report["tflite_images_per_second"] > 0
+
+def test_tflite_predict_handles_changing_batch_sizes(tflite_path):
+    """The interpreter is resized for each new batch size"""
+    model = TFLiteModel(tflite_path, num_threads=1)
+
+    assert model.predict(np.zeros((1, 64, 64, 1), dtype=np.float32)).shape == (1, 1)
+    assert model.predict(np.zeros((5, 64, 64, 1), dtype=np.float32)).shape == (5, 1)
+
+def test_registry_serves_tflite_backend(tflite_path):
+    """The registry loads and warms the TFLite backend like the Keras one"""
+    registry = ModelRegistry(tflite_path, backend='tflite')
+
+    model = registry.load()
+
+    assert isinstance(model, TFLiteModel)
+    assert registry.status()["backend"] == 'tflite'
+    assert registry.status()["warm"] is True
@@ -0,0 +1,76 @@
+# testing/test_uploads.py
+
+import io
+import os
+import pytest
+from flask import request
+from PIL import Image
+import uploads
+from uploads import InvalidUpload, UploadStream, jpeg_dimensions, upload_error
+from app import app
+
+def jpeg_bytes(size, exif=False):
+    buffer = io.BytesIO()
+    image = Image.new('L', size, color=100)
+    if exif:
+        # A large application segment ahead of the frame header
+        image.save(buffer, format='JPEG', exif=b'Exif\x00\x00' + b'\x00' * 60000)
+    else:
+        image.save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+def test_dimensions_read_from_header():
+    data = jpeg_bytes((640, 480), exif=True)
+
+    assert jpeg_dimensions(data[:3]) is None
+    assert jpeg_dimensions(data[:1000]) is None
+    assert jpeg_dimensions(data) == (640, 480)
+
+    with pytest.raises(InvalidUpload):
+        jpeg_dimensions(b'\x89PNG\r\n\x1a\n')
+
+def test_stream_refuses_bad_uploads_early(tmp_path):
+    """Wrong type, tiny images and oversize files are refused mid-stream and leave no file"""
+    for data, limit in ((b'GIF89a' + b'\x00' * 100, 1024 * 1024),
+                        (jpeg_bytes((16, 16)), 1024 * 1024),
+                        (jpeg_bytes((256, 256)), 100)):
+        stream = UploadStream(str(tmp_path), limit)
+        with pytest.raises(InvalidUpload):
+            stream.write(data)
+        assert os.listdir(tmp_path) == []
+
+def test_stream_stages_accepted_upload(tmp_path):
+    data = jpeg_bytes((256, 256))
+    stream = UploadStream(str(tmp_path))
+    for start in range(0, len(data), 50):
+        stream.write(data[start:start + 50])
+
+    assert stream.dimensions == (256, 256)
+    path, digest, size = stream.staged()
+    assert size == len(data)
+    with open(path, 'rb') as f:
+        assert f.read() == data
+
+    truncated = UploadStream(str(tmp_path))
+    truncated.write(data[:20])
+    with pytest.raises(InvalidUpload):
+        truncated.staged()
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
+
+def test_upload_error_reports_refused_form(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_TMP_FOLDER", str(tmp_path))
+
+    with app.test_request_context(method='POST', content_type='multipart/form-data',
+                                  data={'file': (io.BytesIO(b'not an image'), 'notes.txt')}):
+        assert upload_error(request) == "The file is not a JPEG image."
+
+    with app.test_request_context(method='POST', content_type='multipart/form-data',
+                                  data={'file': (io.BytesIO(jpeg_bytes((128, 128))), 'scan.jpg')}):
+        assert upload_error(request) is None
+
+    monkeypatch.setitem(app.config, 'MAX_CONTENT_LENGTH', 1024)
+    with app.test_request_context(method='POST', content_type='multipart/form-data',
+                                  data={'file': (io.BytesIO(jpeg_bytes((512, 512))), 'huge.jpg')}):
+        assert "smaller than" in upload_error(request)
+
+    assert [name for name in os.listdir(tmp_path) if name.endswith('.tmp')] == []
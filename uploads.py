@@ -0,0 +1,226 @@
+import hashlib
+import os
+import uuid
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+from images import IMAGES_FOLDER
+
+# Largest image accepted. Requests are cut off at MAX_CONTENT_LENGTH, which
+# leaves room for the rest of the form
+MAX_UPLOAD_BYTES = 25 * 1024 * 1024
+MAX_CONTENT_LENGTH = MAX_UPLOAD_BYTES + 64 * 1024
+
+# The JPEG frame header must come within this many bytes; EXIF data and
+# colour profiles before it can take a few segments of up to 64 KB each
+HEADER_BYTES = 256 * 1024
+
+# Accepted image dimensions, in pixels
+MIN_IMAGE_SIDE = 32
+MAX_IMAGE_SIDE = 12000
+MAX_IMAGE_PIXELS = 80_000_000
+
+# Uploads are streamed here before being stored; it must be on the same
+# filesystem as the image folders so storing them is a rename
+UPLOAD_TMP_FOLDER = os.path.join(IMAGES_FOLDER, '.incoming')
+
+# Frame header markers; C4, C8 and CC share the range but are not frames
+SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+class InvalidUpload(Exception):
+    """
+    Raised while an upload is being received if it cannot be a usable image.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+def jpeg_dimensions(header):
+    """
+    Read a JPEG's width and height from its first bytes.
+
+    Description:
+        Walks the marker segments after the start-of-image marker up to the
+        first frame header, without decoding anything.
+
+    Arguments:
+        header (bytes): The start of the file.
+
+    Returns:
+        Tuple or None: (width, height), None if more bytes are needed.
+
+    Raises:
+        InvalidUpload: The bytes are not a JPEG, or it has no frame header.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    if len(header) < 3:
+        return None
+    if header[:3] != b'\xff\xd8\xff':
+        raise InvalidUpload("The file is not a JPEG image.")
+
+    offset = 2
+    while True:
+        if offset + 4 > len(header):
+            return None
+        if header[offset] != 0xFF:
+            raise InvalidUpload("The JPEG image is corrupt.")
+
+        marker = header[offset + 1]
+        if marker == 0xFF:
+            offset += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            offset += 2
+            continue
+        if marker in (0xD9, 0xDA):
+            raise InvalidUpload("The JPEG image has no frame header.")
+
+        length = int.from_bytes(header[offset + 2:offset + 4], 'big')
+        if length < 2:
+            raise InvalidUpload("The JPEG image is corrupt.")
+
+        if marker in SOF_MARKERS:
+            if offset + 9 > len(header):
+                return None
+            height = int.from_bytes(header[offset + 5:offset + 7], 'big')
+            width = int.from_bytes(header[offset + 7:offset + 9], 'big')
+            return width, height
+
+        offset += 2 + length
+
+def check_dimensions(width, height):
+    """
+    Refuse images too small to read or too large to decode safely.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    if min(width, height) < MIN_IMAGE_SIDE:
+        raise InvalidUpload(f"The image must be at least {MIN_IMAGE_SIDE}x{MIN_IMAGE_SIDE} pixels.")
+    if max(width, height) > MAX_IMAGE_SIDE or width * height > MAX_IMAGE_PIXELS:
+        raise InvalidUpload(f"The image is too large ({width}x{height} pixels).")
+
+class UploadStream:
+    """
+    File the form parser writes an upload into, checking it as it arrives.
+
+    Description:
+        Each chunk is size-checked, hashed and written straight to a
+        temporary file, so memory per upload stays at one chunk plus at most
+        HEADER_BYTES of header however big the file is. Once the JPEG frame
+        header has arrived its dimensions are checked. Anything wrong raises
+        InvalidUpload from the parser, before the rest of the body is read.
+
+        BlobStore.save() takes the finished file over with staged() instead
+        of copying it. If nothing does, close() removes it.
+
+    Arguments:
+        folder (str): Where the temporary file goes.
+        limit (int): Largest accepted size in bytes.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    def __init__(self, folder=UPLOAD_TMP_FOLDER, limit=MAX_UPLOAD_BYTES):
+        os.makedirs(folder, exist_ok=True)
+        self.path = os.path.join(folder, f"{uuid.uuid4().hex}.tmp")
+        self.limit = limit
+        self.size = 0
+        self.dimensions = None
+        self._header = b''
+        self._digest = hashlib.sha256()
+        self._file = open(self.path, 'w+b')
+
+    def write(self, data):
+        try:
+            self.size += len(data)
+            if self.size > self.limit:
+                raise InvalidUpload(f"Files must be smaller than {self.limit // (1024 * 1024)} MB.")
+
+            if self.dimensions is None:
+                self._header += data[:HEADER_BYTES - len(self._header)]
+                self.dimensions = jpeg_dimensions(self._header)
+                if self.dimensions is not None:
+                    check_dimensions(*self.dimensions)
+                    self._header = b''
+                elif len(self._header) >= HEADER_BYTES:
+                    raise InvalidUpload("The JPEG image has no frame header.")
+        except InvalidUpload:
+            self.close()
+            raise
+
+        self._digest.update(data)
+        return self._file.write(data)
+
+    def staged(self):
+        """
+        Hand the finished upload over for storing.
+
+        Returns:
+            Tuple: (temporary file path, SHA-256 hex digest, size in bytes).
+            The caller moves or removes the file.
+
+        Raises:
+            InvalidUpload: The file ended before its frame header.
+
+        Author:
+            Reece Alqotaibi (ReturnTypeVoid)
+        """
+
+        self._file.close()
+        if self.dimensions is None:
+            self.close()
+            raise InvalidUpload("The file is not a complete JPEG image.")
+        return self.path, self._digest.hexdigest(), self.size
+
+    def close(self):
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __getattr__(self, name):
+        # read(), seek() and the rest go to the temporary file
+        return getattr(self._file, name)
+
+class UploadRequest(Request):
+    """
+    Request class that streams file uploads into UploadStream.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadStream(UPLOAD_TMP_FOLDER)
+
+def upload_error(request):
+    """
+    Parse a request's form and say why its upload was refused, if it was.
+
+    Arguments:
+        request (UploadRequest): The current request.
+
+    Returns:
+        str or None: Message for the user, None if the upload was accepted.
+
+    Author:
+        Reece Alqotaibi (ReturnTypeVoid)
+    """
+
+    try:
+        files = request.files
+    except RequestEntityTooLarge:
+        return f"Files must be smaller than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB."
+    except InvalidUpload as e:
+        return str(e)
+
+    for file in files.values():
+        if isinstance(file.stream, UploadStream) and file.stream.dimensions is None:
+            return "The file is not a complete JPEG image."
+    return None